@@ -1,9 +1,13 @@
 import streamlit as st
 from utils.database import SessionLocal, User, create_database_and_table
 from utils.auth import verify_password, hash_password_auth
+from models.warmup import COMPONENTS, start_warmup, warmup_status
 
 create_database_and_table()
 
+# Models load on a background thread, see models.warmup. Nothing here imports them.
+start_warmup()
+
 st.set_page_config(
     page_title="Personal Finance AI",
     page_icon="🤖💰",
@@ -59,6 +63,12 @@ def show_main_page():
     st.write("Navigate to the different sections using the sidebar on the left.")
     st.info("You can now upload new statements from the 'Upload Statement' page.")
 
+    status = warmup_status()
+    st.sidebar.caption('\n\n'.join(
+        f"{label}: {status[name]['state']}" + (f" ({status[name]['seconds']:.1f}s)" if status[name]['seconds'] else '')
+        for name, label in COMPONENTS.items()
+    ))
+
     if st.sidebar.button('Logout'):
         for key in list(st.session_state.keys()):
             del st.session_state[key]
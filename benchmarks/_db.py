@@ -0,0 +1,30 @@
+import contextlib
+import io
+import os
+import tempfile
+from pathlib import Path
+
+from utils import database
+
+
+def use_temporary_database() -> Path:
+    """Points utils.database at a fresh SQLite file so benchmarks never touch finance_tracker.db.
+    Processes spawned afterwards use it too, through FINANCE_DB_URL."""
+    db_file = Path(tempfile.mkdtemp(prefix='finance_bench_')) / 'bench.db'
+    database.DataBase_URL = os.environ['FINANCE_DB_URL'] = f'sqlite:///{db_file}'
+    database.engine = database.make_engine(database.DataBase_URL)
+    database.SessionLocal.configure(bind=database.engine)
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.create_database_and_table()
+    return db_file
+
+
+def create_user(username: str = 'bench') -> int:
+    db = database.SessionLocal()
+    try:
+        user = database.User(username=username, hashed_password='x')
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
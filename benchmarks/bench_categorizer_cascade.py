@@ -0,0 +1,104 @@
+"""Lexical, cascade and SBERT-only categorizers on labelled synthetic narrations.
+
+Every backend is fitted on --train narrations of the first --known merchants of each category
+and predicts --rows narrations, of which --unseen-share come from the remaining merchants, the
+ones a lexical model cannot have learned. Reported per backend: fit and predict time, rows/s,
+accuracy against the true category (Uncategorized counts as wrong), agreement with SBERT-only and
+the share of rows each tier labelled. Merchants come from utils.merchants, as stored at ingest,
+so repeat merchants are labelled by the lexical backend's merchant lookup. SBERT runs only if sentence-transformers and its model are
+available; without them the cascade's fall-through rows stay unresolved. The cascade fits its
+SBERT tier only once a row falls through, so that cost shows in its predict time.
+
+    python -m benchmarks.bench_categorizer_cascade
+    python -m benchmarks.bench_categorizer_cascade --rows 20000 --unseen-share 0.5
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_labeled_narrations
+from models.categorizer import CATEGORIZER_BACKENDS
+from utils.merchants import extract_merchants
+
+
+def make_dataset(train_rows: int, rows: int, known: int, unseen_share: float, seed: int = 5):
+    train = make_labeled_narrations(train_rows, seed=seed, merchants_per_category=known)
+    n_unseen = int(rows * unseen_share)
+    test = pd.concat([
+        make_labeled_narrations(rows - n_unseen, seed=seed + 1, merchants_per_category=known).assign(seen=True),
+        make_labeled_narrations(n_unseen, seed=seed + 2, skip_merchants_per_category=known).assign(seen=False),
+    ], ignore_index=True)
+    # What ingestion would have stored, not the generator's true merchant.
+    return train.assign(merchant=extract_merchants(train['details'])), test.assign(merchant=extract_merchants(test['details']))
+
+
+def run(train_rows: int = 2_000, rows: int = 10_000, known: int = 4, unseen_share: float = 0.2,
+        backends=tuple(CATEGORIZER_BACKENDS)) -> list[dict]:
+    train, test = make_dataset(train_rows, rows, known, unseen_share)
+    details = test['details'].tolist()
+    merchants = test['merchant'].tolist()
+    truth = test['category'].to_numpy()
+    results, sbert_categories = [], None
+    # SBERT-only first, the others are compared with its answers.
+    for backend in sorted(backends, key=lambda name: name != 'sbert'):
+        categorizer = CATEGORIZER_BACKENDS[backend]()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                categorizer.fit(train)
+                fit_s = time.perf_counter() - start
+                start = time.perf_counter()
+                predictions = categorizer.predict_batch(details, merchants=merchants)
+                predict_s = time.perf_counter() - start
+        except (ImportError, OSError) as e:
+            results.append({'backend': backend, 'skipped': str(e)})
+            continue
+        categories = predictions['category'].to_numpy()
+        if backend == 'sbert':
+            sbert_categories = categories
+        correct = categories == truth
+        results.append({
+            'backend': backend,
+            'fit_s': fit_s,
+            'predict_s': predict_s,
+            'rows_per_s': len(details) / predict_s,
+            'accuracy': float(correct.mean()),
+            'accuracy_seen': float(correct[test['seen'].to_numpy()].mean()),
+            'accuracy_unseen': float(correct[~test['seen'].to_numpy()].mean()) if unseen_share else None,
+            'agreement_with_sbert': float((categories == sbert_categories).mean()) if sbert_categories is not None else None,
+            'tiers': predictions['tier'].value_counts(normalize=True).to_dict(),
+        })
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--train', type=int, default=2_000, help='categorized narrations to fit on')
+    arg_parser.add_argument('--rows', type=int, default=10_000, help='narrations to categorize')
+    arg_parser.add_argument('--known', type=int, default=4, help='merchants per category seen in training')
+    arg_parser.add_argument('--unseen-share', type=float, default=0.2, help='share of rows from merchants not seen in training')
+    arg_parser.add_argument('--backends', nargs='+', choices=list(CATEGORIZER_BACKENDS), default=list(CATEGORIZER_BACKENDS))
+    args = arg_parser.parse_args()
+
+    from benchmarks._db import use_temporary_database
+    use_temporary_database()
+
+    def percent(value):
+        return f"{value:6.1%}" if value is not None else f"{'-':>6}"
+
+    print(f"{'backend':<8} {'fit':>8} {'predict':>8} {'rows/s':>8} {'acc':>6} {'seen':>6} {'unseen':>6} {'=sbert':>6}  tiers")
+    for row in run(args.train, args.rows, args.known, args.unseen_share, args.backends):
+        if 'skipped' in row:
+            print(f"{row['backend']:<8} skipped, {row['skipped']}")
+            continue
+        tiers = ', '.join(f"{tier} {share:.1%}" for tier, share in row['tiers'].items())
+        print(f"{row['backend']:<8} {row['fit_s']:7.2f}s {row['predict_s']:7.2f}s {row['rows_per_s']:8.0f} "
+              f"{percent(row['accuracy'])} {percent(row['accuracy_seen'])} {percent(row['accuracy_unseen'])} "
+              f"{percent(row['agreement_with_sbert'])}  {tiers}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Daily spending history from the daily_spending rollup vs resampling every debit.
+
+For each --sizes value a user's synthetic transactions are saved into a temporary database
+(which maintains the rollup), then the history is read both ways: the original query that
+pulled every debit and resampled it in pandas, and get_daily_spending_history. Read time
+should grow with the number of days for the rollup and with the number of rows for the scan.
+
+    python -m benchmarks.bench_daily_spending --sizes 10000 100000 500000
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from utils import database
+from models.predictor import get_daily_spending_history
+from benchmarks._db import use_temporary_database, create_user
+from benchmarks.synthetic import make_transactions_df
+
+
+def legacy_daily_spending_history(user_id: int) -> pd.DataFrame:
+    """The query get_daily_spending_history ran before the rollup, including its per-call engine."""
+    engine = create_engine(database.DataBase_URL)
+    query = f'''
+     SELECT date,amount
+     FROM transactions
+     JOIN accounts ON transactions.account_id = accounts.id
+     WHERE accounts.user_id = {user_id} AND transactions.type = 'Debit'
+     '''
+    df = pd.read_sql(query, engine, parse_dates=['date'])
+    df.set_index('date', inplace=True)
+    return df['amount'].resample('D').sum().fillna(0).to_frame(name="total_spending")
+
+
+def _best_of(func, *args, repeats: int = 5):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run(sizes) -> list[dict]:
+    results = []
+    for n_rows in sizes:
+        use_temporary_database()
+        user_id = create_user()
+        df = make_transactions_df(n_rows)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.save_transactions_to_db(df, user_id, 'XXXX1234', 'SBI')
+        save_s = time.perf_counter() - start
+
+        legacy_s, legacy = _best_of(legacy_daily_spending_history, user_id)
+        rollup_s, history = _best_of(get_daily_spending_history, user_id)
+        results.append({
+            'rows': n_rows,
+            'days': len(history),
+            'save_s': save_s,
+            'legacy_s': legacy_s,
+            'rollup_s': rollup_s,
+            'max_abs_diff': float(np.max(np.abs(legacy['total_spending'].to_numpy() - history['total_spending'].to_numpy()))),
+        })
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>8} {'days':>6} {'save':>8} {'scan':>9} {'rollup':>9} {'speedup':>8} {'max diff':>9}")
+    for row in run(args.sizes):
+        print(f"{row['rows']:>8} {row['days']:>6} {row['save_s']:7.2f}s {row['legacy_s'] * 1000:7.1f}ms "
+              f"{row['rollup_s'] * 1000:7.1f}ms {row['legacy_s'] / row['rollup_s']:7.1f}x {row['max_abs_diff']:9.2g}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Read and write throughput of the SQLite storage layer under concurrent sessions.
+
+For each configuration a fresh database file is shared by --readers reader processes and
+--writers writer processes with --writer-threads threads each, all started together and run
+for --seconds. Readers repeat what the Transactions page does on a rerun (SQL totals and the
+first page of debits) against a pre-seeded user; writer threads save --batch-rows synthetic
+transactions at a time into their own accounts, as concurrent statement uploads would.
+
+Configurations:
+  legacy  rollback journal, synchronous=FULL, 2 MB cache, no mmap, the driver's 5 s busy
+          timeout and no writer queue: how utils.database behaved before WAL was configured.
+  tuned   the defaults of utils.database: WAL, synchronous=NORMAL, 64 MB cache, 256 MB mmap,
+          30 s busy timeout and one writer thread per process.
+
+    python -m benchmarks.bench_db_concurrency --readers 4 --writers 3 --writer-threads 3 --batch-rows 2000 --seconds 15
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+CONFIGS = {
+    'legacy': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_CACHE_SIZE_MB': '2',
+        'SQLITE_MMAP_SIZE_MB': '0',
+        'SQLITE_BUSY_TIMEOUT_MS': '5000',
+        'DB_SERIAL_WRITES': '0',
+    },
+    'tuned': {},
+}
+
+
+def _setup(seed_rows: int, writers: int) -> dict:
+    from utils import database
+    from benchmarks._db import create_user
+    from benchmarks.synthetic import make_transactions_df
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.create_database_and_table()
+        reader_user = create_user('reader')
+        database.save_transactions_to_db(make_transactions_df(seed_rows), reader_user, 'XXXX0000', 'SBI')
+    return {'reader_user': reader_user, 'writer_users': [create_user(f'writer_{i}') for i in range(writers)]}
+
+
+def _read_loop(user_id: int, start_at: float, stop_at: float) -> dict:
+    from utils.transaction_queries import fetch_transactions, transaction_totals
+
+    latencies, errors = [], 0
+    time.sleep(max(0.0, start_at - time.time()))
+    while time.time() < stop_at:
+        started = time.perf_counter()
+        try:
+            transaction_totals(user_id)
+            fetch_transactions(user_id, columns=['date', 'details', 'amount', 'category'], limit=100, type='Debit')
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            errors += 1
+    return {'reads': len(latencies), 'read_errors': errors, 'latencies': latencies}
+
+
+def _write_loop(user_id: int, threads: int, batch_rows: int, start_at: float, stop_at: float) -> dict:
+    from utils import database
+    from benchmarks.synthetic import make_transactions_df
+
+    totals = {'rows_written': 0, 'write_batches': 0, 'failed_batches': 0, 'write_latencies': []}
+    lock = threading.Lock()
+
+    def worker(thread_index: int):
+        batch = 0
+        time.sleep(max(0.0, start_at - time.time()))
+        while time.time() < stop_at:
+            df = make_transactions_df(batch_rows, seed=user_id * 1_000_000 + thread_index * 10_000 + batch)
+            batch += 1
+            started = time.perf_counter()
+            try:
+                result = database.save_transactions_to_db(df, user_id, f'XXXX{thread_index:04d}', 'SBI')
+                ok = result['inserted'] == batch_rows
+            except Exception:
+                result, ok = {'inserted': 0}, False
+            with lock:
+                totals['write_batches'] += 1
+                totals['rows_written'] += result['inserted']
+                totals['failed_batches'] += not ok
+                totals['write_latencies'].append(time.perf_counter() - started)
+
+    # redirect_stdout swaps sys.stdout for the whole process, so it silences every thread, the writer's included.
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    return totals
+
+
+def _run_config(name: str, db_dir: Path, readers: int, writers: int, writer_threads: int,
+                batch_rows: int, seconds: float, seed_rows: int) -> dict:
+    env = {**CONFIGS[name], 'FINANCE_DB_URL': f"sqlite:///{db_dir / f'{name}.db'}"}
+    previous = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        # Spawned processes inherit the environment at start, so they import utils.database with this config.
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(readers + writers) as pool:
+            users = pool.apply(_setup, (seed_rows, writers))
+            start_at = time.time() + 2.0
+            stop_at = start_at + seconds
+            read_jobs = [pool.apply_async(_read_loop, (users['reader_user'], start_at, stop_at)) for _ in range(readers)]
+            write_jobs = [pool.apply_async(_write_loop, (user_id, writer_threads, batch_rows, start_at, stop_at))
+                          for user_id in users['writer_users']]
+            read_results = [job.get() for job in read_jobs]
+            write_results = [job.get() for job in write_jobs]
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    read_latencies = np.array([latency for result in read_results for latency in result['latencies']])
+    write_latencies = np.array([latency for result in write_results for latency in result['write_latencies']])
+    return {
+        'config': name,
+        'reads_per_s': len(read_latencies) / seconds,
+        'read_p50_ms': float(np.percentile(read_latencies, 50)) * 1000 if len(read_latencies) else float('nan'),
+        'read_p95_ms': float(np.percentile(read_latencies, 95)) * 1000 if len(read_latencies) else float('nan'),
+        'read_errors': sum(result['read_errors'] for result in read_results),
+        'rows_per_s': sum(result['rows_written'] for result in write_results) / seconds,
+        'write_p95_ms': float(np.percentile(write_latencies, 95)) * 1000 if len(write_latencies) else float('nan'),
+        'write_batches': sum(result['write_batches'] for result in write_results),
+        'failed_batches': sum(result['failed_batches'] for result in write_results),
+    }
+
+
+def run(configs=('legacy', 'tuned'), readers: int = 4, writers: int = 3, writer_threads: int = 3,
+        batch_rows: int = 2000, seconds: float = 15.0, seed_rows: int = 20_000) -> list[dict]:
+    with tempfile.TemporaryDirectory(prefix='finance_bench_') as tmp:
+        return [_run_config(name, Path(tmp), readers, writers, writer_threads, batch_rows, seconds, seed_rows)
+                for name in configs]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=list(CONFIGS))
+    arg_parser.add_argument('--readers', type=int, default=4)
+    arg_parser.add_argument('--writers', type=int, default=3)
+    arg_parser.add_argument('--writer-threads', type=int, default=3)
+    arg_parser.add_argument('--batch-rows', type=int, default=2000)
+    arg_parser.add_argument('--seconds', type=float, default=15.0)
+    arg_parser.add_argument('--seed-rows', type=int, default=20_000, help='transactions of the user the readers query')
+    args = arg_parser.parse_args()
+
+    print(f"{'config':>7} {'reads/s':>8} {'read p50':>9} {'read p95':>9} {'read err':>9} "
+          f"{'rows/s':>8} {'write p95':>10} {'batches':>8} {'failed':>7}")
+    for row in run(args.configs, args.readers, args.writers, args.writer_threads, args.batch_rows,
+                   args.seconds, args.seed_rows):
+        print(f"{row['config']:>7} {row['reads_per_s']:8.1f} {row['read_p50_ms']:7.1f}ms {row['read_p95_ms']:7.1f}ms "
+              f"{row['read_errors']:>9} {row['rows_per_s']:8.0f} {row['write_p95_ms']:8.0f}ms "
+              f"{row['write_batches']:>8} {row['failed_batches']:>7}")
+
+
+if __name__ == '__main__':
+    main()
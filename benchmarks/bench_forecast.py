@@ -0,0 +1,88 @@
+"""RecursiveForecaster vs the Forecasting page's original DataFrame loop, per horizon.
+
+A spending model is trained on synthetic daily spending the way the Forecasting page
+trains it, then both forecasters run for each --horizons value and their forecasts are
+compared.
+
+    python -m benchmarks.bench_forecast --horizons 30 90 180
+"""
+import argparse
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from models.predictor import FEATURES, RecursiveForecaster, create_feature
+from benchmarks.synthetic import make_transactions_df
+
+
+def make_daily_history(n_rows: int = 5_000, seed: int = 7) -> pd.DataFrame:
+    df = make_transactions_df(n_rows, seed=seed)
+    debits = df[df['type'] == 'Debit'].set_index('date')
+    return debits['amount'].resample('D').sum().fillna(0).to_frame(name='total_spending')
+
+
+def legacy_forecast(model, historical_data: pd.DataFrame, forecasting_days: int) -> pd.DataFrame:
+    """The loop pages/03_Forecasting.py ran before RecursiveForecaster."""
+    last_known_day = historical_data.index.max()
+    future_dates = pd.date_range(start=last_known_day + timedelta(days=1), periods=forecasting_days)
+    forecasted_df = pd.DataFrame(index=future_dates, columns=["total_spending"])
+    temp_df = historical_data.copy()
+    for date in future_dates:
+        full_featured_df = create_feature(temp_df.tail(30))
+        x_to_predict = full_featured_df.tail(1)[FEATURES]
+        prediction = model.predict(x_to_predict)[0]
+        forecasted_df.loc[date, 'total_spending'] = prediction
+        new_row = pd.DataFrame({'total_spending': [prediction]}, index=[date])
+        temp_df = pd.concat([temp_df, new_row])
+    return forecasted_df
+
+
+def run(horizons, n_rows: int = 5_000) -> list[dict]:
+    history = make_daily_history(n_rows)
+    featured = create_feature(history)
+    model = RandomForestRegressor(n_estimators=100, random_state=34, n_jobs=-1)
+    model.fit(featured[FEATURES], featured['total_spending'])
+
+    results = []
+    for days in horizons:
+        start = time.perf_counter()
+        legacy = legacy_forecast(model, history, days)
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        forecast = RecursiveForecaster(model, history['total_spending']).forecast(days)
+        engine_s = time.perf_counter() - start
+
+        results.append({
+            'days': days,
+            'legacy_s': legacy_s,
+            'engine_s': engine_s,
+            'same_dates': forecast.index.equals(legacy.index),
+            'max_abs_diff': float(np.max(np.abs(forecast['total_spending'].to_numpy()
+                                                - legacy['total_spending'].to_numpy(dtype=float)))),
+        })
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--horizons', type=int, nargs='+', default=[30, 90, 180])
+    arg_parser.add_argument('--rows', type=int, default=5_000, help='synthetic transactions behind the history')
+    args = arg_parser.parse_args()
+
+    # The traced stages record spans, keep them out of finance_tracker.db.
+    from benchmarks._db import use_temporary_database
+    use_temporary_database()
+
+    print(f"{'days':>5} {'loop':>9} {'engine':>9} {'per day':>10} {'speedup':>8} {'max diff':>9} {'dates':>6}")
+    for row in run(args.horizons, args.rows):
+        print(f"{row['days']:>5} {row['legacy_s']:8.3f}s {row['engine_s']:8.3f}s "
+              f"{row['engine_s'] / row['days'] * 1000:8.2f}ms {row['legacy_s'] / row['engine_s']:7.1f}x "
+              f"{row['max_abs_diff']:9.2g} {str(row['same_dates']):>6}")
+
+
+if __name__ == '__main__':
+    main()
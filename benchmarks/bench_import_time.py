@@ -0,0 +1,110 @@
+"""Import time of the login page, checked against a startup budget.
+
+Imports the modules app.py imports at the top level, read from app.py itself (streamlit
+excluded), in a fresh interpreter --runs times, and fails if the fastest run exceeds --budget-ms
+or if any of the heavy model, PDF or plotting libraries got imported on the way. Those
+belong in the background warmup (models.warmup) or in the page that uses them.
+
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --budget-ms 1000 --top 15
+"""
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+# Top-level packages the login page must not import.
+HEAVY_MODULES = ('sklearn', 'sentence_transformers', 'torch', 'transformers', 'pdfplumber', 'pikepdf',
+                 'pytesseract', 'plotly', 'passlib', 'joblib', 'threadpoolctl')
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# Imported by the Streamlit server before app.py runs, not part of the app's own startup.
+EXCLUDED_MODULES = ('streamlit',)
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+seconds = time.perf_counter() - start
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{'seconds': seconds, 'heavy': heavy}}))
+"""
+
+
+def login_modules(app_path: Path = REPO_ROOT / 'app.py') -> tuple[str, ...]:
+    """The modules app.py imports at module level, in order, those under EXCLUDED_MODULES left out."""
+    modules = []
+    for node in ast.parse(app_path.read_text(encoding='utf-8')).body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return tuple(dict.fromkeys(module for module in modules if module.split('.')[0] not in EXCLUDED_MODULES))
+
+
+def _probe(modules, importtime: bool = False) -> tuple[dict, str]:
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []),
+               '-c', _PROBE.format(modules=tuple(modules), heavy=HEAVY_MODULES)]
+    completed = subprocess.run(command, capture_output=True, text=True, check=True, cwd=REPO_ROOT)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def _slowest_imports(importtime_log: str, top: int, own_modules) -> list[tuple[str, int]]:
+    """Packages by the cumulative time of their root import in microseconds, the app's own excluded.
+    A package's time includes the packages it imports, so pandas includes numpy."""
+    own = {module.split('.')[0] for module in own_modules}
+    packages = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if '.' in name or name.startswith('_') or name in own:
+            continue
+        packages[name] = max(packages.get(name, 0), int(cumulative))
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def run(modules=None, runs: int = 3, top: int = 10) -> dict:
+    """Fastest of runs cold imports of modules (app.py's by default), the heavy modules they
+    pulled in and the slowest packages."""
+    modules = login_modules() if modules is None else tuple(modules)
+    timings = []
+    heavy = set()
+    for _ in range(runs):
+        result, _ = _probe(modules)
+        timings.append(result['seconds'])
+        heavy.update(result['heavy'])
+    _, importtime_log = _probe(modules, importtime=True)
+    return {'modules': modules, 'seconds': min(timings), 'timings': timings, 'heavy': sorted(heavy),
+            'slowest': _slowest_imports(importtime_log, top, modules)}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--budget-ms', type=float, default=1500, help='allowed import time of the login page')
+    arg_parser.add_argument('--runs', type=int, default=3, help='fresh interpreters, the fastest counts')
+    arg_parser.add_argument('--top', type=int, default=10, help='slowest packages to list')
+    args = arg_parser.parse_args()
+
+    result = run(runs=args.runs, top=args.top)
+    print(f"Login page imports ({', '.join(result['modules'])}): {result['seconds'] * 1000:.0f}ms "
+          f"(budget {args.budget_ms:.0f}ms, runs {', '.join(f'{s * 1000:.0f}ms' for s in result['timings'])})")
+    print(f"\n{'package':<24} {'cumulative':>10}")
+    for package, microseconds in result['slowest']:
+        print(f"{package:<24} {microseconds / 1000:8.1f}ms")
+
+    failures = []
+    if result['heavy']:
+        failures.append(f"heavy modules imported at startup: {', '.join(result['heavy'])}")
+    if result['seconds'] * 1000 > args.budget_ms:
+        failures.append(f"{result['seconds'] * 1000:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+    for failure in failures:
+        print(f"\nFAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
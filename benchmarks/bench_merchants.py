@@ -0,0 +1,64 @@
+"""Merchant extraction at ingest vs the Dashboard's per-render split of each narration.
+
+Times utils.merchants.extract_merchants, the vectorized pass run once when transactions are
+saved, against the per-row clean_transaction_detail apply the Dashboard ran on every render,
+and checks both against the true merchant of labelled synthetic narrations.
+
+    python -m benchmarks.bench_merchants --rows 10000 50000
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import make_labeled_narrations
+from utils.merchants import extract_merchants
+
+
+def legacy_clean_transaction_detail(detail: str) -> str:
+    """The summary pages/02_Dashboard.py computed per row before merchants were stored."""
+    parts = detail.split('/')
+    try:
+        if 'DR' in parts:
+            index = parts.index('DR')
+            return parts[index + 1].strip()
+        elif 'CR' in parts:
+            index = parts.index('CR')
+            return parts[index + 1].strip()
+    except (ValueError, IndexError):
+        return detail[:40]
+    return detail[:40]
+
+
+def run(sizes=(10_000, 50_000)) -> list[dict]:
+    results = []
+    for rows in sizes:
+        df = make_labeled_narrations(rows)
+        start = time.perf_counter()
+        legacy = df['details'].apply(legacy_clean_transaction_detail)
+        legacy_s = time.perf_counter() - start
+        start = time.perf_counter()
+        merchants = extract_merchants(df['details'])
+        engine_s = time.perf_counter() - start
+        results.append({
+            'rows': rows,
+            'legacy_s': legacy_s,
+            'engine_s': engine_s,
+            'legacy_accuracy': float((legacy.str.upper() == df['merchant']).mean()),
+            'engine_accuracy': float((merchants == df['merchant']).mean()),
+            'distinct_merchants': int(merchants.nunique()),
+        })
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 50_000])
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>7} {'legacy':>9} {'engine':>9} {'rows/s':>9} {'legacy acc':>11} {'engine acc':>11} {'merchants':>10}")
+    for row in run(args.rows):
+        print(f"{row['rows']:>7} {row['legacy_s']:8.3f}s {row['engine_s']:8.3f}s {row['rows'] / row['engine_s']:9.0f} "
+              f"{row['legacy_accuracy']:11.1%} {row['engine_accuracy']:11.1%} {row['distinct_merchants']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Model registry lookups vs loading the spending model from disk on every forecast.
+
+Trains --users spending models on synthetic histories (100-tree forests like
+spending_predictor) into a temporary directory, then simulates --requests forecast requests
+spread over the users: once with joblib.load per request, as load_model used to do, and
+once through a ModelRegistry with a --budget-mb memory budget. Reports latency per request,
+per-model load latency and size, cache hit rate, and the load time of one model saved and
+loaded plainly, memory-mapped and compressed.
+
+    python -m benchmarks.bench_model_registry --users 8 --requests 200 --budget-mb 64
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from models.model_registry import ModelRegistry
+from models.predictor import FEATURES, create_feature
+from benchmarks.bench_forecast import make_daily_history
+
+
+def train_models(directory: Path, users: int) -> dict:
+    paths = {}
+    for user_id in range(1, users + 1):
+        featured = create_feature(make_daily_history(3_000, seed=user_id))
+        model = RandomForestRegressor(n_estimators=100, random_state=34, n_jobs=-1)
+        model.fit(featured[FEATURES], featured['total_spending'])
+        paths[user_id] = directory / f"spending_predictor_user_{user_id}.joblib"
+        joblib.dump(model, paths[user_id])
+    return paths
+
+
+def _compare_load_modes(model_path: Path, directory: Path, repeats: int = 10) -> dict:
+    model = joblib.load(model_path)
+    compressed_path = directory / 'compressed.joblib'
+    joblib.dump(model, compressed_path, compress=3)
+    results = {}
+    for name, path, mmap_mode in (('plain', model_path, None), ('mmap', model_path, 'r'),
+                                  ('compress=3', compressed_path, None)):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            joblib.load(path, mmap_mode=mmap_mode)
+            timings.append(time.perf_counter() - start)
+        results[name] = {'load_ms': min(timings) * 1000, 'file_kb': path.stat().st_size / 1024}
+    return results
+
+
+def run(users: int = 8, requests: int = 200, budget_mb: float = 64, seed: int = 3) -> dict:
+    rng = np.random.default_rng(seed)
+    # A few users are much more active than the rest, as on a real server.
+    weights = 1 / np.arange(1, users + 1)
+    request_users = rng.choice(np.arange(1, users + 1), size=requests, p=weights / weights.sum())
+
+    with tempfile.TemporaryDirectory(prefix='finance_bench_') as tmp:
+        paths = train_models(Path(tmp), users)
+
+        start = time.perf_counter()
+        for user_id in request_users:
+            joblib.load(paths[user_id])
+        disk_s = time.perf_counter() - start
+
+        load_modes = _compare_load_modes(paths[1], Path(tmp))
+
+        registry = ModelRegistry(max_bytes=budget_mb * 2**20)
+        start = time.perf_counter()
+        for user_id in request_users:
+            registry.get(user_id, paths[user_id])
+        registry_s = time.perf_counter() - start
+        stats = registry.stats()
+
+    return {
+        'requests': requests,
+        'disk_ms_per_request': disk_s / requests * 1000,
+        'registry_ms_per_request': registry_s / requests * 1000,
+        'load_modes': load_modes,
+        'per_model': stats['per_model'],
+        'hit_rate': stats['hit_rate'],
+        'evictions': stats['evictions'],
+        'cached_mb': stats['bytes'] / 2**20,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--users', type=int, default=8)
+    arg_parser.add_argument('--requests', type=int, default=200)
+    arg_parser.add_argument('--budget-mb', type=float, default=64)
+    args = arg_parser.parse_args()
+
+    # The traced stages record spans, keep them out of finance_tracker.db.
+    from benchmarks._db import use_temporary_database
+    use_temporary_database()
+
+    result = run(args.users, args.requests, args.budget_mb)
+    print(f"{result['requests']} requests: joblib.load every time {result['disk_ms_per_request']:.1f} ms/request, "
+          f"registry {result['registry_ms_per_request']:.2f} ms/request "
+          f"(hit rate {result['hit_rate']:.0%}, {result['evictions']} evictions, {result['cached_mb']:.1f} MB cached)")
+    for name, mode in result['load_modes'].items():
+        print(f"  {name:>10} load {mode['load_ms']:6.1f} ms, file {mode['file_kb']:7.0f} KB")
+    print("cached models:")
+    for user_id, entry in result['per_model'].items():
+        print(f"  user {user_id}: loaded in {entry['load_seconds'] * 1000:.1f} ms, "
+              f"{entry['bytes'] / 2**20:.2f} MB, {entry['hits']} hits")
+
+
+if __name__ == '__main__':
+    main()
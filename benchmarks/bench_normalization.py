@@ -0,0 +1,89 @@
+"""Columnar normalize_transactions vs the row-wise apply post-processing the parsers used.
+
+Raw statement rows (date strings, comma-grouped amounts, blank cells) are generated from
+the synthetic transactions, pushed through both pipelines and compared before timings
+are reported.
+
+    python -m benchmarks.bench_normalization --sizes 1000 10000 100000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from utils.parsers import normalize_transactions
+from benchmarks.synthetic import make_transactions_df
+
+DATE_FORMAT = '%d %b %Y'
+
+
+def make_raw_rows(n_rows: int, seed: int = 7) -> pd.DataFrame:
+    """Transactions as pdfplumber returns them: strings, thousands separators, empty cells."""
+    df = make_transactions_df(n_rows, seed=seed)
+    amounts = df['amount'].map('{:,.2f}'.format)
+    is_credit = df['type'] == 'Credit'
+    return pd.DataFrame({
+        'Date': df['date'].dt.strftime(DATE_FORMAT),
+        'Details': df['details'],
+        'Debit': amounts.where(~is_credit, ''),
+        'Credit': amounts.where(is_credit, None),
+    })
+
+
+def legacy_normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """The per-parser post-processing this benchmark compares against."""
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['Date'], format=DATE_FORMAT, errors='coerce')
+    df.dropna(subset=['date'], inplace=True)
+    df.rename(columns={'Details': 'details', 'Debit': 'debit', 'Credit': 'credit'}, inplace=True)
+    df['debit'] = pd.to_numeric(df['debit'].str.replace(',', '', regex=False), errors='coerce')
+    df['credit'] = pd.to_numeric(df['credit'].str.replace(',', '', regex=False), errors='coerce')
+    df.fillna({'debit': 0, 'credit': 0}, inplace=True)
+    df['amount'] = df.apply(lambda r: r['credit'] if r['credit'] > 0 else r['debit'], axis=1)
+    df['type'] = df.apply(lambda r: 'Credit' if r['credit'] > 0 else 'Debit', axis=1)
+    return df[['date', 'details', 'amount', 'type']]
+
+
+def run(sizes) -> list[dict]:
+    results = []
+    for n_rows in sizes:
+        raw = make_raw_rows(n_rows)
+
+        start = time.perf_counter()
+        legacy = legacy_normalize(raw)
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        normalized = normalize_transactions(date=raw['Date'], details=raw['Details'], debit=raw['Debit'],
+                                            credit=raw['Credit'], date_format=DATE_FORMAT, drop_invalid_dates=True)
+        columnar_s = time.perf_counter() - start
+
+        results.append({
+            'rows': n_rows,
+            'legacy_s': legacy_s,
+            'columnar_s': columnar_s,
+            'identical': normalized.astype({'type': object}).equals(legacy),
+            'type_bytes': int(normalized['type'].memory_usage(deep=True)),
+            'legacy_type_bytes': int(legacy['type'].memory_usage(deep=True)),
+        })
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    args = arg_parser.parse_args()
+
+    # The traced stages record spans, keep them out of finance_tracker.db.
+    from benchmarks._db import use_temporary_database
+    use_temporary_database()
+
+    print(f"{'rows':>8} {'apply':>10} {'columnar':>10} {'speedup':>8} {'type column':>22} {'identical':>10}")
+    for row in run(args.sizes):
+        type_memory = f"{row['legacy_type_bytes'] // 1024}K -> {row['type_bytes'] // 1024}K"
+        print(f"{row['rows']:>8} {row['legacy_s']:9.3f}s {row['columnar_s']:9.3f}s "
+              f"{row['legacy_s'] / row['columnar_s']:7.1f}x {type_memory:>22} {str(row['identical']):>10}")
+
+
+if __name__ == '__main__':
+    main()
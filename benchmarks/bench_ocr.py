@@ -0,0 +1,69 @@
+"""Full-page OCR: serial vs worker pool vs a repeat upload served from the OCR cache.
+
+Needs a tesseract binary (on PATH or via $TESSERACT_CMD). The statement's pages are
+repeated --repeat times, as in bench_table_extraction.
+
+    python -m benchmarks.bench_ocr --pdf statement.pdf --password secret --repeat 4
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+import pytesseract
+
+from utils.ocr import OcrEngine, OCR_WORKERS, OCR_DPI
+from utils.pdf_session import PdfSession
+from benchmarks._db import use_temporary_database
+from benchmarks.bench_table_extraction import inflate_pdf
+
+
+def _timed_ocr(engine, session):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        texts = engine.ocr_pages(session, range(session.page_count))
+    return time.perf_counter() - start, texts
+
+
+def run(pdf_path: str, password: str = '', repeat: int = 4, workers: int = OCR_WORKERS, dpi: int = OCR_DPI) -> dict:
+    use_temporary_database()
+    pdf_bytes = inflate_pdf(pdf_path, password, repeat)
+    with PdfSession(pdf_bytes) as session:
+        serial_s, serial_texts = _timed_ocr(OcrEngine(dpi=dpi, workers=1, use_cache=False), session)
+        parallel_s, parallel_texts = _timed_ocr(OcrEngine(dpi=dpi, workers=workers, use_cache=False), session)
+        cached_engine = OcrEngine(dpi=dpi, workers=workers)
+        _timed_ocr(cached_engine, session)
+        cached_s, cached_texts = _timed_ocr(cached_engine, session)
+        return {
+            'pages': session.page_count,
+            'workers': workers,
+            'serial_s': serial_s,
+            'parallel_s': parallel_s,
+            'cached_s': cached_s,
+            'identical': serial_texts == parallel_texts == cached_texts,
+        }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--pdf', required=True)
+    arg_parser.add_argument('--password', default='')
+    arg_parser.add_argument('--repeat', type=int, default=4)
+    arg_parser.add_argument('--workers', type=int, default=OCR_WORKERS)
+    arg_parser.add_argument('--dpi', type=int, default=OCR_DPI)
+    args = arg_parser.parse_args()
+
+    try:
+        pytesseract.get_tesseract_version()
+    except pytesseract.TesseractNotFoundError:
+        sys.exit("tesseract was not found, set TESSERACT_CMD to run this benchmark.")
+
+    result = run(args.pdf, args.password, args.repeat, args.workers, args.dpi)
+    print(f"{result['pages']} pages: serial {result['serial_s']:.2f}s, "
+          f"{result['workers']} workers {result['parallel_s']:.2f}s, "
+          f"cached {result['cached_s']:.3f}s, identical={result['identical']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Sort-based get_passthrough_transactions vs the original credit-by-credit loop.
+
+The synthetic history injects forwarded transfers (a large credit followed by a
+similar debit a few hours later) so both matchers have real work to do. Results are
+compared pair by pair up to --legacy-max-rows before timings are reported.
+
+    python -m benchmarks.bench_passthrough --sizes 1000 10000 100000
+"""
+import argparse
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from utils.transaction_analyzer import get_passthrough_transactions
+from benchmarks.synthetic import make_transactions_df
+
+
+def legacy_get_passthrough_transactions(df, time_window_hours=24, amount_tolerance=0.2, min_amount=1000.0):
+    """The quadratic implementation this benchmark compares against."""
+    df = df.sort_values('date').reset_index()
+    credits = df[(df['type'] == 'Credit') & (df['is_pass_through'] == False) & (df['amount'] >= min_amount)]
+    debits = df[(df['type'] == 'Debit') & (df['is_pass_through'] == False) & (df['amount'] >= min_amount)]
+    potential_pairs = []
+    used_debits_indices = set()
+    for credit_idx, credit_row in credits.iterrows():
+        time_window_end = credit_row['date'] + timedelta(hours=time_window_hours)
+        lower_bound = credit_row['amount'] * (1 - amount_tolerance)
+        upper_bound = credit_row['amount'] * (1 + amount_tolerance)
+        possible_matches = debits[
+            (debits['date'] > credit_row['date']) &
+            (debits['date'] <= time_window_end) &
+            (debits['amount'] >= lower_bound) &
+            (debits['amount'] <= upper_bound) &
+            (~debits.index.isin(used_debits_indices))
+        ]
+        if not possible_matches.empty:
+            best_match = possible_matches.iloc[0]
+            potential_pairs.append({'credits': credit_row.to_dict(), 'debits': best_match.to_dict()})
+            used_debits_indices.add(best_match.name)
+    return potential_pairs
+
+
+def make_history(n_rows: int, seed: int = 11) -> pd.DataFrame:
+    df = make_transactions_df(n_rows, seed=seed)
+    rng = np.random.default_rng(seed)
+    credits = df[df['type'] == 'Credit'].sample(frac=0.3, random_state=seed)
+    forwarded = credits.copy()
+    forwarded['type'] = 'Debit'
+    forwarded['date'] = forwarded['date'] + pd.to_timedelta(rng.integers(10, 60 * 30, len(forwarded)), unit='m')
+    forwarded['amount'] = np.round(forwarded['amount'] * rng.uniform(0.85, 1.1, len(forwarded)), 2)
+    df = pd.concat([df, forwarded]).iloc[:n_rows].reset_index(drop=True)
+    df['id'] = np.arange(1, len(df) + 1)
+    df['category'] = 'Uncategorized'
+    df['is_pass_through'] = rng.random(len(df)) < 0.02
+    return df
+
+
+def _pair_keys(pairs):
+    return [(pair['credits']['id'], pair['debits']['id']) for pair in pairs]
+
+
+def run(sizes, legacy_max_rows=10_000):
+    results = []
+    for n_rows in sizes:
+        df = make_history(n_rows)
+        start = time.perf_counter()
+        pairs = get_passthrough_transactions(df)
+        row = {'rows': n_rows, 'pairs': len(pairs), 'vectorized_s': time.perf_counter() - start}
+        if n_rows <= legacy_max_rows:
+            start = time.perf_counter()
+            legacy_pairs = legacy_get_passthrough_transactions(df)
+            row['legacy_s'] = time.perf_counter() - start
+            row['identical'] = _pair_keys(pairs) == _pair_keys(legacy_pairs)
+        results.append(row)
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    arg_parser.add_argument('--legacy-max-rows', type=int, default=10_000,
+                            help='skip the original loop above this size (it is quadratic)')
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>8} {'pairs':>7} {'vectorized':>11} {'loop':>11} {'identical':>10}")
+    for row in run(args.sizes, args.legacy_max_rows):
+        legacy = f"{row['legacy_s']:10.3f}s" if 'legacy_s' in row else f"{'skipped':>11}"
+        identical = str(row['identical']) if 'identical' in row else '-'
+        print(f"{row['rows']:>8} {row['pairs']:>7} {row['vectorized_s']:10.3f}s {legacy} {identical:>10}")
+
+
+if __name__ == '__main__':
+    main()
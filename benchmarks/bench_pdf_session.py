@@ -0,0 +1,96 @@
+"""Extraction calls and peak Python memory per upload: PdfSession vs the previous open path.
+
+The previous path re-saved the whole document with pikepdf into a new buffer, then
+extracted page text for bank identification (pages 0-1), SBI format detection (page 0)
+and the account number (page 0) before extracting every page's table. The session run
+goes through BankStatementParser.get_transactions.
+
+    python -m benchmarks.bench_pdf_session --pdf statement.pdf --password secret
+"""
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+from io import BytesIO
+
+import pdfplumber
+import pikepdf
+from pdfplumber.page import Page
+
+from utils.bank_parser import BankStatementParser
+
+
+class _CallCounter:
+    def __init__(self):
+        self.counts = {'extract_text': 0, 'extract_table': 0}
+
+    def __enter__(self):
+        self._originals = {name: getattr(Page, name) for name in self.counts}
+        for name, original in self._originals.items():
+            setattr(Page, name, self._wrap(name, original))
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self._originals.items():
+            setattr(Page, name, original)
+
+    def _wrap(self, name, original):
+        def counted(page, *args, **kwargs):
+            self.counts[name] += 1
+            return original(page, *args, **kwargs)
+        return counted
+
+
+def legacy_extract(pdf_stream, password):
+    pdf_file = pikepdf.open(pdf_stream, password=password)
+    pdf_bytes = BytesIO()
+    pdf_file.save(pdf_bytes)
+    pdf_bytes.seek(0)
+    with pdfplumber.open(pdf_bytes) as pdf:
+        for page in pdf.pages[:2]:
+            page.extract_text(x_tolerance=1, y_tolerance=3)
+        pdf.pages[0].extract_text(x_tolerance=1, y_tolerance=3)
+        pdf.pages[0].extract_text()
+        return [page.extract_table() for page in pdf.pages]
+
+
+def _measure(func):
+    # Warm-up run, so lazily imported modules are not counted as peak memory.
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    with _CallCounter() as counter, contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {'seconds': elapsed, 'peak_mb': peak / 2**20, **counter.counts}
+
+
+def run(pdf_path: str, password: str = '') -> dict:
+    data = open(pdf_path, 'rb').read()
+    return {
+        'legacy': _measure(lambda: legacy_extract(BytesIO(data), password)),
+        'session': _measure(lambda: BankStatementParser(BytesIO(data), password).get_transactions()),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--pdf', required=True)
+    arg_parser.add_argument('--password', default='')
+    args = arg_parser.parse_args()
+
+    # The traced stages record spans, keep them out of finance_tracker.db.
+    from benchmarks._db import use_temporary_database
+    use_temporary_database()
+
+    for name, result in run(args.pdf, args.password).items():
+        print(f"{name:>8}: {result['extract_text']} text + {result['extract_table']} table extractions, "
+              f"peak {result['peak_mb']:.1f} MiB, {result['seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
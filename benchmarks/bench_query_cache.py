@@ -0,0 +1,80 @@
+"""Transactions page reruns with the versioned query cache vs querying the database every time.
+
+One user's --rows synthetic transactions are saved into a temporary database, then --reruns
+reruns of the Transactions page's queries (filter options, SQL totals, first page of credits
+and of debits) are timed without and with utils.query_cache. Every --write-every reruns one
+transaction's category is edited, which bumps the user's data version, so the cached run also
+pays for the recomputation after each write.
+
+    python -m benchmarks.bench_query_cache --rows 100000 --reruns 200 --write-every 20
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import pandas as pd
+
+from utils import database
+from utils import query_cache
+from utils.query_cache import QueryCache, user_cached
+from utils.transaction_queries import fetch_transactions, transaction_totals, transaction_filter_options
+from benchmarks._db import use_temporary_database, create_user
+from benchmarks.synthetic import make_transactions_df
+
+
+def _rerun(user_id: int, fetch, totals, options):
+    options(user_id)
+    totals(user_id)
+    fetch(user_id, columns=('date', 'details', 'amount'), limit=100, type='Credit')
+    fetch(user_id, columns=('date', 'details', 'amount', 'category'), limit=100, type='Debit')
+
+
+def _timed_reruns(user_id: int, reruns: int, write_every: int, transaction_ids: list, fetch, totals, options) -> float:
+    start = time.perf_counter()
+    for i in range(reruns):
+        if write_every and i and i % write_every == 0:
+            database.update_transaction_category(pd.DataFrame({'id': [transaction_ids[i]], 'category': ['Shopping']}))
+        _rerun(user_id, fetch, totals, options)
+    return time.perf_counter() - start
+
+
+def run(rows: int = 100_000, reruns: int = 200, write_every: int = 20) -> dict:
+    use_temporary_database()
+    user_id = create_user()
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.save_transactions_to_db(make_transactions_df(rows), user_id, 'XXXX1234', 'SBI')
+    transaction_ids = fetch_transactions(user_id, columns=('id',), limit=reruns)[0]['id'].tolist()
+
+    direct_s = _timed_reruns(user_id, reruns, write_every, transaction_ids,
+                             fetch_transactions, transaction_totals, transaction_filter_options)
+
+    query_cache._query_cache = QueryCache()
+    cached_s = _timed_reruns(user_id, reruns, write_every, transaction_ids, user_cached(fetch_transactions),
+                             user_cached(transaction_totals), user_cached(transaction_filter_options))
+    return {
+        'rows': rows,
+        'reruns': reruns,
+        'direct_ms_per_rerun': direct_s / reruns * 1000,
+        'cached_ms_per_rerun': cached_s / reruns * 1000,
+        **query_cache.get_query_cache().stats(),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=100_000)
+    arg_parser.add_argument('--reruns', type=int, default=200)
+    arg_parser.add_argument('--write-every', type=int, default=20, help='reruns between category edits, 0 for none')
+    args = arg_parser.parse_args()
+
+    result = run(args.rows, args.reruns, args.write_every)
+    print(f"{result['reruns']} reruns over {result['rows']} transactions: "
+          f"direct {result['direct_ms_per_rerun']:.1f} ms/rerun, cached {result['cached_ms_per_rerun']:.1f} ms/rerun "
+          f"({result['direct_ms_per_rerun'] / result['cached_ms_per_rerun']:.1f}x)")
+    print(f"cache: {result['hits']} hits, {result['misses']} misses ({result['stale']} after writes), "
+          f"hit rate {result['hit_rate']:.0%}")
+
+
+if __name__ == '__main__':
+    main()
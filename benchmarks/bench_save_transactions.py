@@ -0,0 +1,90 @@
+"""Bulk deduplicating insert vs the old per-row SELECT loop in save_transactions_to_db.
+
+Each size is measured twice: a first upload into an empty account and a re-upload of
+the same statement, where every row is a duplicate. The per-row loop is skipped above
+--legacy-max-rows because its re-upload pass is quadratic; raise the limit to include it.
+
+    python -m benchmarks.bench_save_transactions --sizes 1000 10000 100000
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from utils import database
+from utils.database import Accounts, Transactions, save_transactions_to_db
+from benchmarks._db import use_temporary_database, create_user
+from benchmarks.synthetic import make_transactions_df
+
+
+def legacy_save_transactions(df, user_id, account_number, bank_name):
+    """The per-row implementation this benchmark compares against."""
+    db = database.SessionLocal()
+    try:
+        account = db.query(Accounts).filter_by(user_id=user_id, account_number=account_number, bank_name=bank_name).first()
+        if not account:
+            account = Accounts(user_id=user_id, account_number=account_number, bank_name=bank_name)
+            db.add(account)
+            db.commit()
+            db.refresh(account)
+        transaction_add = []
+        for _, row in df.iterrows():
+            exists = db.query(Transactions).filter_by(
+                account_id=account.id,
+                date=row['date'].to_pydatetime(),
+                details=row['details'],
+                amount=row['amount'],
+                type=row['type'],
+            ).first()
+            if not exists:
+                transaction_add.append(Transactions(**row, account_id=account.id))
+        if transaction_add:
+            db.add_all(transaction_add)
+            db.commit()
+    finally:
+        db.close()
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args)
+    return time.perf_counter() - start
+
+
+def run(sizes, legacy_max_rows=10_000):
+    results = []
+    for n_rows in sizes:
+        df = make_transactions_df(n_rows)
+        row = {'rows': n_rows}
+
+        use_temporary_database()
+        user_id = create_user()
+        row['bulk_first_s'] = _timed(save_transactions_to_db, df, user_id, 'ACC1', 'Bench Bank')
+        row['bulk_reupload_s'] = _timed(save_transactions_to_db, df, user_id, 'ACC1', 'Bench Bank')
+
+        if n_rows <= legacy_max_rows:
+            use_temporary_database()
+            user_id = create_user()
+            row['legacy_first_s'] = _timed(legacy_save_transactions, df, user_id, 'ACC1', 'Bench Bank')
+            row['legacy_reupload_s'] = _timed(legacy_save_transactions, df, user_id, 'ACC1', 'Bench Bank')
+        results.append(row)
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    arg_parser.add_argument('--legacy-max-rows', type=int, default=10_000,
+                            help='skip the per-row loop above this size (it is quadratic on re-upload)')
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>8} {'bulk first':>11} {'bulk re-up':>11} {'loop first':>11} {'loop re-up':>11}")
+    for row in run(args.sizes, args.legacy_max_rows):
+        legacy_first = f"{row['legacy_first_s']:10.2f}s" if 'legacy_first_s' in row else f"{'skipped':>11}"
+        legacy_reupload = f"{row['legacy_reupload_s']:10.2f}s" if 'legacy_reupload_s' in row else f"{'skipped':>11}"
+        print(f"{row['rows']:>8} {row['bulk_first_s']:10.2f}s {row['bulk_reupload_s']:10.2f}s {legacy_first} {legacy_reupload}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Peak memory of streaming vs whole-document ingestion on synthetic long statements.
+
+Each run ingests a synthetic SBI statement of the given page count into a temporary
+database, in a freshly spawned interpreter so runs do not share allocations, and reports
+the tracemalloc peak. Streaming should stay roughly flat as the page count grows while the
+whole-document path grows with it. Table extraction runs in-process (no worker pool) so all
+parsing is measured, and timings include tracemalloc overhead.
+
+Fails if a streaming peak exceeds --max-peak-mb, or if the streaming peak at the largest page
+count is more than --max-growth times the one at the smallest.
+
+    python -m benchmarks.bench_streaming_ingest --pages 250 1000 --full-pages 250 1000
+    python -m benchmarks.bench_streaming_ingest --max-peak-mb 32 --max-growth 1.25
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.synthetic import make_statement_pdf
+
+# Streaming memory is bounded by one chunk of pages and one batch of rows, not by the statement.
+MAX_PEAK_MB = 64
+MAX_GROWTH = 1.5
+
+
+def _ingest(pdf_path: str, streaming: bool) -> dict:
+    import contextlib
+    import io
+
+    from benchmarks._db import use_temporary_database, create_user
+    from utils import table_extraction
+    from utils.ingestion import ingest_statement
+
+    table_extraction.TABLE_EXTRACTION_WORKERS = 1
+    use_temporary_database()
+    user_id = create_user()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(pdf_path, 'rb') as file_stream, contextlib.redirect_stdout(io.StringIO()):
+        result = ingest_statement(file_stream, None, user_id, streaming=streaming)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'rows': result['row_count'], 'inserted': result['inserted'], 'seconds': seconds, 'peak_mb': peak / 2**20}
+
+
+def run(stream_pages, full_pages, rows_per_page: int = 25) -> list[dict]:
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='finance_bench_') as tmp:
+        for mode, page_counts in (('streaming', stream_pages), ('whole', full_pages)):
+            for n_pages in page_counts:
+                pdf_path = Path(tmp) / f'statement_{n_pages}.pdf'
+                if not pdf_path.exists():
+                    pdf_path.write_bytes(make_statement_pdf(n_pages, rows_per_page))
+                with context.Pool(1) as pool:
+                    row = pool.apply(_ingest, (str(pdf_path), mode == 'streaming'))
+                results.append({'mode': mode, 'pages': n_pages, **row})
+    return results
+
+
+def budget_failures(results: list[dict], max_peak_mb: float | None, max_growth: float | None) -> list[str]:
+    """What the streaming runs broke of the peak and growth budgets, None leaving one unchecked."""
+    streaming = sorted((row for row in results if row['mode'] == 'streaming'), key=lambda row: row['pages'])
+    failures = []
+    if max_peak_mb is not None:
+        failures += [f"streaming {row['pages']} pages peaked at {row['peak_mb']:.1f}MB, over the {max_peak_mb:g}MB budget"
+                     for row in streaming if row['peak_mb'] > max_peak_mb]
+    if max_growth is not None and len(streaming) > 1 and streaming[-1]['pages'] > streaming[0]['pages']:
+        growth = streaming[-1]['peak_mb'] / streaming[0]['peak_mb']
+        if growth > max_growth:
+            failures.append(f"streaming peak grew {growth:.2f}x from {streaming[0]['pages']} to {streaming[-1]['pages']} "
+                            f"pages, over the {max_growth:g}x budget")
+    return failures
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--pages', type=int, nargs='+', default=[250, 1000], help='page counts for streaming')
+    arg_parser.add_argument('--full-pages', type=int, nargs='*', default=[250],
+                            help='page counts for the whole-document path')
+    arg_parser.add_argument('--rows-per-page', type=int, default=25)
+    arg_parser.add_argument('--max-peak-mb', type=float, default=MAX_PEAK_MB,
+                            help='allowed streaming peak at any page count, 0 to skip')
+    arg_parser.add_argument('--max-growth', type=float, default=MAX_GROWTH,
+                            help='allowed streaming peak at the most pages over the peak at the fewest, 0 to skip')
+    args = arg_parser.parse_args()
+
+    results = run(args.pages, args.full_pages, args.rows_per_page)
+    print(f"{'mode':>10} {'pages':>6} {'rows':>7} {'inserted':>9} {'seconds':>8} {'peak MB':>8}")
+    for row in results:
+        print(f"{row['mode']:>10} {row['pages']:>6} {row['rows']:>7} {row['inserted']:>9} "
+              f"{row['seconds']:8.1f} {row['peak_mb']:8.1f}")
+
+    failures = budget_failures(results, args.max_peak_mb or None, args.max_growth or None)
+    for failure in failures:
+        print(f"\nFAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Serial vs process-pool page table extraction on a real statement.
+
+The statement's pages are repeated --repeat times to simulate a long statement, then
+extract_page_tables is run with one worker and with --workers workers and the tables
+are compared.
+
+    python -m benchmarks.bench_table_extraction --pdf statement.pdf --password secret --repeat 10
+"""
+import argparse
+import time
+from io import BytesIO
+
+import pdfplumber
+import pikepdf
+
+from utils.table_extraction import extract_page_tables, TABLE_EXTRACTION_WORKERS
+
+
+def inflate_pdf(path: str, password: str, repeat: int) -> BytesIO:
+    with pikepdf.open(path, password=password) as source:
+        inflated = pikepdf.new()
+        for _ in range(repeat):
+            inflated.pages.extend(source.pages)
+        pdf_bytes = BytesIO()
+        inflated.save(pdf_bytes)
+    pdf_bytes.seek(0)
+    return pdf_bytes
+
+
+def run(pdf_path: str, password: str = '', repeat: int = 10, workers: int = TABLE_EXTRACTION_WORKERS) -> dict:
+    pdf_bytes = inflate_pdf(pdf_path, password, repeat)
+    with pdfplumber.open(pdf_bytes) as pdf:
+        pages = len(pdf.pages)
+        start = time.perf_counter()
+        serial_tables = extract_page_tables(pdf, workers=1)
+        serial_s = time.perf_counter() - start
+
+    with pdfplumber.open(pdf_bytes) as pdf:
+        start = time.perf_counter()
+        parallel_tables = extract_page_tables(pdf, workers=workers)
+        parallel_s = time.perf_counter() - start
+
+    return {
+        'pages': pages,
+        'workers': workers,
+        'serial_s': serial_s,
+        'parallel_s': parallel_s,
+        'identical': serial_tables == parallel_tables,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--pdf', required=True)
+    arg_parser.add_argument('--password', default='')
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    arg_parser.add_argument('--workers', type=int, default=TABLE_EXTRACTION_WORKERS)
+    args = arg_parser.parse_args()
+
+    result = run(args.pdf, args.password, args.repeat, args.workers)
+    print(f"{result['pages']} pages: serial {result['serial_s']:.2f}s, "
+          f"{result['workers']} workers {result['parallel_s']:.2f}s "
+          f"({result['serial_s'] / result['parallel_s']:.1f}x), identical={result['identical']}")
+
+
+if __name__ == '__main__':
+    main()
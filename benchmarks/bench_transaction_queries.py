@@ -0,0 +1,101 @@
+"""Paginated, projected transaction queries vs loading every column of every transaction.
+
+For each --sizes value one user's synthetic transactions are saved into a temporary database,
+then the Transactions page's data is read both ways: the old SELECT * of all the user's
+transactions followed by in-memory credit/debit filtering and sums, and the query layer's
+SQL totals plus the first --page-size page of credits and of debits.
+
+    python -m benchmarks.bench_transaction_queries --sizes 10000 100000 --page-size 100
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import pandas as pd
+
+from utils import database
+from utils.database import Transactions, Accounts
+from utils.transaction_queries import fetch_transactions, transaction_totals
+from benchmarks._db import use_temporary_database, create_user
+from benchmarks.synthetic import make_transactions_df
+
+
+def legacy_transactions_page(user_id: int) -> tuple:
+    """What pages/04_Transactions.py loaded and computed before the query layer."""
+    db = database.SessionLocal()
+    try:
+        query = db.query(Transactions).join(Accounts).filter(Accounts.user_id == user_id)
+        df = pd.read_sql(query.statement, db.bind)
+    finally:
+        db.close()
+    credit_df = df[df['type'] == 'Credit']
+    debit_df = df[df['type'] == 'Debit']
+    return credit_df['amount'].sum(), debit_df['amount'].sum()
+
+
+def paged_transactions_page(user_id: int, page_size: int) -> tuple:
+    totals = transaction_totals(user_id)
+    for type_name, columns in (('Credit', ['date', 'details', 'amount']), ('Debit', ['date', 'details', 'amount', 'category'])):
+        fetch_transactions(user_id, columns=columns, limit=page_size, type=type_name)
+    return totals['Credit']['total'], totals['Debit']['total']
+
+
+def _best_of(func, *args, repeats: int = 5):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run(sizes, page_size: int = 100) -> list[dict]:
+    results = []
+    for n_rows in sizes:
+        use_temporary_database()
+        user_id = create_user()
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.save_transactions_to_db(make_transactions_df(n_rows), user_id, 'XXXX1234', 'SBI')
+
+        legacy_s, legacy_totals = _best_of(legacy_transactions_page, user_id)
+        paged_s, paged_totals = _best_of(paged_transactions_page, user_id, page_size)
+
+        # A page deep into the debits, to show keyset pagination does not slow down with depth.
+        cursor, pages = None, 0
+        while True:
+            start = time.perf_counter()
+            _, next_cursor = fetch_transactions(user_id, columns=['date', 'amount'], after=cursor,
+                                                limit=page_size, type='Debit')
+            last_page_s = time.perf_counter() - start
+            pages += 1
+            if next_cursor is None:
+                break
+            cursor = next_cursor
+
+        results.append({
+            'rows': n_rows,
+            'legacy_s': legacy_s,
+            'paged_s': paged_s,
+            'last_page_s': last_page_s,
+            'debit_pages': pages,
+            'totals_match': all(abs(a - b) < 0.01 for a, b in zip(legacy_totals, paged_totals)),
+        })
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    arg_parser.add_argument('--page-size', type=int, default=100)
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>8} {'SELECT *':>10} {'paged':>9} {'speedup':>8} {'last page':>10} {'pages':>6} {'totals':>7}")
+    for row in run(args.sizes, args.page_size):
+        print(f"{row['rows']:>8} {row['legacy_s'] * 1000:8.1f}ms {row['paged_s'] * 1000:7.1f}ms "
+              f"{row['legacy_s'] / row['paged_s']:7.1f}x {row['last_page_s'] * 1000:8.1f}ms "
+              f"{row['debit_pages']:>6} {str(row['totals_match']):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""End-to-end benchmark suite on synthetic statements, with results saved as JSON per commit.
+
+Every case runs once to warm up (reported as first_ms) and then --repeats times; the JSON
+file holds each case's timings, its throughput and whether its output matched what the
+synthetic generator expects, together with the commit, Python version and machine it ran
+on. --compare prints each case's median against an earlier results file and flags cases
+slower by more than --threshold.
+
+Cases:
+  statement_parser.<bank>    BankStatementParser.get_transactions on an encrypted --pages statement
+  parsers.<parser>           each parser's parse() over already extracted page tables
+  database.save_transactions save_transactions_to_db of --rows transactions into a new account
+  analyzer.passthrough       get_passthrough_transactions over --rows transactions
+  categorizer.fit/predict    SmartCategorizer on --rows transactions (needs sentence-transformers)
+  lexical_categorizer.*      LexicalCategorizer fit and predict on --rows labelled narrations
+  predictor.forecast         RecursiveForecaster over --horizon days
+  ocr.pages                  uncached OcrEngine.ocr_pages on a 2-page scanned statement (needs tesseract)
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only parsers statement_parser --pages 20 --repeats 3
+    python -m benchmarks.suite --compare benchmarks/results/<commit>.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import STATEMENT_LAYOUTS, make_labeled_narrations, make_statement, make_transactions_df
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+PASSWORD = 'bench'
+
+
+def _statement_parser_cases(settings: dict):
+    from utils.bank_parser import BankStatementParser
+
+    for bank in STATEMENT_LAYOUTS:
+        pdf_bytes, expected = make_statement(bank, settings['pages'], password=PASSWORD)
+
+        def parse(pdf_bytes=pdf_bytes):
+            bank_name, parsed = BankStatementParser(BytesIO(pdf_bytes), PASSWORD).get_transactions()
+            return {'bank_name': bank_name, **parsed}
+
+        yield f'statement_parser.{bank}', parse, len(expected['transactions_df']), \
+            lambda result, expected=expected: _matches_statement(result, expected)
+
+
+def _parser_cases(settings: dict):
+    from utils.parsers import UnionBankParser, SbiParser
+    from utils.pdf_session import PdfSession
+
+    for name, bank, parser in (('UnionBankParser', 'union', UnionBankParser()), ('SbiParser.standard', 'sbi', SbiParser()),
+                               ('SbiParser.yono', 'sbi_yono', SbiParser())):
+        pdf_bytes, expected = make_statement(bank, settings['pages'])
+        session = PdfSession(BytesIO(pdf_bytes)).open()
+        session.page_tables()
+
+        def parse(session=session, parser=parser, bank_name=expected['bank_name']):
+            # Only the format detection is redone, the page text and tables stay cached in the session.
+            session.derived.clear()
+            return {'bank_name': bank_name, **parser.parse(session)}
+
+        yield f'parsers.{name}', parse, len(expected['transactions_df']), \
+            lambda result, expected=expected: _matches_statement(result, expected)
+
+
+def _database_cases(settings: dict):
+    from utils import database
+    from benchmarks._db import use_temporary_database, create_user
+
+    use_temporary_database()
+    user_id = create_user()
+    df = make_transactions_df(settings['rows'])
+    accounts = iter(range(10**6))
+
+    def save():
+        # A new account every run, so every row is inserted rather than skipped as a duplicate.
+        return database.save_transactions_to_db(df, user_id, f'XXXX{next(accounts):06d}', 'SBI')
+
+    yield 'database.save_transactions', save, len(df), lambda result: result['inserted'] == len(df)
+
+
+def _analyzer_cases(settings: dict):
+    from utils.transaction_analyzer import get_passthrough_transactions
+    from benchmarks.bench_passthrough import make_history
+
+    df = make_history(settings['rows'])
+    yield 'analyzer.passthrough', lambda: get_passthrough_transactions(df), len(df), None
+
+
+def _categorizer_cases(settings: dict):
+    from models.categorizer import SmartCategorizer, get_sbert_model
+
+    # The SBERT model loads lazily, load it here so a missing sentence-transformers skips the group.
+    get_sbert_model()
+    df = make_transactions_df(settings['rows'])
+    merchants = df['details'].str.split('/').str[3]
+    df['category'] = merchants.map({'SWIGGY': 'Food', 'ZOMATO': 'Food', 'UBER': 'Travel', 'OLA': 'Travel',
+                                    'AMAZON': 'Shopping', 'FLIPKART': 'Shopping'}).fillna('Uncategorized')
+    categorizer = SmartCategorizer()
+    details = df['details'].tolist()
+
+    yield 'categorizer.fit', lambda: categorizer.fit(df), len(df), None
+    yield 'categorizer.predict', lambda: categorizer.predict_batch(details), len(df), \
+        lambda result: len(result) == len(details)
+
+
+def _lexical_categorizer_cases(settings: dict):
+    from models.lexical_categorizer import LexicalCategorizer
+
+    df = make_labeled_narrations(settings['rows'])
+    details = df['details'].tolist()
+    categorizer = LexicalCategorizer()
+    categorizer.fit(df)
+
+    yield 'lexical_categorizer.fit', lambda: categorizer.fit(df), len(df), None
+    # Predicting its own training rows, nearly all should get their category back.
+    yield 'lexical_categorizer.predict', lambda: categorizer.predict_batch(details), len(df), \
+        lambda result: bool((result['category'].to_numpy() == df['category'].to_numpy()).mean() > 0.9)
+
+
+def _predictor_cases(settings: dict):
+    from sklearn.ensemble import RandomForestRegressor
+    from models.predictor import FEATURES, RecursiveForecaster, create_feature
+    from benchmarks.bench_forecast import make_daily_history
+
+    history = make_daily_history()
+    featured = create_feature(history)
+    model = RandomForestRegressor(n_estimators=100, random_state=34, n_jobs=1)
+    model.fit(featured[FEATURES], featured['total_spending'])
+    horizon = settings['horizon']
+    yield 'predictor.forecast', lambda: RecursiveForecaster(model, history['total_spending']).forecast(horizon), \
+        horizon, lambda result: len(result) == horizon
+
+
+def _ocr_cases(settings: dict):
+    from utils.ocr import OcrEngine, _pytesseract
+    from utils.pdf_session import PdfSession
+    from benchmarks.synthetic import make_scanned_statement
+
+    # Raises OSError without a tesseract binary, which skips the group.
+    _pytesseract().get_tesseract_version()
+    pdf_bytes, expected = make_scanned_statement('sbi', 2)
+    session = PdfSession(BytesIO(pdf_bytes)).open()
+    # Without the cache every run OCRs the pages, the path a new scanned statement takes.
+    engine = OcrEngine(workers=1, use_cache=False)
+    yield 'ocr.pages', lambda: engine.ocr_pages(session, range(session.page_count)), session.page_count, \
+        lambda result: expected['account_number'] in result[0]
+
+
+CASE_GROUPS = {
+    'statement_parser': _statement_parser_cases,
+    'parsers': _parser_cases,
+    'database': _database_cases,
+    'analyzer': _analyzer_cases,
+    'categorizer': _categorizer_cases,
+    'lexical_categorizer': _lexical_categorizer_cases,
+    'predictor': _predictor_cases,
+    'ocr': _ocr_cases,
+}
+
+
+def _matches_statement(result: dict, expected: dict) -> bool:
+    df = result['transactions_df'].reset_index(drop=True)
+    expected_df = expected['transactions_df'].reset_index(drop=True)
+    return (result['bank_name'] == expected['bank_name'] and result['account_number'] == expected['account_number']
+            and len(df) == len(expected_df)
+            and bool((df['date'].to_numpy() == expected_df['date'].to_numpy()).all())
+            and bool((df['details'].to_numpy() == expected_df['details'].to_numpy()).all())
+            and bool(np.allclose(df['amount'].to_numpy(dtype=float), expected_df['amount'].to_numpy(dtype=float)))
+            and bool((df['type'].astype(str).to_numpy() == expected_df['type'].to_numpy()).all()))
+
+
+def _measure(func, repeats: int, units: int, check) -> dict:
+    start = time.perf_counter()
+    result = func()
+    first_s = time.perf_counter() - start
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    median_s = float(np.median(timings)) if timings else first_s
+    return {
+        'first_ms': first_s * 1000,
+        'median_ms': median_s * 1000,
+        'min_ms': min(timings, default=first_s) * 1000,
+        'max_ms': max(timings, default=first_s) * 1000,
+        'repeats': repeats,
+        'units': units,
+        'units_per_s': units / median_s if median_s else None,
+        'ok': None if check is None else bool(check(result)),
+    }
+
+
+def run(groups=tuple(CASE_GROUPS), pages: int = 20, rows: int = 10_000, horizon: int = 90, repeats: int = 5) -> dict:
+    from benchmarks._db import use_temporary_database
+
+    settings = {'pages': pages, 'rows': rows, 'horizon': horizon, 'repeats': repeats}
+    # Every group records trace spans and some read users' data, none of it may reach finance_tracker.db.
+    use_temporary_database()
+    cases = {}
+    for group in groups:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                group_cases = list(CASE_GROUPS[group](settings))
+        except ImportError as e:
+            cases[group] = {'skipped': f"missing dependency: {e.name}"}
+            continue
+        except OSError as e:
+            cases[group] = {'skipped': str(e)}
+            continue
+        for name, func, units, check in group_cases:
+            with contextlib.redirect_stdout(io.StringIO()):
+                cases[name] = _measure(func, repeats, units, check)
+    return {'meta': _environment(settings), 'cases': cases}
+
+
+def _environment(settings: dict) -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, check=True,
+                                  cwd=Path(__file__).parent).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': {module: _version(module) for module in ('numpy', 'pandas', 'pdfplumber', 'pikepdf', 'sklearn', 'sqlalchemy')},
+        'settings': settings,
+    }
+
+
+def _version(module: str) -> str | None:
+    try:
+        return __import__(module).__version__
+    except ImportError:
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.1) -> list[dict]:
+    """Median of every case present in both runs, and whether it got slower by more than threshold."""
+    rows = []
+    for name, case in current['cases'].items():
+        before = baseline['cases'].get(name)
+        if 'median_ms' not in case or not before or 'median_ms' not in before:
+            continue
+        ratio = case['median_ms'] / before['median_ms']
+        rows.append({'case': name, 'baseline_ms': before['median_ms'], 'current_ms': case['median_ms'],
+                     'ratio': ratio, 'regression': ratio > 1 + threshold})
+    return rows
+
+
+def _print_results(results: dict):
+    print(f"{'case':<30} {'first':>9} {'median':>9} {'min':>9} {'units/s':>10} {'ok':>5}")
+    for name, case in results['cases'].items():
+        if 'skipped' in case:
+            print(f"{name:<30} skipped, {case['skipped']}")
+            continue
+        ok = '-' if case['ok'] is None else str(case['ok'])
+        units_per_s = f"{case['units_per_s']:10.0f}" if case['units_per_s'] else f"{'-':>10}"
+        print(f"{name:<30} {case['first_ms']:7.1f}ms {case['median_ms']:7.1f}ms {case['min_ms']:7.1f}ms "
+              f"{units_per_s} {ok:>5}")
+
+
+def _print_comparison(rows: list[dict], baseline: dict):
+    commit = (baseline['meta'].get('commit') or 'unknown')[:10]
+    print(f"\nCompared with {commit} ({baseline['meta'].get('created_at')}):")
+    print(f"{'case':<30} {'baseline':>9} {'current':>9} {'ratio':>7}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['case']:<30} {row['baseline_ms']:7.1f}ms {row['current_ms']:7.1f}ms {row['ratio']:6.2f}x{flag}")
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--only', nargs='+', choices=list(CASE_GROUPS), default=list(CASE_GROUPS),
+                            help='case groups to run')
+    arg_parser.add_argument('--pages', type=int, default=20, help='pages per synthetic statement')
+    arg_parser.add_argument('--rows', type=int, default=10_000, help='transactions for the database, analyzer and categorizer cases')
+    arg_parser.add_argument('--horizon', type=int, default=90, help='forecast days')
+    arg_parser.add_argument('--repeats', type=int, default=5)
+    arg_parser.add_argument('--output', help='results file, benchmarks/results/<commit>.json by default')
+    arg_parser.add_argument('--compare', help='earlier results file to compare with')
+    arg_parser.add_argument('--threshold', type=float, default=0.1, help='slowdown ratio above 1 reported as a regression')
+    args = arg_parser.parse_args(argv)
+
+    results = run(args.only, args.pages, args.rows, args.horizon, args.repeats)
+    _print_results(results)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{(results['meta']['commit'] or 'unknown')[:10]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults saved to {output}")
+
+    failed = [name for name, case in results['cases'].items() if case.get('ok') is False]
+    if failed:
+        print(f"Output mismatch in: {', '.join(failed)}")
+    regressions = []
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        rows = compare(results, baseline, args.threshold)
+        _print_comparison(rows, baseline)
+        regressions = [row for row in rows if row['regression']]
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+MERCHANTS = [
+    'SWIGGY', 'ZOMATO', 'AMAZON', 'FLIPKART', 'UBER', 'OLA', 'IRCTC', 'BIGBASKET',
+    'JIO PREPAID', 'AIRTEL', 'BESCOM', 'APOLLO PHARMACY', 'BOOKMYSHOW', 'NETFLIX',
+]
+
+
+def make_transactions_df(n_rows: int, seed: int = 7, start: str = '2022-01-01') -> pd.DataFrame:
+    """Builds a statement-like DataFrame with the columns the parsers return
+    (date, details, amount, type) sorted by date."""
+    rng = np.random.default_rng(seed)
+    start_ts = pd.Timestamp(start)
+    span_minutes = max(n_rows * 90, 60 * 24 * 30)
+    dates = start_ts + pd.to_timedelta(np.sort(rng.integers(0, span_minutes, n_rows)), unit='m')
+    is_credit = rng.random(n_rows) < 0.3
+    amounts = np.round(rng.lognormal(mean=6.5, sigma=1.2, size=n_rows), 2)
+    merchants = rng.choice(MERCHANTS, n_rows)
+    refs = rng.integers(10**11, 10**12, n_rows)
+    direction = np.where(is_credit, 'CR', 'DR')
+    details = [f"UPI/{d}/{ref}/{merchant}/YESB/payment" for d, ref, merchant in zip(direction, refs, merchants)]
+    return pd.DataFrame({
+        'date': dates,
+        'details': details,
+        'amount': amounts,
+        'type': np.where(is_credit, 'Credit', 'Debit'),
+    })
+
+
+# Merchants per Dashboard category, each with the spellings banks print for it.
+CATEGORY_MERCHANTS = {
+    'Food & Dining': [['SWIGGY', 'Swiggy Limited', 'BUNDL TECHNOLOGIES'], ['ZOMATO', 'Zomato Ltd', 'ZOMATO MEDIA'],
+                      ['DOMINOS', 'DOMINOS PIZZA', 'JUBILANT FOODWORKS'], ['STARBUCKS', 'TATA STARBUCKS'],
+                      ['MCDONALDS', 'HARDCASTLE RESTAURANTS'], ['CHAAYOS', 'Sunshine Teahouse']],
+    'Shopping': [['AMAZON', 'Amazon Pay India', 'AMAZON SELLER SERVICES'], ['FLIPKART', 'Flipkart Internet'],
+                 ['MYNTRA', 'Myntra Designs'], ['BIGBASKET', 'Supermarket Grocery Supplies'],
+                 ['DMART', 'Avenue Supermarts'], ['RELIANCE RETAIL', 'RELIANCE SMART']],
+    'Travel': [['UBER', 'Uber India Systems'], ['OLA', 'ANI Technologies', 'OLACABS'], ['IRCTC', 'IRCTC UTS'],
+               ['RAPIDO', 'Roppen Transportation'], ['INDIGO', 'InterGlobe Aviation'], ['MAKEMYTRIP', 'MMT']],
+    'Bills & Utilities': [['JIO', 'JIO PREPAID', 'Reliance Jio Infocomm'], ['AIRTEL', 'Bharti Airtel'], ['BESCOM'],
+                          ['TATA POWER', 'Tata Power DDL'], ['ACT FIBERNET', 'Atria Convergence'], ['BBPS ELECTRICITY']],
+    'Entertainment': [['NETFLIX', 'Netflix Entertainment'], ['BOOKMYSHOW', 'Bigtree Entertainment'],
+                      ['SPOTIFY', 'Spotify India'], ['HOTSTAR', 'Novi Digital'], ['PVR CINEMAS', 'PVR INOX']],
+    'Health': [['APOLLO PHARMACY', 'Apollo Healthco'], ['PHARMEASY', 'Axelia Solutions'], ['1MG', 'TATA 1MG'],
+               ['CULT FIT', 'Curefit Healthcare'], ['MEDPLUS', 'Optival Health']],
+    'Transfers': [['RAHUL SHARMA'], ['PRIYA NAIR'], ['ANIL KUMAR'], ['SNEHA PATIL'], ['MOHAMMED IRFAN'],
+                  ['KAVITA REDDY']],
+}
+_UPI_BANKS = ['YESB', 'HDFC', 'ICIC', 'SBIN', 'UTIB', 'PYTM']
+_UPI_NOTES = ['payment', 'Paid via', 'UPI', 'order', 'NA', 'Pay to merchant']
+_CITIES = ['BANGALORE', 'MUMBAI', 'DELHI', 'PUNE', 'CHENNAI', 'HYDERABAD']
+
+
+def make_labeled_narrations(n_rows: int, seed: int = 11, merchants_per_category: int | None = None,
+                            skip_merchants_per_category: int = 0) -> pd.DataFrame:
+    """Narrations in the UPI, POS, ACH and NEFT formats of Indian banks with their category and merchant.
+
+    Each category draws from CATEGORY_MERCHANTS[category][skip_merchants_per_category:][:merchants_per_category],
+    so two calls with disjoint slices give a test set of merchants never seen in training."""
+    rng = np.random.default_rng(seed)
+    pool = []
+    for category, merchants in CATEGORY_MERCHANTS.items():
+        chosen = merchants[skip_merchants_per_category:]
+        chosen = chosen[:merchants_per_category] if merchants_per_category is not None else chosen
+        pool += [(category, merchant[0], spelling) for merchant in chosen for spelling in merchant]
+    picks = rng.integers(0, len(pool), n_rows)
+    details, categories, merchant_names = [], [], []
+    for pick in picks.tolist():
+        category, merchant, spelling = pool[pick]
+        ref = int(rng.integers(10**11, 10**12))
+        style = int(rng.integers(0, 4)) if category != 'Transfers' else int(rng.integers(4, 6))
+        if style <= 1:
+            handle = spelling.lower().replace(' ', '')[:12]
+            details.append(f"UPI/{'DR' if style == 0 else 'CR'}/{ref}/{spelling}/{rng.choice(_UPI_BANKS)}/"
+                           f"{handle}@{rng.choice(['ybl', 'okaxis', 'paytm', 'icici'])}/{rng.choice(_UPI_NOTES)}")
+        elif style == 2:
+            details.append(f"POS {rng.integers(4000, 4999)}XXXXXXXX{rng.integers(1000, 9999)} {spelling.upper()} "
+                           f"{rng.choice(_CITIES)}")
+        elif style == 3:
+            details.append(f"ACH D- {spelling.upper()}-{ref}")
+        elif style == 4:
+            details.append(f"UPI/DR/{ref}/{spelling}/{rng.choice(_UPI_BANKS)}/{rng.integers(7 * 10**9, 10**10)}@ybl/"
+                           f"{rng.choice(['rent', 'dinner', 'NA', 'loan', 'gift'])}")
+        else:
+            details.append(f"NEFT*{rng.choice(_UPI_BANKS)}0{rng.integers(100000, 999999)}*N{ref}*{spelling}")
+        categories.append(category)
+        merchant_names.append(merchant)
+    return pd.DataFrame({'details': details, 'category': categories, 'merchant': merchant_names})
+
+
+# Bank formats make_statement can generate, as (bank name, transaction table columns, left edge of
+# each column plus the right edge of the table in points on an A4 page).
+STATEMENT_LAYOUTS = {
+    'union': ('Union Bank of India', ['SI', 'Date', 'Particulars', 'Chq Num', 'Withdrawal', 'Deposit', 'Balance'],
+              [20, 45, 100, 290, 360, 430, 500, 575]),
+    'sbi': ('State Bank of India', ['Date', 'Details', 'Ref No./Cheque No', 'Debit', 'Credit', 'Balance'],
+            [30, 95, 330, 420, 480, 530, 590]),
+    'sbi_yono': ('State Bank of India', ['Date', 'Transaction Reference', '', 'Ref.No./Chq.No.', 'Credit', 'Debit', 'Balance'],
+                 [20, 80, 270, 290, 365, 435, 505, 575]),
+}
+_ROW_HEIGHT = 26
+
+
+def make_statement(bank: str = 'sbi', n_pages: int = 10, rows_per_page: int = 25, seed: int = 7,
+                   account_number: str = '12345678901', password: str | None = None) -> tuple[bytes, dict]:
+    """Builds a synthetic statement in one of the STATEMENT_LAYOUTS with n_pages pages of
+    transactions from make_transactions_df, encrypted with password if one is given. Returns the
+    PDF and what BankStatementParser should read from it: bank_name, account_number and the
+    parser's transactions_df (dates without time, amounts as printed).
+
+    Union Bank and standard SBI statements repeat the table header on every page. Yono
+    statements start with two summary pages, open the table with an opening balance row and
+    end it with a closing balance row, which is how SbiParser tells them apart."""
+    import pikepdf
+
+    bank_name, columns, column_edges = STATEMENT_LAYOUTS[bank]
+    transactions = make_transactions_df(n_pages * rows_per_page, seed=seed)
+    is_credit = (transactions['type'] == 'Credit').to_numpy()
+    balance = 50_000 + (transactions['amount'] * np.where(is_credit, 1, -1)).cumsum()
+    transactions['details'] = transactions['details'].str[:40]
+
+    pages = []
+    if bank == 'sbi_yono':
+        pages.append(([], ["Relationship Summary", "State Bank of India", "www.sbi.co.in"]))
+        pages.append(([], ["Account Summary", f"Savings Account XXXXXXX{account_number[-4:]}"]))
+    for page_number in range(n_pages):
+        rows = [columns]
+        if bank == 'sbi_yono' and page_number == 0:
+            rows.append(['Opening Balance', '', '', '', '', '', f"{50_000:,.2f}"])
+        for i in range(page_number * rows_per_page, (page_number + 1) * rows_per_page):
+            rows.append(_statement_row(bank, i, transactions['date'].iat[i], transactions['details'].iat[i],
+                                       f"{transactions['amount'].iat[i]:,.2f}", is_credit[i], f"{balance.iat[i]:,.2f}"))
+        if bank == 'sbi_yono' and page_number == n_pages - 1:
+            rows.append([transactions['date'].iat[-1].strftime('%d-%m-%y'), 'Closing Balance', '', '', '', '',
+                         f"{balance.iat[-1]:,.2f}"])
+        header = []
+        if page_number == 0 and bank != 'sbi_yono':
+            header = [bank_name, f"Account Number : {account_number}", "Statement of account"]
+        pages.append((rows, header))
+
+    pdf = pikepdf.new()
+    font = pdf.make_indirect(pikepdf.Dictionary(Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1,
+                                                BaseFont=pikepdf.Name.Helvetica))
+    for rows, header in pages:
+        content = _statement_page_stream(rows, header, column_edges)
+        page = pikepdf.Dictionary(Type=pikepdf.Name.Page, MediaBox=[0, 0, 595, 842],
+                                  Resources=pikepdf.Dictionary(Font=pikepdf.Dictionary(F1=font)),
+                                  Contents=pdf.make_stream(content))
+        pdf.pages.append(pikepdf.Page(page))
+
+    output = io.BytesIO()
+    encryption = pikepdf.Encryption(user=password, owner=password) if password else False
+    pdf.save(output, encryption=encryption)
+
+    expected_df = pd.DataFrame({
+        'date': transactions['date'].dt.normalize(),
+        'details': transactions['details'],
+        'amount': transactions['amount'],
+        'type': transactions['type'],
+    })
+    expected_account = f"XXXXXXX{account_number[-4:]}" if bank == 'sbi_yono' else account_number
+    return output.getvalue(), {'bank_name': bank_name, 'account_number': expected_account, 'transactions_df': expected_df}
+
+
+def make_statement_pdf(n_pages: int, rows_per_page: int = 25, seed: int = 7,
+                       account_number: str = '12345678901', bank: str = 'sbi', password: str | None = None) -> bytes:
+    """Just the PDF of make_statement, a standard SBI statement by default."""
+    return make_statement(bank, n_pages, rows_per_page, seed, account_number, password)[0]
+
+
+def make_scanned_statement(bank: str = 'sbi', n_pages: int = 2, dpi: int = 150, **kwargs) -> tuple[bytes, dict]:
+    """make_statement with every page rasterized at dpi, an image-only PDF as a scanner would
+    produce. Its text can only be read by OCR."""
+    import pdfplumber
+
+    pdf_bytes, expected = make_statement(bank, n_pages, **kwargs)
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        images = [page.to_image(resolution=dpi).original.convert('L') for page in pdf.pages]
+    output = io.BytesIO()
+    images[0].save(output, 'PDF', resolution=dpi, save_all=True, append_images=images[1:])
+    return output.getvalue(), expected
+
+
+def _statement_row(bank: str, index: int, date, details: str, amount: str, is_credit: bool, balance: str) -> list[str]:
+    debit, credit = ('', amount) if is_credit else (amount, '')
+    if bank == 'union':
+        return [str(index + 1), date.strftime('%d-%m-%Y'), details, f"TRANSFER-{index}", debit, credit, balance]
+    if bank == 'sbi_yono':
+        return [date.strftime('%d-%m-%y'), details, '', f"TRANSFER-{index}", credit, debit, balance]
+    return [date.strftime('%d %b %Y'), details, f"TRANSFER-{index}", debit, credit, balance]
+
+
+def _statement_page_stream(table: list[list[str]], header_lines: list[str], column_edges: list[int]) -> bytes:
+    ops = []
+    y = 800
+    for line in header_lines:
+        ops.append(f"BT /F1 11 Tf 30 {y} Td ({_pdf_escape(line)}) Tj ET")
+        y -= 16
+    top = y - 10
+    if not table:
+        return '\n'.join(ops).encode('latin-1')
+    bottom = top - _ROW_HEIGHT * len(table)
+    for row_index in range(len(table) + 1):
+        row_y = top - row_index * _ROW_HEIGHT
+        ops.append(f"{column_edges[0]} {row_y} m {column_edges[-1]} {row_y} l S")
+    for x in column_edges:
+        ops.append(f"{x} {top} m {x} {bottom} l S")
+    for row_index, row in enumerate(table):
+        text_y = top - (row_index + 1) * _ROW_HEIGHT + 9
+        for x, cell in zip(column_edges, row):
+            if cell:
+                ops.append(f"BT /F1 7 Tf {x + 3} {text_y} Td ({_pdf_escape(cell)}) Tj ET")
+    return '\n'.join(ops).encode('latin-1')
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
@@ -1,18 +1,55 @@
+import os
+import threading
+
 import pandas as pd
-import streamlit as st
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
-@st.cache_resource
+from models.embedding_cache import EmbeddingCache
+from models.lexical_categorizer import LexicalCategorizer
+from utils.database import get_centroid_changes, apply_centroid_changes, load_category_centroids, reset_category_centroids
+from utils.tracing import span
+
+SBERT_MODEL_NAME = 'all-MiniLM-L6-v2'
+# 'cascade' (lexical first, SBERT for the rest), 'sbert' or 'lexical', see make_categorizer.
+CATEGORIZER_BACKEND = os.environ.get('CATEGORIZER_BACKEND', 'cascade')
+
+_sbert_model = None
+_sbert_model_lock = threading.Lock()
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
 def get_sbert_model():
-    return SentenceTransformer('all-MiniLM-L6-v2')
+    """The SBERT model, shared by every session. Loaded on first use (models.warmup does it at
+    app start); sentence-transformers and torch are only imported then."""
+    global _sbert_model
+    with _sbert_model_lock:
+        if _sbert_model is None:
+            from sentence_transformers import SentenceTransformer
+            _sbert_model = SentenceTransformer(SBERT_MODEL_NAME)
+        return _sbert_model
+
+def get_embedding_cache():
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(SBERT_MODEL_NAME, encode_fn=lambda texts: get_sbert_model().encode(texts))
+        return _embedding_cache
 
 class SmartCategorizer:
     def __init__(self,confidence_threshold=0.5):
-        self.model = get_sbert_model()
+        self.embedding_cache = get_embedding_cache()
         self.category_centroids={}
         self.confidence_threshold = confidence_threshold
+        self._category_names = []
+        self._centroid_matrix = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def model(self):
+        # Only needed for texts missing from the embedding cache.
+        return get_sbert_model()
+
+    def encode(self, details: list[str]) -> np.ndarray:
+        return self.embedding_cache.get_embeddings(details)
 
 
     def fit(self,categorized_df: pd.DataFrame):
@@ -21,30 +58,162 @@ class SmartCategorizer:
         if learn_df.empty:
             print("No categorized data available to learn from. The model is not fitted.")
             return
-        grouped_df = learn_df.groupby('category')
-        for group_category, group_df in grouped_df:
-            details_list = group_df['details'].tolist()
-            embedding = self.model.encode(details_list)
-            centroids = np.mean(embedding,axis=0)
-            self.category_centroids[group_category]=centroids
+        with span('fit', rows=len(learn_df)):
+            grouped_df = learn_df.groupby('category')
+            centroids = dict(self.category_centroids)
+            for group_category, group_df in grouped_df:
+                details_list = group_df['details'].tolist()
+                embedding = self.encode(details_list)
+                centroids[group_category] = np.mean(embedding,axis=0)
+            self._set_centroids(centroids)
         print(f"Fitting Complete. learned {len(self.category_centroids)} categories.")
 
+    def sync_user_centroids(self, user_id: int) -> int:
+        """Brings the stored centroids up to date with the user's categories and loads them.
+        Only transactions changed since the last sync are encoded. Returns how many were applied."""
+        stored = load_category_centroids(user_id, SBERT_MODEL_NAME)
+        changes = get_centroid_changes(user_id)
+        if not stored and changes['old_category'].notna().any():
+            print(f"Centroids for user {user_id} were built with another model, rebuilding.")
+            reset_category_centroids(user_id)
+            changes = get_centroid_changes(user_id)
+
+        applied = 0
+        if not changes.empty:
+            print(f"Updating category centroids with {len(changes)} changed transactions...")
+            embeddings = self.encode(changes['details'].tolist()).astype(np.float64)
+            # Encoding runs outside the write, the rows it covered are checked again when applied.
+            applied = apply_centroid_changes(user_id, SBERT_MODEL_NAME, changes, embeddings)
+            stored = load_category_centroids(user_id, SBERT_MODEL_NAME)
+
+        self._set_centroids({
+            category: embedding_sum / count for category, (embedding_sum, count) in stored.items() if count > 0
+        })
+        return applied
+
+    def _set_centroids(self, centroids: dict):
+        # Centroids are L2-normalized once here so prediction is a single matrix product.
+        self.category_centroids = centroids
+        self._category_names = list(centroids.keys())
+        if not centroids:
+            self._centroid_matrix = np.zeros((0, 0), dtype=np.float32)
+            return
+        matrix = np.array(list(centroids.values()), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self._centroid_matrix = matrix / np.where(norms == 0, 1, norms)
+
     def predict(self, Uncategorized_details : list[str]) -> list[str]:
+        return self.predict_batch(Uncategorized_details, top_k=1)['category'].tolist()
+
+    def predict_batch(self, details: list[str], top_k: int = 3, chunk_size: int = 4096,
+                      merchants: list[str] | None = None) -> pd.DataFrame:
+        """Predicts a category per row with its cosine-similarity confidence and the top_k best
+        categories as (category, score) pairs. Rows are encoded and scored chunk_size at a time so
+        memory stays bounded for large inputs. Rows below confidence_threshold get 'Uncategorized'.
+        merchants is accepted like on the other backends but not used, SBERT reads the whole narration."""
+        n_rows = len(details)
         if not self.category_centroids:
-            return ['Uncategorized'] * len(Uncategorized_details)
-        print(f"Predicting categories for {len(Uncategorized_details)} new transactions")
-        new_embedding = self.model.encode(Uncategorized_details)
-        category_name = list(self.category_centroids.keys())
-        centroids_matrix = np.array(list(self.category_centroids.values()))
-        similarity_matrix = cosine_similarity(new_embedding,centroids_matrix)
-        predicted_categories=[]
-        for i in range(len(Uncategorized_details)):
-            best_match_score = np.max(similarity_matrix[i])
-            if best_match_score >= self.confidence_threshold:
-                best_match_index= np.argmax(similarity_matrix[i])
-                predicted_categories.append(category_name[best_match_index])
-            else:
-                predicted_categories.append('Uncategorized')
+            return pd.DataFrame({
+                'category': ['Uncategorized'] * n_rows,
+                'confidence': np.zeros(n_rows, dtype=np.float32),
+                'alternatives': [[] for _ in range(n_rows)],
+                'tier': 'sbert',
+            })
+        print(f"Predicting categories for {n_rows} new transactions")
+        category_names = np.array(self._category_names, dtype=object)
+        top_k = max(1, min(top_k, len(category_names)))
+        best_index = np.empty(n_rows, dtype=np.int64)
+        confidence = np.empty(n_rows, dtype=np.float32)
+        top_index = np.empty((n_rows, top_k), dtype=np.int64)
+        top_score = np.empty((n_rows, top_k), dtype=np.float32)
+
+        with span('predict', rows=n_rows):
+            for start in range(0, n_rows, chunk_size):
+                stop = min(start + chunk_size, n_rows)
+                embeddings = self.encode(list(details[start:stop]))
+                norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                similarity = (embeddings / np.where(norms == 0, 1, norms)) @ self._centroid_matrix.T
 
+                best_index[start:stop] = similarity.argmax(axis=1)
+                confidence[start:stop] = similarity[np.arange(stop - start), best_index[start:stop]]
+                if top_k < similarity.shape[1]:
+                    candidates = np.argpartition(-similarity, top_k - 1, axis=1)[:, :top_k]
+                else:
+                    candidates = np.broadcast_to(np.arange(similarity.shape[1]), similarity.shape)
+                candidate_scores = np.take_along_axis(similarity, candidates, axis=1)
+                order = np.argsort(-candidate_scores, axis=1, kind='stable')
+                top_index[start:stop] = np.take_along_axis(candidates, order, axis=1)
+                top_score[start:stop] = np.take_along_axis(candidate_scores, order, axis=1)
+
+        categories = np.where(confidence >= self.confidence_threshold, category_names[best_index], 'Uncategorized')
+        top_names = category_names[top_index]
+        alternatives = [list(zip(names.tolist(), scores.tolist())) for names, scores in zip(top_names, top_score)]
         print('Prediction Complete')
-        return predicted_categories
\ No newline at end of file
+        return pd.DataFrame({'category': categories, 'confidence': confidence, 'alternatives': alternatives,
+                             'tier': 'sbert'})
+
+
+class CascadeCategorizer:
+    """LexicalCategorizer first (with its merchant lookup), SmartCategorizer only for the rows the
+    lexical tier is not sure of.
+
+    The SBERT centroids are synced, and the SBERT model loaded, only once a row falls through.
+    If that fails (sentence-transformers missing, model not downloadable offline), those rows stay
+    Uncategorized with tier 'unresolved'. predict_batch adds a 'tier' column naming who labelled each row.
+    """
+
+    def __init__(self, confidence_threshold=0.5):
+        self.lexical = LexicalCategorizer()
+        self.sbert = SmartCategorizer(confidence_threshold)
+        self._pending_sbert = None
+
+    @property
+    def embedding_cache(self):
+        return self.sbert.embedding_cache
+
+    def fit(self, categorized_df: pd.DataFrame):
+        self.lexical.fit(categorized_df)
+        self._pending_sbert = (self.sbert.fit, categorized_df)
+
+    def sync_user_centroids(self, user_id: int) -> int:
+        self._pending_sbert = (self.sbert.sync_user_centroids, user_id)
+        return self.lexical.sync_user_centroids(user_id)
+
+    def predict(self, details: list[str], merchants: list[str] | None = None) -> list[str]:
+        return self.predict_batch(details, top_k=1, merchants=merchants)['category'].tolist()
+
+    def predict_batch(self, details: list[str], top_k: int = 3, chunk_size: int = 4096,
+                      merchants: list[str] | None = None) -> pd.DataFrame:
+        predictions = self.lexical.predict_batch(details, top_k, chunk_size, merchants=merchants)
+        unresolved = np.flatnonzero(predictions['category'].to_numpy() == 'Uncategorized')
+        print(f"Merchant and lexical tiers categorized {len(predictions) - len(unresolved)} of {len(predictions)} transactions.")
+        if len(unresolved) == 0:
+            return predictions
+        try:
+            if self._pending_sbert is not None:
+                prepare, argument = self._pending_sbert
+                prepare(argument)
+                self._pending_sbert = None
+            fallback = self.sbert.predict_batch([details[i] for i in unresolved], top_k, chunk_size)
+        except (ImportError, OSError) as e:
+            print(f"SBERT tier unavailable, {len(unresolved)} transactions stay uncategorized: {e}")
+            predictions.loc[unresolved, 'tier'] = 'unresolved'
+            return predictions
+        fallback.index = unresolved
+        predictions.loc[unresolved, fallback.columns] = fallback
+        return predictions
+
+
+CATEGORIZER_BACKENDS = {
+    'cascade': CascadeCategorizer,
+    'sbert': SmartCategorizer,
+    'lexical': LexicalCategorizer,
+}
+
+
+def make_categorizer(backend: str = CATEGORIZER_BACKEND):
+    """A new categorizer of the given backend. Each has fit, sync_user_centroids, predict and predict_batch,
+    and predict_batch returns category, confidence, alternatives and the tier that produced them."""
+    if backend not in CATEGORIZER_BACKENDS:
+        raise ValueError(f"Unknown categorizer backend {backend!r}, expected one of {sorted(CATEGORIZER_BACKENDS)}")
+    return CATEGORIZER_BACKENDS[backend]()
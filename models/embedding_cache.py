@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: writes stay atomic renames, but processes sharing a cache are not serialized.
+    fcntl = None
+
+import numpy as np
+
+from utils.tracing import span
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / 'embedding_cache'
+# Lookups that are all hits only update LRU timestamps in memory, written out at most this often.
+LAST_USED_FLUSH_SECONDS = float(os.environ.get('EMBEDDING_CACHE_LAST_USED_FLUSH_SECONDS', 60))
+
+
+class EmbeddingCache:
+    """On-disk, content-addressed store of sentence embeddings.
+
+    Vectors live in a memory-mapped float32 matrix (`vectors.f32`); row ownership is kept
+    in `keys.npy` (sha1 of model name + normalized text) and `last_used.npy`, which drives
+    least-recently-used eviction once `max_entries` rows are stored. Only texts that are
+    not in the store are passed to `encode_fn`, in batches of `batch_size`.
+
+    Several processes (the app, ingestion job workers, the batch CLI) can share a cache
+    directory. Lookups hold a shared lock on its `lock` file and writes an exclusive one,
+    and `meta.json` carries a generation number bumped by every write that adds or evicts
+    rows; a process that sees a newer generation reloads the store before using it.
+    """
+
+    def __init__(self, model_name: str, encode_fn, cache_dir: Path = DEFAULT_CACHE_DIR,
+                 max_entries: int = 100_000, batch_size: int = 64):
+        self.model_name = model_name
+        self.encode_fn = encode_fn
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.cache_dir = Path(cache_dir) / model_name.replace('/', '__')
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._dim = None
+        self._vectors = None
+        self._keys = []
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._index = {}
+        self._free_rows = []
+        self._tick = 0
+        self._generation = 0
+        self._meta_stamp = None
+        self._last_used_saved_at = time.monotonic()
+        self._load()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(str(text).split())
+
+    def key_for(self, normalized_text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\x00{normalized_text}".encode('utf-8')).hexdigest()
+
+    def get_embeddings(self, texts: list[str]) -> np.ndarray:
+        """Returns a (len(texts), dim) float32 matrix, encoding only the cache misses."""
+        normalized = [self.normalize(text) for text in texts]
+        keys = [self.key_for(text) for text in normalized]
+
+        with self._lock:
+            self._tick += 1
+            missing = {}
+            hit_positions, hit_rows = [], []
+            with self._file_lock(exclusive=False):
+                self._refresh()
+                for position, (key, text) in enumerate(zip(keys, normalized)):
+                    row = self._index.get(key)
+                    if row is not None:
+                        self.hits += 1
+                        self._last_used[row] = self._tick
+                        hit_positions.append(position)
+                        hit_rows.append(row)
+                    else:
+                        self.misses += 1
+                        missing.setdefault(key, text)
+                # Hits are copied out now, a later write by any process may reuse their rows.
+                hit_vectors = self._vectors[hit_rows] if hit_rows else None
+
+            if not keys:
+                return np.zeros((0, self._dim or 0), dtype=np.float32)
+            new_vectors = {}
+            if missing:
+                # Encoding holds no file lock, other processes keep reading the store meanwhile.
+                missing_keys = list(missing)
+                encoded = self._encode_in_batches([missing[key] for key in missing_keys])
+                new_vectors = dict(zip(missing_keys, encoded))
+
+            result = np.empty((len(keys), self._dim), dtype=np.float32)
+            if hit_rows:
+                result[hit_positions] = hit_vectors
+            for position, key in enumerate(keys):
+                if key in new_vectors:
+                    result[position] = new_vectors[key]
+
+            if missing:
+                with self._file_lock(exclusive=True):
+                    self._refresh()
+                    # Another process may have stored some of them while they were encoded.
+                    stored = [i for i, key in enumerate(missing_keys) if key not in self._index]
+                    if stored:
+                        self._store([missing_keys[i] for i in stored], encoded[stored])
+                        self._generation += 1
+                        self._save(vectors_changed=True)
+            elif time.monotonic() - self._last_used_saved_at > LAST_USED_FLUSH_SECONDS:
+                with self._file_lock(exclusive=True):
+                    self._refresh()
+                    self._save(vectors_changed=False)
+            return result
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._index),
+            'max_entries': self.max_entries,
+            'evictions': self.evictions,
+        }
+
+    def _encode_in_batches(self, texts: list[str]) -> np.ndarray:
+        with span('encode', rows=len(texts)):
+            batches = [
+                np.asarray(self.encode_fn(texts[start:start + self.batch_size]), dtype=np.float32)
+                for start in range(0, len(texts), self.batch_size)
+            ]
+        encoded = np.vstack(batches)
+        if self._dim is None:
+            self._dim = encoded.shape[1]
+        return encoded
+
+    def _store(self, keys: list[str], vectors: np.ndarray):
+        # Anything beyond max_entries is returned to the caller but not kept.
+        keys = keys[:self.max_entries]
+        vectors = vectors[:self.max_entries]
+        overflow = len(self._index) + len(keys) - self.max_entries
+        if overflow > 0:
+            self._evict(overflow)
+        self._ensure_capacity(len(self._index) + len(keys))
+
+        for key, vector in zip(keys, vectors):
+            row = self._free_rows.pop() if self._free_rows else len(self._keys)
+            if row == len(self._keys):
+                self._keys.append(None)
+            self._keys[row] = key
+            self._vectors[row] = vector
+            self._last_used[row] = self._tick
+            self._index[key] = row
+
+    def _evict(self, count: int):
+        occupied = np.array([row for row, key in enumerate(self._keys) if key is not None])
+        oldest = occupied[np.argsort(self._last_used[occupied], kind='stable')[:count]]
+        for row in oldest.tolist():
+            del self._index[self._keys[row]]
+            self._keys[row] = None
+            self._free_rows.append(row)
+        self.evictions += len(oldest)
+
+    def _ensure_capacity(self, needed_rows: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed_rows <= capacity:
+            return
+        new_capacity = min(self.max_entries, max(needed_rows, capacity * 2, 1024))
+        vectors_path = self.cache_dir / 'vectors.f32'
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        with open(vectors_path, 'ab') as f:
+            f.truncate(new_capacity * self._dim * 4)
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode='r+', shape=(new_capacity, self._dim))
+        self._last_used = np.concatenate([self._last_used, np.zeros(new_capacity - capacity, dtype=np.int64)])
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        with open(self.cache_dir / 'lock', 'a+b') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Reloads the store if another process wrote a newer generation. Call with the file lock held."""
+        meta_path = self.cache_dir / 'meta.json'
+        try:
+            meta_stamp = _file_stamp(meta_path)
+            if meta_stamp == self._meta_stamp:
+                return
+            generation = json.loads(meta_path.read_text()).get('generation', 0)
+        except (OSError, ValueError):
+            return
+        self._meta_stamp = meta_stamp
+        if generation == self._generation:
+            return
+        self._vectors = None
+        self._keys, self._index, self._free_rows = [], {}, []
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._load(verbose=False)
+
+    def _load(self, verbose: bool = True):
+        meta_path = self.cache_dir / 'meta.json'
+        if not meta_path.exists():
+            return
+        try:
+            self._meta_stamp = _file_stamp(meta_path)
+            meta = json.loads(meta_path.read_text())
+            if meta['model_name'] != self.model_name:
+                return
+            capacity = meta['capacity']
+            self._dim = meta['dim']
+            self._tick = max(self._tick, meta['tick'])
+            self._generation = meta.get('generation', 0)
+            self._vectors = np.memmap(self.cache_dir / 'vectors.f32', dtype=np.float32, mode='r+',
+                                      shape=(capacity, self._dim))
+            stored_keys = np.load(self.cache_dir / 'keys.npy')
+            self._last_used = np.zeros(capacity, dtype=np.int64)
+            self._last_used[:len(stored_keys)] = np.load(self.cache_dir / 'last_used.npy')
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Embedding cache at {self.cache_dir} could not be loaded, starting empty: {e}")
+            self._dim, self._vectors, self._tick = None, None, 0
+            self._last_used = np.zeros(0, dtype=np.int64)
+            return
+
+        self._keys = [key.decode('ascii') or None for key in stored_keys.tolist()]
+        for row, key in enumerate(self._keys):
+            if key is None:
+                self._free_rows.append(row)
+            else:
+                self._index[key] = row
+        if verbose:
+            print(f"Loaded {len(self._index)} cached embeddings for {self.model_name}.")
+
+    def _save(self, vectors_changed: bool):
+        if self._vectors is None:
+            return
+        if vectors_changed:
+            self._vectors.flush()
+            keys = np.array([(key or '').encode('ascii') for key in self._keys], dtype='S40')
+            _atomic_write(self.cache_dir / 'keys.npy', lambda f: np.save(f, keys))
+        last_used = self._last_used[:len(self._keys)]
+        _atomic_write(self.cache_dir / 'last_used.npy', lambda f: np.save(f, last_used))
+        meta = {'model_name': self.model_name, 'dim': self._dim, 'capacity': self._vectors.shape[0], 'tick': self._tick,
+                'generation': self._generation}
+        meta_path = self.cache_dir / 'meta.json'
+        _atomic_write(meta_path, lambda f: f.write(json.dumps(meta).encode('utf-8')))
+        self._meta_stamp = _file_stamp(meta_path)
+        self._last_used_saved_at = time.monotonic()
+
+
+def _file_stamp(path: Path) -> tuple:
+    # Every write replaces the file, so the inode changes even within the mtime's resolution.
+    stat = path.stat()
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _atomic_write(path: Path, write):
+    tmp_path = path.with_suffix(f'{path.suffix}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
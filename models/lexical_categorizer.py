@@ -0,0 +1,202 @@
+"""Offline categorizer on hashed character n-grams of the narration, one centroid per category.
+
+Bank narrations are structured strings (UPI/DR/<ref>/<merchant>/<bank>/<vpa>/<note>,
+POS <card> <merchant> <city>, NEFT*<ifsc>*<ref>*<name>), and the merchant's spelling usually
+tells its category. Narrations are split into tokens, and tokens with long digit runs are
+dropped (references, card and account numbers). Every remaining token adds itself and its
+character 3- to 5-grams, hashed into LEXICAL_FEATURES buckets and weighted by inverse document
+frequency. A row's confidence is its cosine similarity to the closest category centroid. A row
+below LEXICAL_CONFIDENCE_THRESHOLD, or whose second closest category scores more than
+LEXICAL_MAX_RUNNER_UP_RATIO of that, is left Uncategorized, so CascadeCategorizer passes it on
+to SBERT.
+
+Before any of that, a row whose merchant (the stored Transactions.merchant, see utils.merchants)
+the user has categorized at least MERCHANT_MIN_ROWS times, with at least MERCHANT_MIN_SHARE of
+them under one category, gets that category outright, tier 'merchant'.
+"""
+import os
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from utils.transaction_queries import fetch_transactions
+from utils.tracing import span
+
+LEXICAL_FEATURES = 2 ** 18
+# Similarities to a centroid that blends all of a category's merchants run lower than SBERT's and
+# fall as a category gains merchants: a known merchant typically scores 0.25 to 0.5, an unseen one
+# below 0.2. The runner-up ratio does not depend on that scale.
+LEXICAL_CONFIDENCE_THRESHOLD = float(os.environ.get('LEXICAL_CONFIDENCE_THRESHOLD', 0.2))
+LEXICAL_MAX_RUNNER_UP_RATIO = float(os.environ.get('LEXICAL_MAX_RUNNER_UP_RATIO', 0.6))
+NGRAM_RANGE = (3, 5)
+MERCHANT_MIN_ROWS = int(os.environ.get('MERCHANT_MIN_ROWS', 2))
+MERCHANT_MIN_SHARE = float(os.environ.get('MERCHANT_MIN_SHARE', 0.9))
+
+_TOKEN_RE = re.compile(r'[A-Z0-9@&.]+')
+_REFERENCE_RE = re.compile(r'\d{4,}')
+# Hashed features per token, shared by every instance. Narrations reuse a small vocabulary.
+_token_features = {}
+_TOKEN_CACHE_MAX = 200_000
+
+
+def narration_tokens(detail: str) -> list[str]:
+    """Upper-cased tokens of a narration without the ones carrying references or account numbers."""
+    return [token for token in _TOKEN_RE.findall(str(detail).upper()) if not _REFERENCE_RE.search(token)]
+
+
+def _features(token: str) -> np.ndarray:
+    features = _token_features.get(token)
+    if features is None:
+        padded = f' {token} '
+        grams = [f'#{token}'] + [padded[i:i + n] for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1)
+                                  for i in range(len(padded) - n + 1)]
+        features = np.array([zlib.crc32(gram.encode('utf-8')) % LEXICAL_FEATURES for gram in grams], dtype=np.int32)
+        if len(_token_features) >= _TOKEN_CACHE_MAX:
+            _token_features.clear()
+        _token_features[token] = features
+    return features
+
+
+def hash_narrations(details: list[str]) -> sparse.csr_matrix:
+    """(len(details), LEXICAL_FEATURES) matrix of n-gram counts."""
+    columns = []
+    indptr = np.zeros(len(details) + 1, dtype=np.int64)
+    for row, detail in enumerate(details):
+        row_features = [_features(token) for token in narration_tokens(detail)]
+        columns.extend(row_features)
+        indptr[row + 1] = indptr[row] + sum(len(features) for features in row_features)
+    indices = np.concatenate(columns) if columns else np.zeros(0, dtype=np.int32)
+    matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr),
+                               shape=(len(details), LEXICAL_FEATURES))
+    matrix.sum_duplicates()
+    return matrix
+
+
+def _normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    return sparse.diags(1 / np.where(norms == 0, 1, norms)).dot(matrix).tocsr()
+
+
+class LexicalCategorizer:
+    def __init__(self, confidence_threshold=LEXICAL_CONFIDENCE_THRESHOLD, max_runner_up_ratio=LEXICAL_MAX_RUNNER_UP_RATIO):
+        self.confidence_threshold = confidence_threshold
+        self.max_runner_up_ratio = max_runner_up_ratio
+        self._category_names = []
+        self._idf = np.ones(LEXICAL_FEATURES, dtype=np.float32)
+        self._centroid_matrix = sparse.csr_matrix((0, LEXICAL_FEATURES), dtype=np.float32)
+        # merchant -> (category, share of the merchant's categorized rows in it)
+        self._merchant_categories = {}
+
+    def fit(self, categorized_df: pd.DataFrame):
+        learn_df = categorized_df[categorized_df['category'] != 'Uncategorized']
+        if learn_df.empty:
+            print("No categorized data available to learn from. The lexical model is not fitted.")
+            self._category_names = []
+            self._merchant_categories = {}
+            return
+        with span('lexical_fit', rows=len(learn_df)):
+            if 'merchant' in learn_df.columns:
+                self._merchant_categories = _merchant_categories(learn_df)
+            counts = hash_narrations(learn_df['details'].tolist())
+            document_frequency = np.bincount(counts.indices, minlength=LEXICAL_FEATURES)
+            self._idf = (np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1).astype(np.float32)
+            rows = self._weigh(counts)
+
+            categories, labels = np.unique(learn_df['category'].to_numpy(dtype=str), return_inverse=True)
+            membership = sparse.csr_matrix((np.ones(len(labels), dtype=np.float32), (labels, np.arange(len(labels)))),
+                                           shape=(len(categories), len(labels)))
+            # Centroids are L2-normalized once here so prediction is a single sparse product.
+            self._centroid_matrix = _normalize_rows(membership.dot(rows))
+            self._category_names = categories.tolist()
+
+    def sync_user_centroids(self, user_id: int) -> int:
+        """Refits on the user's categorized transactions, pass-through transfers excluded. Returns the rows used."""
+        df, _ = fetch_transactions(user_id, columns=['details', 'merchant', 'category'], include_pass_through=False)
+        self.fit(df)
+        return int((df['category'] != 'Uncategorized').sum())
+
+    def _weigh(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        weighted = counts.copy()
+        weighted.data *= self._idf[weighted.indices]
+        return _normalize_rows(weighted)
+
+    def predict(self, details: list[str], merchants: list[str] | None = None) -> list[str]:
+        return self.predict_batch(details, top_k=1, merchants=merchants)['category'].tolist()
+
+    def predict_batch(self, details: list[str], top_k: int = 3, chunk_size: int = 4096,
+                      merchants: list[str] | None = None) -> pd.DataFrame:
+        """Same columns as SmartCategorizer.predict_batch. Rows below confidence_threshold, or whose
+        runner-up scores more than max_runner_up_ratio of the best, get 'Uncategorized'. merchants,
+        aligned with details, lets rows of merchants the user always files the same way skip scoring."""
+        n_rows = len(details)
+        if not self._category_names:
+            return pd.DataFrame({
+                'category': ['Uncategorized'] * n_rows,
+                'confidence': np.zeros(n_rows, dtype=np.float32),
+                'alternatives': [[] for _ in range(n_rows)],
+                'tier': 'lexical',
+            })
+        known = None
+        if merchants is not None and self._merchant_categories:
+            known = pd.Series(merchants).map(self._merchant_categories)
+        if known is None or known.isna().all():
+            categories, confidence, alternatives = self._score(details, top_k, chunk_size)
+            return pd.DataFrame({'category': categories, 'confidence': confidence, 'alternatives': alternatives,
+                                 'tier': 'lexical'})
+
+        is_known = known.notna().to_numpy()
+        merchant_rows, scored_rows = np.flatnonzero(is_known), np.flatnonzero(~is_known)
+        categories = np.empty(n_rows, dtype=object)
+        confidence = np.empty(n_rows, dtype=np.float32)
+        alternatives = [None] * n_rows
+        tiers = np.where(is_known, 'merchant', 'lexical').astype(object)
+
+        merchant_categories, shares = zip(*known.iloc[merchant_rows].tolist())
+        categories[merchant_rows] = merchant_categories
+        confidence[merchant_rows] = shares
+        for row, category, share in zip(merchant_rows, merchant_categories, shares):
+            alternatives[row] = [(category, share)]
+        if len(scored_rows):
+            scored = self._score([details[row] for row in scored_rows], top_k, chunk_size)
+            categories[scored_rows], confidence[scored_rows] = scored[0], scored[1]
+            for row, row_alternatives in zip(scored_rows, scored[2]):
+                alternatives[row] = row_alternatives
+        return pd.DataFrame({'category': categories, 'confidence': confidence, 'alternatives': alternatives,
+                             'tier': tiers})
+
+    def _score(self, details: list[str], top_k: int, chunk_size: int) -> tuple:
+        """(categories, confidence, alternatives) of details from their similarity to the centroids."""
+        n_rows = len(details)
+        category_names = np.array(self._category_names, dtype=object)
+        top_k = max(1, min(top_k, len(category_names)))
+        similarity = np.empty((n_rows, len(category_names)), dtype=np.float32)
+        with span('lexical_predict', rows=n_rows):
+            for start in range(0, n_rows, chunk_size):
+                stop = min(start + chunk_size, n_rows)
+                rows = self._weigh(hash_narrations(list(details[start:stop])))
+                similarity[start:stop] = rows.dot(self._centroid_matrix.T).toarray()
+
+        order = np.argsort(-similarity, axis=1, kind='stable')
+        top_index = order[:, :top_k]
+        top_score = np.take_along_axis(similarity, top_index, axis=1)
+        confidence = top_score[:, 0]
+        runner_up = similarity[np.arange(n_rows), order[:, 1]] if similarity.shape[1] > 1 else np.zeros(n_rows)
+        confident = (confidence >= self.confidence_threshold) & (runner_up <= confidence * self.max_runner_up_ratio)
+        categories = np.where(confident, category_names[top_index[:, 0]], 'Uncategorized')
+        alternatives = [list(zip(names.tolist(), scores.tolist()))
+                        for names, scores in zip(category_names[top_index], top_score)]
+        return categories, confidence, alternatives
+
+def _merchant_categories(learn_df: pd.DataFrame) -> dict:
+    """Merchants with at least MERCHANT_MIN_ROWS categorized rows, MERCHANT_MIN_SHARE of them in one category."""
+    counts = learn_df.dropna(subset=['merchant']).groupby(['merchant', 'category']).size()
+    if counts.empty:
+        return {}
+    totals = counts.groupby(level='merchant').sum()
+    top = counts.sort_values(ascending=False).groupby(level='merchant').head(1).reset_index(level='category')
+    top['share'] = top[0] / totals.loc[top.index]
+    top = top[(totals.loc[top.index] >= MERCHANT_MIN_ROWS) & (top['share'] >= MERCHANT_MIN_SHARE)]
+    return {merchant: (category, float(share)) for merchant, category, share in zip(top.index, top['category'], top['share'])}
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+# Upper bound on the estimated memory of all models kept loaded at once.
+MODEL_CACHE_MAX_MB = float(os.environ.get('MODEL_CACHE_MAX_MB', 256))
+# Number of recently active users whose models are loaded when the app starts, 0 disables it.
+MODEL_WARMUP_USERS = int(os.environ.get('MODEL_WARMUP_USERS', 5))
+# joblib mmap_mode for model files ('r' maps the stored arrays), unset for a plain load. Scikit-learn
+# copies tree arrays into its own buffers, so for forests mapping saves no memory and loads slower.
+MODEL_MMAP_MODE = os.environ.get('MODEL_MMAP_MODE') or None
+# joblib compression level for saved models: smaller files, slower loads. Compressed files cannot be mapped.
+MODEL_COMPRESS = int(os.environ.get('MODEL_COMPRESS', 0))
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+class ModelRegistry:
+    """Process-wide cache of trained spending models, shared by every session of the app.
+
+    Entries are keyed by user and validated against the model file's mtime, so a retrained
+    model is picked up on the next lookup. Once the estimated memory of the loaded models
+    exceeds max_bytes, the least recently used ones are dropped. Each load's latency and
+    estimated size are kept for reporting. Models load outside the registry lock, so a slow
+    load only holds up lookups of the same user.
+    """
+
+    def __init__(self, max_bytes: float = MODEL_CACHE_MAX_MB * 2**20, mmap_mode: str | None = MODEL_MMAP_MODE):
+        self.max_bytes = max_bytes
+        self.mmap_mode = mmap_mode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # user_id -> lock held while that user's model loads, so concurrent misses load it once.
+        self._load_locks = {}
+
+    def get(self, user_id: int, model_path: Path):
+        """Returns the user's model, loading it if it is not cached or the file changed, or None if there is no file."""
+        model_path = Path(model_path)
+        try:
+            mtime = model_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self.invalidate(user_id)
+            return None
+
+        with self._lock:
+            model = self._cached(user_id, model_path, mtime)
+            if model is not None:
+                return model
+            load_lock = self._load_locks.setdefault(user_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # Another thread may have loaded it while this one waited.
+                model = self._cached(user_id, model_path, mtime)
+                if model is not None:
+                    return model
+                self.misses += 1
+            start = time.perf_counter()
+            model = joblib.load(model_path, mmap_mode=self.mmap_mode)
+            load_seconds = time.perf_counter() - start
+
+            with self._lock:
+                try:
+                    current_mtime = model_path.stat().st_mtime_ns
+                except FileNotFoundError:
+                    current_mtime = None
+                # A model retrained during the load is left to the next lookup, or to put().
+                if current_mtime != mtime:
+                    return model
+                self._put(user_id, model, model_path, mtime, load_seconds)
+                model_bytes = self._entries[user_id]['bytes']
+            print(f"Loaded model for user {user_id} from {model_path} in {load_seconds:.2f}s "
+                  f"({model_bytes / 2**20:.1f} MB).")
+            return model
+
+    def _cached(self, user_id: int, model_path: Path, mtime: int):
+        entry = self._entries.get(user_id)
+        if entry is None or entry['path'] != model_path or entry['mtime'] != mtime:
+            return None
+        self.hits += 1
+        entry['hits'] += 1
+        self._entries.move_to_end(user_id)
+        return entry['model']
+
+    def put(self, user_id: int, model, model_path: Path):
+        """Registers a model that was just trained and saved, so it is not loaded back from disk."""
+        model_path = Path(model_path)
+        with self._lock:
+            self._put(user_id, model, model_path, model_path.stat().st_mtime_ns, load_seconds=0.0)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def warmup(self, user_ids, model_path_for) -> int:
+        """Loads the models of user_ids (most important first) until the memory budget is
+        reached. model_path_for maps a user id to its model file. Returns how many were loaded."""
+        loaded = 0
+        for user_id in user_ids:
+            if self.get(user_id, model_path_for(user_id)) is not None:
+                loaded += 1
+            with self._lock:
+                full = self._total_bytes() >= self.max_bytes
+            if full:
+                break
+        return loaded
+
+    def model_stats(self, user_id: int) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return {key: value for key, value in entry.items() if key != 'model'}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'models': len(self._entries),
+                'bytes': sum(entry['bytes'] for entry in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'per_model': {user_id: {key: value for key, value in entry.items() if key != 'model'}
+                              for user_id, entry in self._entries.items()},
+            }
+
+    def _put(self, user_id, model, model_path: Path, mtime: int, load_seconds: float):
+        self._entries[user_id] = {
+            'model': model,
+            'path': model_path,
+            'mtime': mtime,
+            'bytes': estimate_model_bytes(model, model_path),
+            'load_seconds': load_seconds,
+            'hits': 0,
+        }
+        self._entries.move_to_end(user_id)
+        # The newest model always stays, even when it alone is over the budget.
+        while len(self._entries) > 1 and self._total_bytes() > self.max_bytes:
+            evicted_user, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            print(f"Evicted model for user {evicted_user} from the model registry.")
+
+    def _total_bytes(self) -> int:
+        return sum(entry['bytes'] for entry in self._entries.values())
+
+
+def estimate_model_bytes(model, model_path: Path | None = None) -> int:
+    """Memory held by a fitted tree ensemble: the node and value arrays of every tree.
+    Other models are assumed to take about their file size."""
+    trees = getattr(model, 'estimators_', None)
+    if trees is not None and all(hasattr(tree, 'tree_') for tree in np.ravel(trees)):
+        total = 0
+        for tree in np.ravel(trees):
+            state = tree.tree_.__getstate__()
+            total += state['nodes'].nbytes + state['values'].nbytes
+        return total
+    return model_path.stat().st_size if model_path is not None and model_path.exists() else 0
@@ -1,24 +1,39 @@
+import math
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
-from utils.database import DataBase_URL
-from sklearn.ensemble import RandomForestRegressor
+from utils.database import get_daily_spending, recently_active_user_ids, get_spending_watermarks, record_model_training
 import joblib
 from pathlib import Path
 
-def get_daily_spending_history(user_id: int) -> pd.DataFrame:
-    engine = create_engine(DataBase_URL)
-    query=f'''
-     SELECT date,amount
-     FROM transactions
-     JOIN accounts ON transactions.account_id = accounts.id
-     WHERE accounts.user_id = {user_id} AND transactions.type = 'Debit' 
-     '''
-    df = pd.read_sql(query,engine,parse_dates=['date'])
+from models.model_registry import get_model_registry, MODEL_WARMUP_USERS, MODEL_COMPRESS
+from utils.tracing import span
+
+MODEL_DIR = Path("trained_models")
+# Trainings run at once in this process, further ones wait. The training scheduler uses as many worker processes.
+TRAINING_WORKERS = int(os.environ.get('TRAINING_WORKERS', max(1, (os.cpu_count() or 1) // 2)))
+# Threads one training may use, for the forest and for native thread pools.
+TRAINING_THREADS = int(os.environ.get('TRAINING_THREADS_PER_JOB', max(1, (os.cpu_count() or 1) // TRAINING_WORKERS)))
+MIN_TRAINING_DAYS = 14
+
+_training_slots = threading.BoundedSemaphore(TRAINING_WORKERS)
+
+def get_daily_spending_history(user_id: int, start=None, end=None) -> pd.DataFrame:
+    """Daily spending from the daily_spending rollup, with days without debits filled in as 0."""
+    df = get_daily_spending(user_id, start, end)
     if df.empty:
         return pd.DataFrame({'total_spending':[]})
-    df.set_index('date',inplace=True)
-    daily_spending = df['amount'].resample('D').sum().fillna(0)
-    return daily_spending.to_frame(name="total_spending")
+    daily_spending = df.set_index('day')['total_spending']
+    days = pd.date_range(daily_spending.index.min(), daily_spending.index.max(), freq='D', name='date')
+    return daily_spending.reindex(days, fill_value=0.0).to_frame(name="total_spending")
+
+FEATURES = ['dayofweek', 'dayofmonth', 'month', 'year', 'lag_7', 'rolling_7_day_avg']
+LAG_DAYS = 7
+ROLLING_DAYS = 7
 
 def create_feature(df : pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
@@ -31,33 +46,167 @@ def create_feature(df : pd.DataFrame) -> pd.DataFrame:
     df['rolling_7_day_avg'] = df['total_spending'].rolling(window=7).mean().fillna(0)
     return df
 
+def model_path_for(user_id: int) -> Path:
+    return MODEL_DIR / f"spending_predictor_user_{user_id}.joblib"
+
+def warmup_models(limit: int = MODEL_WARMUP_USERS) -> int:
+    """Loads the models of the most recently active users into the model registry: users
+    with the latest statement uploads first, then the most recently trained models."""
+    if limit <= 0:
+        return 0
+    trained = sorted(MODEL_DIR.glob("spending_predictor_user_*.joblib"), key=lambda path: path.stat().st_mtime, reverse=True)
+    trained_ids = [int(path.stem.rsplit('_', 1)[1]) for path in trained]
+    candidates = [user_id for user_id in recently_active_user_ids(limit) if user_id in trained_ids]
+    candidates += [user_id for user_id in trained_ids if user_id not in candidates]
+    loaded = get_model_registry().warmup(candidates[:limit], model_path_for)
+    print(f"Warmed up {loaded} spending models.")
+    return loaded
+
+def train_spending_model(user_id: int, threads: int = TRAINING_THREADS) -> dict:
+    """Trains and saves the user's model on their whole spending history and records the training.
+    Returns a report with status 'trained' or 'not_enough_data'."""
+    # Taken before the history is read: spending saved meanwhile leaves the model stale, not marked fresh.
+    watermark = get_spending_watermarks([user_id]).get(user_id)
+    history = get_daily_spending_history(user_id)
+    if watermark is None or len(history) < MIN_TRAINING_DAYS:
+        return {'user_id': user_id, 'status': 'not_enough_data', 'days': len(history)}
+
+    featured_data = create_feature(history)
+    predictor = spending_predictor(user_id)
+    with _training_slots:
+        start = time.perf_counter()
+        predictor.train(featured_data[FEATURES], featured_data['total_spending'], threads=threads)
+        training_seconds = time.perf_counter() - start
+    record_model_training(user_id, training_seconds, predictor.model_path, watermark)
+    return {'user_id': user_id, 'status': 'trained', 'days': len(history), 'seconds': training_seconds}
+
 class spending_predictor:
     def __init__(self,user_id: int):
         self.user_id = user_id
-        self.model_path = Path(f"trained_models/spending_predictor_user_{self.user_id}.joblib")
-        self.model = RandomForestRegressor(n_estimators=100,random_state=34,n_jobs=-1)
+        self.model_path = model_path_for(self.user_id)
+        # Loaded models are shared through the model registry, a new one is only built to train.
+        self.model = None
         self.model_path.parent.mkdir(exist_ok=True)
 
-    def train(self,X: pd.DataFrame, y: pd.Series):
+    def train(self,X: pd.DataFrame, y: pd.Series, threads: int = TRAINING_THREADS):
+        # scikit-learn takes seconds to import and is only needed to train; loading a saved model imports it on its own.
+        from sklearn.ensemble import RandomForestRegressor
+        from threadpoolctl import threadpool_limits
+
         print(f"Training the spending prediction model for user {self.user_id}...")
-        self.model.fit(X,y)
+        self.model = RandomForestRegressor(n_estimators=100,random_state=34,n_jobs=threads)
+        with threadpool_limits(limits=threads), span('train', rows=len(X)):
+            self.model.fit(X,y)
         self.save_model()
         print("Model training complete.")
 
     def save_model(self):
-        joblib.dump(self.model, self.model_path)
+        registry = get_model_registry()
+        # Drop the cached (possibly memory-mapped) model before its file is replaced.
+        registry.invalidate(self.user_id)
+        # A temporary file per save, so concurrent trainings of one user never write to the same file,
+        # flushed to disk before it replaces the model: readers see the old model or the new one, whole.
+        fd, tmp_name = tempfile.mkstemp(prefix=self.model_path.stem + '.', suffix='.tmp', dir=self.model_path.parent)
+        os.close(fd)
+        try:
+            joblib.dump(self.model, tmp_name, compress=MODEL_COMPRESS)
+            with open(tmp_name, 'rb') as tmp_file:
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_name, self.model_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        registry.put(self.user_id, self.model, self.model_path)
         print(f"model saved to {self.model_path}")
 
     def load_model(self)-> bool:
-        if self.model_path.exists():
-            self.model = joblib.load(self.model_path)
-            print(f"Model loaded from {self.model_path}.")
+        model = get_model_registry().get(self.user_id, self.model_path)
+        if model is not None:
+            self.model = model
             return True
         print("No pre-trained model Found.")
         return False
 
+    def model_stats(self) -> dict | None:
+        """Load latency and estimated memory of this user's model in the registry."""
+        return get_model_registry().model_stats(self.user_id)
+
     def predict(self,X:pd.DataFrame)-> list[float]:
         return self.model.predict(X)
 
+    def forecast(self, history: pd.DataFrame, days: int) -> pd.DataFrame:
+        """Forecasts total_spending for the `days` days after the end of history."""
+        return RecursiveForecaster(self.model, history['total_spending']).forecast(days)
+
+
+class RecursiveForecaster:
+    """Forecasts daily spending one day at a time, each prediction feeding the next day's
+    lag_7 and rolling_7_day_avg.
+
+    Gives the same numbers as re-running create_feature over the tail of a growing
+    DataFrame, as the Forecasting page used to: the features of the latest known day predict
+    the following day. Instead of rebuilding DataFrames, the last LAG_DAYS + 1 values are kept
+    in a ring buffer and the feature rows are written into one preallocated array, so each
+    step costs the same however long the horizon. Random forests are evaluated tree by tree,
+    which skips sklearn's per-call validation and thread dispatch.
+    """
+
+    def __init__(self, model, history: pd.Series):
+        if history.empty:
+            raise ValueError("Spending history is empty, nothing to forecast from.")
+        self.model = model
+        self.last_date = history.index.max()
+        self.known_days = len(history)
+        self.buffer_size = max(LAG_DAYS + 1, ROLLING_DAYS)
+        self.buffer = np.zeros(self.buffer_size)
+        tail = history.to_numpy(dtype=float)[-self.buffer_size:]
+        self.position = len(tail) % self.buffer_size
+        self.buffer[:len(tail)] = tail
+
+    def forecast(self, days: int) -> pd.DataFrame:
+        # Row k holds the features of the day before the k-th forecast day.
+        feature_dates = pd.date_range(start=self.last_date, periods=days)
+        X = np.empty((days, len(FEATURES)))
+        X[:, 0] = feature_dates.dayofweek
+        X[:, 1] = feature_dates.day
+        X[:, 2] = feature_dates.month
+        X[:, 3] = feature_dates.year
+        predictions = np.empty(days)
+
+        with span('forecast', rows=days):
+            for step in range(days):
+                X[step, 4], X[step, 5] = self._lag_and_rolling_mean()
+                predictions[step] = self._predict_row(X[step:step + 1])
+                self._push(predictions[step])
+
+        return pd.DataFrame({'total_spending': predictions}, index=feature_dates + pd.Timedelta(days=1))
+
+    def _push(self, value: float):
+        self.buffer[self.position] = value
+        self.position = (self.position + 1) % self.buffer_size
+        self.known_days += 1
+
+    def _days_back(self, days: int) -> float:
+        """The value `days` days before the next one to be pushed, 1 being the latest."""
+        return self.buffer[(self.position - days) % self.buffer_size]
+
+    def _lag_and_rolling_mean(self) -> tuple[float, float]:
+        # Matches create_feature's fillna(0) while fewer days than the lag or window are known.
+        lag = self._days_back(LAG_DAYS + 1) if self.known_days > LAG_DAYS else 0.0
+        rolling_mean = 0.0
+        if self.known_days >= ROLLING_DAYS:
+            rolling_mean = math.fsum(self._days_back(days) for days in range(1, ROLLING_DAYS + 1)) / ROLLING_DAYS
+        return lag, rolling_mean
+
+    def _predict_row(self, row: np.ndarray) -> float:
+        trees = getattr(self.model, 'estimators_', None)
+        if trees is None or not hasattr(trees[0], 'tree_'):
+            return float(self.model.predict(pd.DataFrame(row, columns=FEATURES))[0])
+        row = row.astype(np.float32)
+        total = 0.0
+        for tree in trees:
+            total += tree.tree_.predict(row).ravel()[0]
+        return total / len(trees)
+
 
 
@@ -0,0 +1,166 @@
+"""Retrains the spending models of users whose spending changed since their model was trained.
+
+A pass compares each user's daily_spending watermark (first and last day, number of days and
+total spent) with the one recorded at their last training and retrains the stale models in a
+pool of --workers processes, each limited to --threads threads, so a pass never uses more than
+workers x threads cores however many users it covers. Models are written to a temporary file
+and renamed into place; the app's model registry picks the new file up on its next lookup.
+
+    python -m models.training_scheduler --workers 2 --threads 2
+    python -m models.training_scheduler --user alice --force
+    python -m models.training_scheduler --every 3600
+
+The app runs the same pass in the background every TRAINING_SCHEDULE_SECONDS when that is set.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from threadpoolctl import threadpool_limits
+
+from utils.database import SessionLocal, User, create_database_and_table, get_spending_watermarks, get_model_trainings
+from models.predictor import TRAINING_WORKERS, TRAINING_THREADS, MIN_TRAINING_DAYS, model_path_for, train_spending_model
+
+# Seconds between background training passes in the app process, 0 disables them.
+TRAINING_SCHEDULE_SECONDS = float(os.environ.get('TRAINING_SCHEDULE_SECONDS', 0))
+
+_background_thread = None
+_background_lock = threading.Lock()
+
+
+def find_stale_users(user_ids=None, force: bool = False) -> list[int]:
+    """Users with enough spending history whose model is missing or older than their data, most history first."""
+    watermarks = get_spending_watermarks(user_ids)
+    trainings = get_model_trainings(watermarks.keys())
+    stale = []
+    for user_id, watermark in watermarks.items():
+        if (watermark['last_day'] - watermark['first_day']).days + 1 < MIN_TRAINING_DAYS:
+            continue
+        training = trainings.get(user_id)
+        if (force or training is None or training['watermark'] != watermark
+                or not model_path_for(user_id).exists()):
+            stale.append(user_id)
+    # Longest trainings start first, so the pool is not left waiting on one big user at the end.
+    return sorted(stale, key=lambda user_id: watermarks[user_id]['days'], reverse=True)
+
+
+def run_training_pass(user_ids=None, force: bool = False, workers: int = TRAINING_WORKERS,
+                      threads: int = TRAINING_THREADS, verbose: bool = False) -> list[dict]:
+    """Retrains every stale model and returns one report per user, in completion order."""
+    stale = find_stale_users(user_ids, force)
+    if not stale:
+        print("All spending models are up to date.")
+        return []
+
+    reports = []
+    workers = max(1, min(workers, len(stale)))
+    print(f"Training {len(stale)} spending models with {workers} worker processes x {threads} threads...")
+    # Spawned, not forked: the app process has many threads whose locks a fork could copy mid-use.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(threads, verbose)) as executor:
+        futures = [executor.submit(_train, user_id, threads) for user_id in stale]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            _print_report(report)
+    return reports
+
+
+def start_background_training(interval: float = TRAINING_SCHEDULE_SECONDS):
+    """Runs a training pass every interval seconds on a daemon thread, once per process."""
+    global _background_thread
+    with _background_lock:
+        if interval <= 0 or (_background_thread is not None and _background_thread.is_alive()):
+            return _background_thread
+        _background_thread = threading.Thread(target=_background_loop, args=(interval,), name='model-training', daemon=True)
+        _background_thread.start()
+        return _background_thread
+
+
+def _background_loop(interval: float):
+    while True:
+        try:
+            run_training_pass()
+        except Exception as e:
+            print(f"Background model training failed: {e}")
+        time.sleep(interval)
+
+
+def _init_worker(threads: int, verbose: bool):
+    # Caps the native thread pools (BLAS, OpenMP) of the whole worker, not only during fit.
+    threadpool_limits(limits=threads)
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+
+def _train(user_id: int, threads: int) -> dict:
+    start = time.perf_counter()
+    try:
+        return train_spending_model(user_id, threads=threads)
+    except Exception as e:
+        return {'user_id': user_id, 'status': 'failed', 'error': f"{type(e).__name__}: {e}",
+                'traceback': traceback.format_exc(), 'seconds': time.perf_counter() - start}
+
+
+def _print_report(report: dict):
+    if report['status'] == 'failed':
+        print(f"  FAILED  user {report['user_id']}: {report['error']}")
+    elif report['status'] == 'not_enough_data':
+        print(f"  skipped user {report['user_id']}: only {report['days']} days of history")
+    else:
+        print(f"  trained user {report['user_id']} in {report['seconds']:.2f}s on {report['days']} days")
+
+
+def print_summary(reports: list[dict], elapsed: float):
+    trained = [r for r in reports if r['status'] == 'trained']
+    failed = [r for r in reports if r['status'] == 'failed']
+    print(f"\n{len(trained)} trained, {len(reports) - len(trained) - len(failed)} skipped, {len(failed)} failed "
+          f"in {elapsed:.2f}s ({sum(r['seconds'] for r in trained):.2f}s of training)")
+
+
+def _find_user_ids(usernames: list[str]) -> list[int]:
+    db = SessionLocal()
+    try:
+        users = db.query(User.id, User.username).filter(User.username.in_(usernames)).all()
+    finally:
+        db.close()
+    missing = set(usernames) - {user.username for user in users}
+    if missing:
+        print(f"Unknown users: {', '.join(sorted(missing))}")
+    return [user.id for user in users]
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--user', action='append', help="Only consider this username, may be repeated")
+    arg_parser.add_argument('--force', action='store_true', help="Retrain even models that are up to date")
+    arg_parser.add_argument('--dry-run', action='store_true', help="Only list the users that would be retrained")
+    arg_parser.add_argument('--workers', type=int, default=TRAINING_WORKERS)
+    arg_parser.add_argument('--threads', type=int, default=TRAINING_THREADS, help="threads per training")
+    arg_parser.add_argument('--every', type=float, default=0, help="repeat every this many seconds instead of exiting")
+    arg_parser.add_argument('--verbose', action='store_true', help="Show the trainers' output from the workers")
+    args = arg_parser.parse_args(argv)
+
+    create_database_and_table()
+    user_ids = _find_user_ids(args.user) if args.user else None
+    if args.dry_run:
+        stale = find_stale_users(user_ids, args.force)
+        print(f"{len(stale)} models to retrain: {', '.join(f'user {user_id}' for user_id in stale) or 'none'}")
+        return 0
+
+    while True:
+        start = time.perf_counter()
+        reports = run_training_pass(user_ids, args.force, args.workers, args.threads, args.verbose)
+        print_summary(reports, time.perf_counter() - start)
+        if args.every <= 0:
+            return 1 if any(r['status'] == 'failed' for r in reports) else 0
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
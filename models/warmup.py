@@ -0,0 +1,104 @@
+"""Loads the app's models on a background thread at startup, so no page waits on a cold load.
+
+start_warmup() runs once per server process. It first loads the Smart Categorizer's SBERT
+model and embedding cache (the slowest, several seconds with the torch import), then the
+spending models of recently active users, then starts the scheduled retraining if
+TRAINING_SCHEDULE_SECONDS is set. With MODEL_WARMUP=0 only the retraining is started.
+Pages read warmup_status() to show what is ready and call wait_until_ready() before using
+a model that is still loading. This module imports nothing heavy itself, the login page
+pays only for the thread start.
+"""
+import os
+import threading
+import time
+import traceback
+
+# Set to 0 to load models on first use instead, in the page that needs them.
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', '1') != '0'
+
+COMPONENTS = {
+    'categorizer': 'Smart Categorizer',
+    'spending_models': 'Spending forecast models',
+}
+
+_status = {name: {'state': 'pending', 'seconds': None, 'error': None} for name in COMPONENTS}
+_ready = {name: threading.Event() for name in COMPONENTS}
+_status_lock = threading.Lock()
+_warmup_thread = None
+_warmup_started = False
+_warmup_lock = threading.Lock()
+
+
+def start_warmup():
+    global _warmup_thread, _warmup_started
+    with _warmup_lock:
+        if not _warmup_started:
+            _warmup_started = True
+            if MODEL_WARMUP:
+                _warmup_thread = threading.Thread(target=_warm_up, name='model-warmup', daemon=True)
+                _warmup_thread.start()
+            else:
+                # Still off the login path, the scheduler imports the training stack.
+                threading.Thread(target=_start_training, name='model-training-start', daemon=True).start()
+        return _warmup_thread
+
+
+def warmup_status() -> dict:
+    """state ('pending', 'loading', 'ready' or 'failed'), load seconds and error per component."""
+    with _status_lock:
+        return {name: dict(status) for name, status in _status.items()}
+
+
+def wait_until_ready(name: str, timeout: float | None = None) -> bool:
+    """Blocks until the component has finished loading (or failed). Returns at once if warmup is
+    not running, the caller then loads what it needs itself."""
+    if _warmup_thread is None:
+        return True
+    return _ready[name].wait(timeout)
+
+
+def _warm_up():
+    _load('categorizer', _load_categorizer)
+    _load('spending_models', _load_spending_models)
+    _start_training()
+
+
+def _start_training():
+    try:
+        from models.training_scheduler import start_background_training
+        start_background_training()
+    except Exception as e:
+        print(f"Could not start scheduled model training: {e}")
+
+
+def _load(name: str, load):
+    _set_status(name, state='loading')
+    start = time.perf_counter()
+    try:
+        load()
+    except Exception as e:
+        print(f"Warmup of {COMPONENTS[name]} failed: {e}\n{traceback.format_exc()}")
+        _set_status(name, state='failed', seconds=time.perf_counter() - start, error=str(e))
+    else:
+        _set_status(name, state='ready', seconds=time.perf_counter() - start)
+        print(f"{COMPONENTS[name]} ready in {time.perf_counter() - start:.1f}s.")
+    finally:
+        _ready[name].set()
+
+
+def _load_categorizer():
+    from models.categorizer import get_sbert_model, get_embedding_cache
+
+    get_embedding_cache()
+    get_sbert_model()
+
+
+def _load_spending_models():
+    from models.predictor import warmup_models
+
+    warmup_models()
+
+
+def _set_status(name: str, **fields):
+    with _status_lock:
+        _status[name].update(fields)
@@ -1,55 +1,101 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from utils.bank_parser import BankStatementParser
-from utils.database import SessionLocal, User, save_transactions_to_db
+from utils.jobs import (ACTIVE_STATUSES, get_job_runner, enqueue_job, list_jobs, cancel_job, retry_job,
+                        has_job_password)
 
 if "user_id" not in st.session_state:
     st.warning("Please log in to upload and process a bank statement.")
     st.stop()
 
+user_id = st.session_state["user_id"]
+# Started with the page so jobs queued before a restart are picked up again.
+get_job_runner()
+
 st.title("Upload New Bank Statement")
 st.write(
-    "Please upload your password-protected bank statement PDF to add new transactions. "
-    "Your data will be saved to your profile."
+    "Please upload your password-protected bank statement PDFs to add new transactions. "
+    "They are processed in the background, you can keep using the app meanwhile."
 )
 
-file_uploaded = st.file_uploader(
-    "Upload you bank statement",
-    type = ['pdf'],
+files_uploaded = st.file_uploader(
+    "Upload you bank statements",
+    type=['pdf'],
+    accept_multiple_files=True,
     help="Only password-protected PDF statements are supported."
 )
 
 file_password = st.text_input(
     "Enter your PDF password",
-    type= "password",
-    help="Your password is required to unlock and read the statement."
+    type="password",
+    help="Your password is required to unlock and read the statements. It is used for every file uploaded together."
 )
 
-if st.button("Process Statement",type="primary"):
-    if file_uploaded and file_password:
-        with st.spinner("Processing your bank statement... This may take a moment."):
-            try:
-                user_id = st.session_state["user_id"]
-                file_bytes = BytesIO(file_uploaded.getvalue())
-                parser = BankStatementParser(file_bytes,file_password)
-
-                bank_name , parsed_data = parser.get_transactions()
-                account_number = parsed_data["account_number"]
-                transactions_df = parsed_data['transactions_df']
-
-                save_transactions_to_db(
-                    df=transactions_df,
-                    user_id= user_id,
-                    account_number= account_number,
-                    bank_name= bank_name
-                )
-                st.success('✅ Statement processed and saved successfully!')
-                st.info("Navigate to the 'Dashboard' or 'Transactions' page to view your updated data.")
-            except (ValueError, NotImplementedError) as e:
-                st.error(f"❌ An error occurred: {e}")
-            except Exception as e:
-                st.error(f"❌ An unexpected error occurred: {e}")
+if st.button("Process Statements", type="primary"):
+    if files_uploaded and file_password:
+        for file_uploaded in files_uploaded:
+            enqueue_job(user_id, file_uploaded.name, file_uploaded.getvalue(), file_password)
+        st.success(f"✅ {len(files_uploaded)} statement(s) queued for processing.")
     else:
         st.warning("Please upload a file and enter the password.")
 
+
+def show_job_result(job: dict):
+    result = job['result']
+    if result['status'] == 'already_ingested':
+        st.info(
+            f"ℹ️ This statement was already uploaded on {result['ingested_at'][:10]} "
+            f"({result['row_count']} transactions), nothing new to save."
+        )
+        return
+    st.write(f"{result['inserted']} new transactions saved, {result['skipped']} already present and skipped.")
+    if result['pages_parsed'] < result['page_count']:
+        st.caption(
+            f"Only {result['pages_parsed']} of {result['page_count']} pages needed parsing, "
+            "the rest overlap statements you uploaded before."
+        )
+
+
+def show_job(job: dict):
+    st.markdown(f"**{job['file_name']}** · {job['created_at']:%d %b %Y %H:%M} · {job['status']}")
+    if job['status'] in ACTIVE_STATUSES:
+        st.progress(float(job['progress'] or 0.0), text=job['message'] or job['stage'])
+        if st.button("Cancel", key=f"cancel_{job['id']}"):
+            cancel_job(job['id'], user_id)
+            st.rerun()
+    elif job['status'] == 'done':
+        show_job_result(job)
+    else:
+        if job['status'] == 'failed':
+            st.error(f"❌ {job['error']}")
+        else:
+            st.caption("Cancelled, transactions saved before that are kept and a retry resumes where it stopped.")
+        password_label = ("Password for the retry (leave empty to reuse the last one)" if has_job_password(job['id'])
+                          else "Password for the retry")
+        retry_password = st.text_input(password_label, type="password", key=f"retry_password_{job['id']}")
+        if st.button("Retry", key=f"retry_{job['id']}"):
+            retry_job(job['id'], user_id, retry_password or None)
+            st.rerun()
+
+
+jobs = list_jobs(user_id)
+has_active_jobs = any(job['status'] in ACTIVE_STATUSES for job in jobs)
+
+
+# Refreshes only this section every 2 seconds while something is queued or running.
+@st.fragment(run_every=2 if has_active_jobs else None)
+def show_jobs():
+    current_jobs = list_jobs(user_id)
+    if not current_jobs:
+        st.caption("No statements uploaded yet.")
+        return
+    for job in current_jobs:
+        with st.container(border=True):
+            show_job(job)
+    if any(job['status'] == 'done' for job in current_jobs):
+        st.info("Navigate to the 'Dashboard' or 'Transactions' page to view your updated data.")
+    if has_active_jobs and not any(job['status'] in ACTIVE_STATUSES for job in current_jobs):
+        # Rerun the whole page once so the fragment stops polling.
+        st.rerun()
+
+
+st.subheader("Your uploads")
+show_jobs()
@@ -1,53 +1,56 @@
+import contextlib
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 
-from utils.database import SessionLocal, Transactions, Accounts, update_pass_through_status
-from models.categorizer import SmartCategorizer
+from utils.database import update_pass_through_status, update_transaction_category
+from utils.transaction_queries import fetch_transactions, merchant_totals
+from utils.query_cache import user_cached, get_query_cache
+from models.categorizer import make_categorizer
+from models.warmup import wait_until_ready
 from utils.transaction_analyzer import get_passthrough_transactions
 
 if 'user_id' not in st.session_state:
     st.warning("Please log in to view this page.")
     st.stop()
 
-@st.cache_resource
 def load_categorizer():
-    return SmartCategorizer()
-
-
-def clean_transaction_detail(detail : str) -> str:
-    parts = detail.split('/')
-    try:
-        if 'DR' in parts:
-            index = parts.index('DR')
-            return parts[index + 1].strip()
-        elif 'CR' in parts:
-            index = parts.index('CR')
-            return parts[index + 1].strip()
-    except (ValueError, IndexError):
-        return detail[:40]
-    return detail[:40]
+    # The SBERT model and embedding cache are shared resources, centroids are per user so the instance is not.
+    # CATEGORIZER_BACKEND picks the backend, by default the lexical tier with SBERT for what it cannot place.
+    return make_categorizer()
+
+
+# The functions below are memoized per user until the user's transactions change, see utils.query_cache.
 
+@user_cached
 def get_all_transactions_for_user(user_id : int) -> pd.DataFrame:
-    db = SessionLocal()
-
-    try:
-        query = db.query(Transactions).join(Accounts).filter(Accounts.user_id == user_id)
-        df = pd.read_sql(query.statement,db.bind,parse_dates=['date'])
-        return df
-    finally:
-        db.close()
-
-def update_transaction_category(df: pd.DataFrame):
-    db = SessionLocal()
-    try:
-        db.bulk_update_mappings(Transactions,df.to_dict(orient='records'))
-        db.commit()
-    except Exception as e:
-        print(f"error updating categories: {e}")
-        db.rollback()
-    finally:
-        db.close()
+    # Pass-through transfers are excluded from every section below, so they are filtered out in SQL.
+    df, _ = fetch_transactions(
+        user_id, columns=['id','date','details','merchant','amount','type','category','is_pass_through'], include_pass_through=False)
+    return df
+
+@user_cached
+def get_top_merchants(user_id : int) -> pd.DataFrame:
+    return merchant_totals(user_id, limit=10, type='Debit', include_pass_through=False)
+
+@user_cached
+def get_passthrough_candidates(user_id : int) -> list[dict]:
+    return get_passthrough_transactions(get_all_transactions_for_user(user_id))
+
+@user_cached
+def predict_uncategorized_categories(user_id : int) -> pd.DataFrame:
+    """SmartCategorizer suggestions for the user's uncategorized transactions, indexed by transaction id."""
+    transactions_df = get_all_transactions_for_user(user_id)
+    uncategorized_df = transactions_df[transactions_df['category'] == 'Uncategorized']
+    categorizer.sync_user_centroids(user_id)
+    predictions = categorizer.predict_batch(
+        uncategorized_df['details'].tolist(), top_k=3, merchants=uncategorized_df['merchant'].tolist())
+    predictions['suggestions'] = [
+        ', '.join(f"{name} ({score:.0%})" for name, score in alternatives) for alternatives in predictions['alternatives']
+    ]
+    predictions.index = uncategorized_df['id'].to_numpy()
+    return predictions[['category','confidence','suggestions','tier']]
 
 st.set_page_config(page_title='Dashboard Page', page_icon="📊", layout='wide')
 st.title('Personal Finance Dashboard 📊')
@@ -69,7 +72,7 @@ st.write(
     "Marking these as 'pass-through' will exclude them from your spending analysis for better accuracy."
 )
 
-potential_pairs = get_passthrough_transactions(transactions_df)
+potential_pairs = get_passthrough_candidates(user_id)
 if not potential_pairs:
     st.success("✅ No potential pass-through transfers detected in your recent uploads.")
 else:
@@ -108,22 +111,35 @@ else:
 
 st.markdown('---')
 
-analysis_df = transactions_df[transactions_df['is_pass_through']==False].copy()
+analysis_df = transactions_df.copy()
 categorized_df = analysis_df[analysis_df['category']!= 'Uncategorized']
 uncategorized_df = analysis_df[analysis_df['category'] == 'Uncategorized']
 
 if not categorized_df.empty and not uncategorized_df.empty:
     st.toast('🤖 Running AI Smart Categorizer...')
-    categorizer.fit(categorized_df)
-    uncategorized_details = uncategorized_df['details'].tolist()
-    predict_categories=categorizer.predict(uncategorized_details)
-    uncategorized_df['category'] = predict_categories
+    # Only rows the lexical tier cannot place wait on the SBERT model, if it is still loading.
+    loading = not wait_until_ready('categorizer', timeout=0)
+    with st.spinner("Categorizing, the Smart Categorizer model is still loading in the background...") if loading \
+            else contextlib.nullcontext():
+        predictions = predict_uncategorized_categories(user_id).loc[uncategorized_df['id']]
+    if (predictions['tier'] == 'unresolved').any():
+        # The SBERT tier failed to load, retry on the next run rather than keep these until the next write.
+        predict_uncategorized_categories.discard(user_id)
+    uncategorized_df['category'] = predictions['category'].to_numpy()
+    uncategorized_df['confidence'] = predictions['confidence'].to_numpy()
+    uncategorized_df['suggestions'] = predictions['suggestions'].to_numpy()
+    tiers = predictions['tier'].value_counts(normalize=True)
+    caption = "Categorized by " + ", ".join(f"{tier} {share:.0%}" for tier, share in tiers.items())
+    if 'sbert' in tiers:
+        cache_stats = categorizer.embedding_cache.stats()
+        caption += (f". Embedding cache: {cache_stats['hit_rate']:.0%} hit rate "
+                    f"({cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} stored)")
+    st.caption(caption)
     display_df = pd.concat([categorized_df,uncategorized_df]).sort_values(by='date')
 else:
     display_df = analysis_df.copy()
 
 debits_df = display_df[display_df['type'] == 'Debit'].copy()
-debits_df['summary'] = debits_df['details'].apply(clean_transaction_detail)
 
 st.header('Categorize Your Expenses.')
 st.write('Our AI has suggested categories for new transactions. Review and save the changes.')
@@ -133,16 +149,19 @@ with st.form('category_form'):
         debits_df,
         column_config={
             'id': None,
-            'account_id' : None,
             'date' : st.column_config.DateColumn('Date',format= 'DD MMM YYYY'),
             'details' : st.column_config.TextColumn('Details', width='large'),
+            'merchant' : st.column_config.TextColumn('Merchant', disabled=True),
             'amount' : st.column_config.NumberColumn('Amount (₹)', format = '%.2f'),
             'type' : None,
+            'is_pass_through' : None,
             'category' : st.column_config.SelectboxColumn(
                 'Category',
                 options=["Uncategorized", "Food & Dining", "Shopping", "Travel", "Bills & Utilities", "Transfers", "Entertainment", "Health"],
                 required=True
-            )
+            ),
+            'confidence' : st.column_config.ProgressColumn('AI Confidence', format='%.2f', min_value=0.0, max_value=1.0),
+            'suggestions' : st.column_config.TextColumn('AI Suggestions', disabled=True)
         },
         hide_index = True,
         use_container_width=True,
@@ -190,4 +209,20 @@ with col2:
     fig.update_traces(textposition = 'inside', textinfo= 'percent+label')
     st.plotly_chart(fig,use_container_width=True)
 
+st.header('Top Merchants')
+st.dataframe(
+    get_top_merchants(user_id),
+    column_config={
+        'merchant': 'Merchant',
+        'total': st.column_config.NumberColumn('Spent (₹)', format='%.2f'),
+        'count': st.column_config.NumberColumn('Transactions'),
+    },
+    hide_index=True,
+    use_container_width=True
+)
 
+query_cache_stats = get_query_cache().stats()
+st.caption(
+    f"Query cache: {query_cache_stats['hit_rate']:.0%} hit rate "
+    f"({query_cache_stats['hits']} hits, {query_cache_stats['misses']} misses, {query_cache_stats['entries']} stored)"
+)
@@ -1,9 +1,11 @@
 import pandas as pd
 import streamlit as st
-from datetime import timedelta
-import plotly.express as px
 
-from models.predictor import (spending_predictor,get_daily_spending_history,create_feature)
+from models.predictor import (spending_predictor,get_daily_spending_history,train_spending_model,MIN_TRAINING_DAYS)
+from models.model_registry import get_model_registry
+from models.training_scheduler import find_stale_users
+from utils.database import get_model_trainings
+from utils.query_cache import user_cached
 
 st.set_page_config(page_title='Spending Forecast',page_icon="🔮",layout="wide")
 st.title('Spending Forecast 🔮')
@@ -13,22 +15,18 @@ if "user_id" not in st.session_state:
     st.stop()
 
 user_id = st.session_state['user_id']
+# The daily spending rollup is re-read only after the user's transactions change.
+cached_daily_spending_history = user_cached(get_daily_spending_history)
 predictor = spending_predictor(user_id)
 
 if not predictor.model_path.exists():
     st.info("You haven't trained a prediction model yet. Please train one to see your forecast.")
     if st.button('Train Prediction Model',type="primary"):
         with st.spinner("Training model... This may take a moment."):
-            historical_data = get_daily_spending_history(user_id)
-            if len(historical_data)<14:
-                st.error("Not enough historical data to train a model. Please use a statement with at least 14 days of spending.")
+            report = train_spending_model(user_id)
+            if report['status'] == 'not_enough_data':
+                st.error(f"Not enough historical data to train a model. Please use a statement with at least {MIN_TRAINING_DAYS} days of spending.")
             else:
-                featured_data = create_feature(historical_data)
-                feature = ['dayofweek','dayofmonth','month','year','lag_7','rolling_7_day_avg']
-                target = ['total_spending']
-                X= featured_data[feature]
-                y= featured_data[target]
-                predictor.train(X,y)
                 st.success("Model Trained Successfully!")
                 st.rerun()
 
@@ -38,26 +36,16 @@ else:
     if st.button("",type="primary"):
         st.spinner("")
         predictor.load_model()
-        historical_data = get_daily_spending_history(user_id)
-        last_known_day = historical_data.index.max()
-        future_dates = pd.date_range(start=last_known_day + timedelta(days=1),periods=forecasting_days)
-        forecasted_df = pd.DataFrame(index=future_dates,columns=["total_spending"])
-        temp_df = historical_data.copy()
-
-        for date in future_dates:
-            full_featured_df = create_feature(temp_df.tail(30))
-            x_to_predict = full_featured_df.tail(1)[['dayofweek','dayofmonth','month','year','lag_7','rolling_7_day_avg']]
-            prediction = predictor.predict(x_to_predict)[0]
-
-            forecasted_df.loc[date,'total_spending'] = prediction
-            new_row = pd.DataFrame({'total_spending':[prediction]},index=[date])
-            temp_df = pd.concat([temp_df,new_row])
+        historical_data = cached_daily_spending_history(user_id)
+        forecasted_df = predictor.forecast(historical_data, forecasting_days)
 
         historical_data['type'] = 'Historical'
         forecasted_df['type'] = 'Forecast'
         plot_df = pd.concat([historical_data, forecasted_df])
         plot_df.reset_index(inplace=True)
         plot_df.rename(columns={'index': 'date'}, inplace=True)
+        # plotly is only needed once a forecast is requested.
+        import plotly.express as px
 
             # Create the chart
         fig = px.line(
@@ -71,6 +59,23 @@ else:
         fig.update_traces(selector=dict(name="Forecast"), line=dict(dash='dot'))
         st.plotly_chart(fig, use_container_width=True)
 
+        model_stats = predictor.model_stats()
+        if model_stats:
+            registry_stats = get_model_registry().stats()
+            st.caption(
+                f"Model loaded in {model_stats['load_seconds']:.2f}s, ~{model_stats['bytes'] / 2**20:.1f} MB in memory, "
+                f"served from cache {model_stats['hits']} times · {registry_stats['models']} models cached, "
+                f"hit rate {registry_stats['hit_rate']:.0%}."
+            )
+
+    training = get_model_trainings([user_id]).get(user_id)
+    if training:
+        up_to_date = "up to date" if user_id not in find_stale_users([user_id]) else "your spending has changed since"
+        st.caption(
+            f"Model trained on {training['trained_at']:%d %b %Y %H:%M} in {training['training_seconds']:.1f}s "
+            f"on spending up to {training['watermark']['last_day']:%d %b %Y}, {up_to_date}."
+        )
+
     if st.button("Retrain Model with Latest Data"):
         # This logic is the same as the initial training button
         st.session_state['force_retrain'] = True  # Use session state to confirm
@@ -78,16 +83,13 @@ else:
     if 'force_retrain' in st.session_state and st.session_state['force_retrain']:
         if st.checkbox("I understand this will replace the existing model. Proceed."):
             with st.spinner("Retraining model..."):
-                historical_data = get_daily_spending_history(user_id)
-                featured_data = create_feature(historical_data)
-                FEATURES = ['dayofweek', 'dayofmonth', 'month', 'year', 'lag_7', 'rolling_7_day_avg']
-                TARGET = 'total_spending'
-                X = featured_data[FEATURES]
-                y = featured_data[TARGET]
-                predictor.train(X, y)
-                st.success("Model retrained successfully!")
+                report = train_spending_model(user_id)
                 del st.session_state['force_retrain']
-                st.rerun()
+                if report['status'] == 'not_enough_data':
+                    st.warning(f"Not enough historical data to retrain, the existing model is kept. Retraining needs at least {MIN_TRAINING_DAYS} days of spending.")
+                else:
+                    st.success("Model retrained successfully!")
+                    st.rerun()
 
 
 
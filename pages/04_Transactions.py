@@ -1,20 +1,45 @@
 import streamlit as st
-import pandas as pd
 
-from utils.database import SessionLocal, Transactions, Accounts
+from utils.transaction_queries import (fetch_transactions, transaction_totals, transaction_filter_options,
+                                       TRANSACTIONS_PAGE_SIZE)
+from utils.query_cache import user_cached, get_query_cache
 
 if 'user_id' not in st.session_state:
     st.warning("Please log in to view this page.")
     st.stop()
 
-def get_transactions_for_user(user_id: int) -> pd.DataFrame:
-    db = SessionLocal()
-    try:
-        query = db.query(Transactions).join(Accounts).filter(Accounts.user_id == user_id)
-        df = pd.read_sql(query.statement, db.bind)
-        return df
-    finally:
-        db.close()
+# Reused across reruns until the user's transactions change, see utils.query_cache.
+cached_fetch_transactions = user_cached(fetch_transactions)
+cached_transaction_totals = user_cached(transaction_totals)
+cached_filter_options = user_cached(transaction_filter_options)
+
+def show_transaction_page(key: str, filters: dict, column_config: dict, column_order: list):
+    """Shows one page of the filtered transactions with Previous/Next buttons. The keyset
+    cursors of the pages before it are kept in session state and reset when the filters change."""
+    cursors_key = f"{key}_cursors"
+    filters_key = f"{key}_filters"
+    if st.session_state.get(filters_key) != filters:
+        st.session_state[filters_key] = filters
+        st.session_state[cursors_key] = [None]
+    cursors = st.session_state[cursors_key]
+
+    page_df, next_cursor = cached_fetch_transactions(
+        user_id, columns=tuple(column_order), after=cursors[-1], limit=TRANSACTIONS_PAGE_SIZE, **filters)
+    st.dataframe(
+        page_df,
+        column_config=column_config,
+        column_order=column_order,
+        use_container_width=True,
+        hide_index=True
+    )
+    col_previous, col_page, col_next = st.columns([1, 4, 1])
+    if col_previous.button('Previous', key=f"{key}_previous", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    col_page.caption(f"Page {len(cursors)}")
+    if col_next.button('Next', key=f"{key}_next", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
 
 st.set_page_config(page_title='All Transactions',page_icon="💰",layout='wide')
 st.title('All Transactions 💰')
@@ -24,49 +49,64 @@ if 'user_id' not in st.session_state:
     st.stop()
 
 user_id = st.session_state['user_id']
-transaction_df = get_transactions_for_user(user_id)
+options = cached_filter_options(user_id)
 
-if transaction_df.empty:
+if options['first_date'] is None:
     st.warning('ou have no transactions yet. Please upload a statement on the Home page.')
     st.stop()
 
+with st.sidebar:
+    st.header('Filters')
+    date_range = st.date_input(
+        'Date range',
+        value=(options['first_date'].date(), options['last_date'].date()),
+        min_value=options['first_date'].date(),
+        max_value=options['last_date'].date()
+    )
+    account_id = st.selectbox(
+        'Account', [None, *options['accounts']],
+        format_func=lambda value: 'All accounts' if value is None else options['accounts'][value]
+    )
+    category = st.selectbox(
+        'Category', [None, *options['categories']],
+        format_func=lambda value: 'All categories' if value is None else value
+    )
+
+# The range has a single date while the second one is still being picked.
+start_date, end_date = (date_range[0], date_range[-1]) if date_range else (None, None)
+filters = {'start': start_date, 'end': end_date, 'account_id': account_id, 'category': category}
+totals = cached_transaction_totals(user_id, **filters)
+
 st.header('Incoming Payments(Credits)')
-credit_df = transaction_df[transaction_df['type']== 'Credit']
-total_credit = credit_df['amount'].sum()
-st.metric("Total Payments Received",f"₹{total_credit:,.2f}")
-st.dataframe(
-    credit_df,
+st.metric("Total Payments Received",f"₹{totals['Credit']['total']:,.2f}")
+show_transaction_page(
+    'credits',
+    {**filters, 'type': 'Credit'},
     column_config={
-        'id':None,
-        'account_id':None,
         'date': st.column_config.DateColumn('Date', format="DD MMM YYYY"),
         'details': st.column_config.TextColumn('Details', width='large'),
         'amount': st.column_config.NumberColumn('Amount', format='%.2f'),
-        'type':None,
-        'category': None
     },
     column_order=['date','details','amount'],
-    use_container_width=True,
-    hide_index=True
 )
 
 st.header('Outgoing Expenses(Debits)')
-debit_df = transaction_df[transaction_df['type']=='Debit']
-total_debit = debit_df['amount'].sum()
-st.metric("Total Expenses",f"₹{total_debit:,.2f}")
-st.dataframe(
-    debit_df,
+st.metric("Total Expenses",f"₹{totals['Debit']['total']:,.2f}")
+show_transaction_page(
+    'debits',
+    {**filters, 'type': 'Debit'},
     column_config={
-        'id':None,
-        'account_id':None,
         'date': st.column_config.DateColumn('Date', format="DD MMM YYYY"),
         'details': st.column_config.TextColumn('Details', width='large'),
+        'merchant': 'Merchant',
         'amount': st.column_config.NumberColumn('Amount (₹)', format='%.2f'),
-        'type':None,
         'category': 'category'
-
     },
-    column_order=['date','details','amount','category'],
-    use_container_width=True,
-    hide_index=True
-)
\ No newline at end of file
+    column_order=['date','details','merchant','amount','category'],
+)
+
+query_cache_stats = get_query_cache().stats()
+st.caption(
+    f"Query cache: {query_cache_stats['hit_rate']:.0%} hit rate "
+    f"({query_cache_stats['hits']} hits, {query_cache_stats['misses']} misses, {query_cache_stats['entries']} stored)"
+)
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import plotly.express as px
+import streamlit as st
+
+from utils.tracing import TRACING_ENABLED, get_tracer, stage_stats
+
+st.set_page_config(page_title='Diagnostics', page_icon="🩺", layout="wide")
+st.title('Diagnostics 🩺')
+
+if 'user_id' not in st.session_state:
+    st.warning("Please log in to view this page.")
+    st.stop()
+
+if not TRACING_ENABLED:
+    st.info("Tracing is disabled (TRACING_ENABLED=0), only spans recorded before that are shown.")
+
+windows = {'Last hour': timedelta(hours=1), 'Last 24 hours': timedelta(days=1), 'Last 7 days': timedelta(days=7)}
+window = st.selectbox('Time window', list(windows), index=1)
+stats = stage_stats(datetime.now() - windows[window])
+
+if stats.empty:
+    st.info("No stages recorded in this window yet. Upload a statement or open the forecast to record some.")
+    st.stop()
+
+st.subheader('Time per stage')
+fig = px.bar(
+    stats.melt(id_vars='stage', value_vars=['p50_ms', 'p95_ms'], var_name='percentile', value_name='ms'),
+    x='stage', y='ms', color='percentile', barmode='group',
+    labels={'ms': 'Duration (ms)', 'stage': 'Stage'}
+)
+st.plotly_chart(fig, use_container_width=True)
+
+st.dataframe(
+    stats,
+    column_config={
+        'stage': 'Stage',
+        'runs': st.column_config.NumberColumn('Runs'),
+        'p50_ms': st.column_config.NumberColumn('p50 (ms)', format="%.1f"),
+        'p95_ms': st.column_config.NumberColumn('p95 (ms)', format="%.1f"),
+        'mean_ms': st.column_config.NumberColumn('Mean (ms)', format="%.1f"),
+        'errors': st.column_config.NumberColumn('Errors'),
+        'rows': st.column_config.NumberColumn('Rows'),
+        'pages': st.column_config.NumberColumn('Pages'),
+        'bytes': st.column_config.NumberColumn('Bytes'),
+        'rows_per_s': st.column_config.NumberColumn('Rows/s', format="%.0f"),
+    },
+    use_container_width=True,
+    hide_index=True
+)
+
+tracer = get_tracer()
+st.caption(
+    f"Spans from every process writing to this database. This server process has recorded "
+    f"{sum(totals['count'] for totals in tracer.totals().values())} spans since it started"
+    + (f", {tracer.dropped} dropped because the buffer was full." if tracer.dropped else ".")
+)
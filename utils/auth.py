@@ -1,10 +1,15 @@
-import streamlit as st
-from passlib.context import CryptContext
+_pwd_context = None
 
-pwd_context = CryptContext(schemes=['bcrypt'],deprecated='auto')
+def _get_pwd_context():
+    # passlib and its bcrypt backend are imported on the first login, not with the login page.
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=['bcrypt'],deprecated='auto')
+    return _pwd_context
 
 def hash_password_auth(password: str)-> str:
-    return pwd_context.hash(password)
+    return _get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hash_password: str)-> bool:
-    return pwd_context.verify(plain_password,hash_password)
\ No newline at end of file
+    return _get_pwd_context().verify(plain_password,hash_password)
@@ -1,15 +1,15 @@
-import pdfplumber
 import pikepdf
-from io import BytesIO
+from contextlib import contextmanager
 from fuzzywuzzy import process
-import pytesseract
 import re
-from PIL import Image
 
 from .parsers import UnionBankParser, SbiParser
+from .pdf_session import PdfSession
+from .ocr import get_ocr_engine
+from .tracing import span
 
-# IMPORTANT: This line is specific to your local machine's Tesseract installation.
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+# Top 30% of the first page, where banks print their name and IFSC.
+HEADER_REGION = (0.0, 0.0, 1.0, 0.3)
 
 
 class BankStatementParser:
@@ -23,11 +23,9 @@ class BankStatementParser:
         }
         self.known_banks = [bank for bank, parser in self.bank_parsers.items() if parser is not None]
 
-    def identify_bank(self, pdf):
+    def identify_bank(self, session):
         print("Attempting to identify bank via text extraction...")
-        page_text = ""
-        for page in pdf.pages[:2]:
-            page_text += page.extract_text(x_tolerance=1, y_tolerance=3) or ""
+        page_text = session.pages_text(range(2), x_tolerance=1, y_tolerance=3)
 
         if "sbi.co.in" in page_text or "State Bank of India" in page_text:
             print("Bank identified as: State Bank of India (via text fingerprint)")
@@ -38,12 +36,7 @@ class BankStatementParser:
 
         print("Text-based identification failed. Falling back to OCR...")
         try:
-            page_image = pdf.pages[0].to_image(resolution=200)
-            pil_image = page_image.original
-            width, height = pil_image.size
-            header_image = pil_image.crop((0, 0, width, height * 0.3))
-            grayscale_image = header_image.convert("L")
-            ocr_text = pytesseract.image_to_string(grayscale_image)
+            ocr_text = get_ocr_engine().ocr_region(session, 0, HEADER_REGION)
 
             print(ocr_text)
 
@@ -66,30 +59,40 @@ class BankStatementParser:
 
         return None
 
-    def get_transactions(self):
+    @contextmanager
+    def open_session(self):
         try:
-            pdf_file = pikepdf.open(self.file_stream, password=self.password)
-            pdf_bytes = BytesIO()
-            pdf_file.save(pdf_bytes)
-            pdf_bytes.seek(0)
-
-            with pdfplumber.open(pdf_bytes) as pdf:
-                bank_name = self.identify_bank(pdf)
-                if not bank_name:
-                    raise ValueError(
-                        "Could not identify the bank from the provided PDF. The format may not be supported.")
+            session = PdfSession(self.file_stream, self.password).open()
+        except pikepdf.PasswordError:
+            raise ValueError("Incorrect password provided for the PDF.")
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def get_parser(self, session):
+        with span('identify', pages=min(2, session.page_count)):
+            bank_name = self.identify_bank(session)
+        if not bank_name:
+            raise ValueError(
+                "Could not identify the bank from the provided PDF. The format may not be supported.")
+
+        parser_instance = self.bank_parsers.get(bank_name)
+        if not parser_instance:
+            raise NotImplementedError(f"A parser for '{bank_name}' has not been implemented yet.")
+        return bank_name, parser_instance
 
-                parser_instance = self.bank_parsers.get(bank_name)
-                if not parser_instance:
-                    raise NotImplementedError(f"A parser for '{bank_name}' has not been implemented yet.")
+    def get_transactions(self):
+        try:
+            with self.open_session() as session:
+                bank_name, parser_instance = self.get_parser(session)
 
                 print(f"Delegating parsing task to {parser_instance.__class__.__name__}...")
-                parsed_data = parser_instance.parse(pdf)
+                parsed_data = parser_instance.parse(session)
+                print(f"PDF extraction stats: {session.stats}")
 
                 return bank_name, parsed_data
 
-        except pikepdf.PasswordError:
-            raise ValueError("Incorrect password provided for the PDF.")
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
             raise
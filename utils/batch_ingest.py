@@ -0,0 +1,157 @@
+"""Ingests every PDF statement in a directory without going through the Streamlit uploader.
+
+Statements are parsed in a process pool and every result is written by the main process,
+so the database only ever has one writer. Each statement is committed together with its
+ledger entry as soon as it is parsed, which makes an interrupted run safe to repeat:
+statements already stored are recognised by content hash and skipped.
+
+    python -m utils.batch_ingest data/ --user alice --password-map passwords.json --workers 4
+
+The password map is a JSON object of file name to password; the key "*" is used for files
+not listed, as is --password.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from . import database, table_extraction
+from .database import SessionLocal, User, create_database_and_table
+from .ingestion import parse_statement, store_statement
+from .ocr import get_ocr_engine
+
+BATCH_WORKERS = int(os.environ.get('BATCH_INGEST_WORKERS', min(os.cpu_count() or 1, 8)))
+
+
+def ingest_directory(directory, user_id: int, passwords: dict | None = None, workers: int = BATCH_WORKERS,
+                     verbose: bool = False) -> list[dict]:
+    """Ingests every *.pdf in directory and returns one report per file, in completion order."""
+    passwords = passwords or {}
+    files = sorted(path for path in Path(directory).iterdir() if path.suffix.lower() == '.pdf')
+    if not files:
+        print(f"No PDF statements found in {directory}.")
+        return []
+
+    reports = []
+    workers = max(1, min(workers, len(files)))
+    print(f"Ingesting {len(files)} statements with {workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(verbose,)) as executor:
+        futures = {
+            executor.submit(_parse_file, str(path), passwords.get(path.name, passwords.get('*')), user_id): path
+            for path in files
+        }
+        for future in as_completed(futures):
+            report = future.result()
+            if report['status'] == 'parsed':
+                report = _store(report)
+            reports.append(report)
+            _print_report(report)
+    return reports
+
+
+def _init_worker(verbose: bool):
+    # Connections inherited from the parent must not be shared with it.
+    database.engine.dispose(close=False)
+    # The batch is already spread over processes, so each statement is extracted serially.
+    table_extraction.TABLE_EXTRACTION_WORKERS = 1
+    get_ocr_engine().workers = 1
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+
+def _parse_file(path: str, password, user_id: int) -> dict:
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as file_stream:
+            result = parse_statement(file_stream, password, user_id)
+    except Exception as e:
+        return {'file': path, 'status': 'failed', 'error': f"{type(e).__name__}: {e}",
+                'traceback': traceback.format_exc(), 'seconds': time.perf_counter() - start}
+    return {**result, 'file': path, 'seconds': time.perf_counter() - start}
+
+
+def _store(report: dict) -> dict:
+    start = time.perf_counter()
+    try:
+        result = store_statement(report)
+    except Exception as e:
+        return {'file': report['file'], 'status': 'failed', 'error': f"Saving failed, {type(e).__name__}: {e}",
+                'traceback': traceback.format_exc(), 'seconds': report['seconds']}
+    return {**result, 'file': report['file'], 'seconds': report['seconds'] + time.perf_counter() - start}
+
+
+def _print_report(report: dict):
+    name = Path(report['file']).name
+    if report['status'] == 'failed':
+        print(f"  FAILED   {name} ({report['seconds']:.2f}s): {report['error']}")
+    elif report['status'] == 'already_ingested':
+        print(f"  skipped  {name}: already ingested")
+    else:
+        print(f"  ingested {name} ({report['seconds']:.2f}s): {report['pages_parsed']}/{report['page_count']} pages, "
+              f"{report['row_count']} rows, {report['inserted']} new")
+
+
+def print_summary(reports: list[dict], elapsed: float):
+    ingested = [r for r in reports if r['status'] == 'ingested']
+    skipped = [r for r in reports if r['status'] == 'already_ingested']
+    failed = [r for r in reports if r['status'] == 'failed']
+    pages = sum(r['pages_parsed'] for r in ingested)
+    rows = sum(r['row_count'] for r in ingested)
+    elapsed = max(elapsed, 1e-9)
+
+    print(f"\n{len(ingested)} ingested, {len(skipped)} already ingested, {len(failed)} failed in {elapsed:.2f}s")
+    print(f"Throughput: {pages / elapsed:.1f} pages/s, {rows / elapsed:.1f} rows/s "
+          f"({pages} pages, {rows} rows, {sum(r['inserted'] for r in ingested)} new transactions)")
+    if failed:
+        print("\nFailures:")
+        for report in failed:
+            print(f"  {Path(report['file']).name}: {report['error']}")
+
+
+def _load_passwords(args) -> dict:
+    passwords = {}
+    if args.password_map:
+        with open(args.password_map) as f:
+            passwords = json.load(f)
+    if args.password is not None:
+        passwords.setdefault('*', args.password)
+    return passwords
+
+
+def _find_user_id(username: str) -> int | None:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter_by(username=username).first()
+        return user.id if user else None
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('directory')
+    arg_parser.add_argument('--user', required=True, help="Username the transactions belong to")
+    arg_parser.add_argument('--password-map', help="JSON file of file name -> PDF password, '*' for the default")
+    arg_parser.add_argument('--password', help="Password for files not in the password map")
+    arg_parser.add_argument('--workers', type=int, default=BATCH_WORKERS)
+    arg_parser.add_argument('--verbose', action='store_true', help="Show the parsers' output from the workers")
+    args = arg_parser.parse_args(argv)
+
+    create_database_and_table()
+    user_id = _find_user_id(args.user)
+    if user_id is None:
+        print(f"No user named '{args.user}', create it from the app first.")
+        return 1
+
+    start = time.perf_counter()
+    reports = ingest_directory(args.directory, user_id, _load_passwords(args), args.workers, args.verbose)
+    print_summary(reports, time.perf_counter() - start)
+    return 1 if any(r['status'] == 'failed' for r in reports) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
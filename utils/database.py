@@ -1,14 +1,74 @@
+import os
+import hashlib
+import json
+from datetime import date, datetime, timedelta
 import pandas as pd
-from sqlalchemy import create_engine,Float,String,DateTime,Column,Integer,MetaData,ForeignKey,Boolean
+from sqlalchemy import create_engine,Float,String,DateTime,Column,Integer,MetaData,ForeignKey,Boolean,Index,LargeBinary,Date,Text,inspect,text,func,event
+import numpy as np
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base,sessionmaker,relationship
 from pathlib import Path
 
+from .db_writer import get_database_writer, in_writer_thread
+from .merchants import extract_merchants
+from .tracing import span
+
 _basedir = Path(__file__).parent
 _project_root = _basedir.parent
 db_path = _project_root / 'finance_tracker.db'
-DataBase_URL = f'sqlite:///{db_path}'
+DataBase_URL = os.environ.get('FINANCE_DB_URL', f'sqlite:///{db_path}')
+
+# SQLite settings applied to every connection, see make_engine. The journal mode is stored in the
+# database file, so it is set once, by create_database_and_table.
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_CACHE_SIZE_MB = int(os.environ.get('SQLITE_CACHE_SIZE_MB', 64))
+SQLITE_MMAP_SIZE_MB = int(os.environ.get('SQLITE_MMAP_SIZE_MB', 256))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+# Connections kept open per process, each Streamlit session borrows one per query.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 8))
+
+def make_engine(url: str):
+    """Engine for url with a connection pool sized for concurrent sessions. For SQLite files every
+    connection uses synchronous=NORMAL (durable at checkpoints, safe with WAL), a larger page cache,
+    memory-mapped reads and a busy timeout so a writer queues behind another process's write instead
+    of failing with 'database is locked'. WAL journaling, so readers never wait for a writer, is
+    switched on by create_database_and_table; only opening a database does not rewrite its file."""
+    url_object = make_url(url)
+    if url_object.get_backend_name() != 'sqlite':
+        return create_engine(url, echo=False, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+
+    pool_options = {}
+    if url_object.database not in (None, '', ':memory:'):
+        pool_options = {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW}
+    new_engine = create_engine(
+        url, echo=False,
+        connect_args={'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False},
+        **pool_options
+    )
+    event.listen(new_engine, 'connect', _configure_sqlite_connection)
+    event.listen(new_engine, 'begin', _begin_sqlite_transaction)
+    return new_engine
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA cache_size={-SQLITE_CACHE_SIZE_MB * 1024}')
+    cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 2**20}')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+def _begin_sqlite_transaction(conn):
+    # Queued writes take the write lock up front. A deferred transaction that reads first and then
+    # writes fails at once if another process committed in between, the busy timeout does not apply.
+    # Elsewhere the driver keeps beginning transactions lazily, at the first write.
+    if in_writer_thread():
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
 
-engine = create_engine(DataBase_URL, echo=False)
+engine = make_engine(DataBase_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -27,7 +87,7 @@ class Accounts(Base):
     id = Column(Integer,primary_key=True,autoincrement=True)
     account_number = Column(String, nullable=False) # masked account number
     bank_name = Column(String, nullable=False)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
 
     owner = relationship('User',back_populates='accounts')
 
@@ -44,58 +104,526 @@ class Transactions(Base):
     type = Column(String,nullable=False)
     category = Column(String,default='Uncategorized')
     is_pass_through = Column(Boolean,default=False,nullable=False)
+    fingerprint = Column(String) # hash of date, details, amount, type and occurrence, used for deduplication
+    centroid_category = Column(String) # category this row is currently counted in within category_centroids
+    merchant = Column(String) # merchant extracted from details when the row is saved, see utils.merchants
 
     account = relationship('Accounts',back_populates='transactions')
 
+    __table_args__ = (
+        Index('ix_transactions_account_fingerprint', 'account_id', 'fingerprint', unique=True),
+        Index('ix_transactions_account_date', 'account_id', 'date'),
+        Index('ix_transactions_account_type_date', 'account_id', 'type', 'date'),
+        Index('ix_transactions_account_merchant', 'account_id', 'merchant'),
+    )
+
+class DailySpending(Base):
+    """Debit total per user and day, excluding pass-through transfers. Kept up to date on ingest
+    and on pass-through changes, so forecasting reads one row per day instead of every transaction."""
+
+    __tablename__ = 'daily_spending'
+    id = Column(Integer,primary_key=True,autoincrement=True)
+    user_id = Column(Integer,ForeignKey('users.id'),nullable=False)
+    day = Column(Date,nullable=False)
+    total_spending = Column(Float,nullable=False)
+    transaction_count = Column(Integer,nullable=False)
+
+    __table_args__ = (
+        Index('ix_daily_spending_user_day', 'user_id', 'day', unique=True),
+    )
+
+class UserDataVersions(Base):
+    """Counter bumped in the same transaction as every write to a user's transactions. Cached
+    query results are tagged with the version they were computed at, see utils.query_cache."""
+
+    __tablename__ = 'user_data_versions'
+    user_id = Column(Integer,ForeignKey('users.id'),primary_key=True)
+    version = Column(Integer,nullable=False,default=0)
+
+class ModelTrainings(Base):
+    """The last training of each user's spending model, with its duration and the daily_spending
+    watermark it was trained on, see get_spending_watermarks and models.training_scheduler."""
+
+    __tablename__ = 'model_trainings'
+    user_id = Column(Integer,ForeignKey('users.id'),primary_key=True)
+    trained_at = Column(DateTime,nullable=False)
+    training_seconds = Column(Float,nullable=False)
+    model_path = Column(String,nullable=False)
+    data_first_day = Column(Date)
+    data_last_day = Column(Date)
+    data_days = Column(Integer,nullable=False) # daily_spending rows, days with at least one debit
+    data_total = Column(Float,nullable=False)
+
+class TraceSpans(Base):
+    """One timed stage of the pipeline (decrypt, table_extraction, commit, ...), see utils.tracing."""
+
+    __tablename__ = 'trace_spans'
+    id = Column(Integer,primary_key=True,autoincrement=True)
+    name = Column(String,nullable=False)
+    started_at = Column(DateTime,nullable=False)
+    duration_ms = Column(Float,nullable=False)
+    rows = Column(Integer)
+    pages = Column(Integer)
+    bytes = Column(Integer)
+    ok = Column(Boolean,nullable=False,default=True)
+    pid = Column(Integer)
+
+    __table_args__ = (
+        Index('ix_trace_spans_started_name', 'started_at', 'name'),
+    )
+
+class CategoryCentroids(Base):
+    """Running sum and count of embeddings per user and category, the mean is the SmartCategorizer centroid."""
+
+    __tablename__ = 'category_centroids'
+    id = Column(Integer,primary_key=True,autoincrement=True)
+    user_id = Column(Integer,ForeignKey('users.id'),nullable=False)
+    model_name = Column(String,nullable=False)
+    category = Column(String,nullable=False)
+    embedding_sum = Column(LargeBinary,nullable=False) # float64 vector bytes
+    count = Column(Integer,nullable=False,default=0)
+
+    __table_args__ = (
+        Index('ix_category_centroids_user_model_category', 'user_id', 'model_name', 'category', unique=True),
+    )
+
+class OcrResults(Base):
+    """Cached OCR output keyed by the decrypted PDF's content hash, page, region and DPI."""
+
+    __tablename__ = 'ocr_results'
+    id = Column(Integer,primary_key=True,autoincrement=True)
+    content_hash = Column(String,nullable=False)
+    kind = Column(String,nullable=False) # 'text' or 'table'
+    page = Column(Integer,nullable=False)
+    region = Column(String,nullable=False) # x0,y0,x1,y1 as fractions of the page
+    dpi = Column(Integer,nullable=False)
+    result = Column(Text,nullable=False) # plain text, or JSON rows for tables
+
+    __table_args__ = (
+        Index('ix_ocr_results_lookup', 'content_hash', 'kind', 'page', 'region', 'dpi', unique=True),
+    )
+
+class StatementIngestions(Base):
+    """One row per statement PDF a user has ingested, keyed by the decrypted PDF's content hash."""
+
+    __tablename__ = 'statement_ingestions'
+    id = Column(Integer,primary_key=True,autoincrement=True)
+    user_id = Column(Integer,ForeignKey('users.id'),nullable=False)
+    content_hash = Column(String,nullable=False)
+    bank_name = Column(String,nullable=False)
+    account_number = Column(String,nullable=False)
+    start_date = Column(DateTime)
+    end_date = Column(DateTime)
+    page_count = Column(Integer,nullable=False)
+    pages_parsed = Column(Integer,nullable=False)
+    row_count = Column(Integer,nullable=False)
+    inserted_count = Column(Integer,nullable=False)
+    parse_seconds = Column(Float,nullable=False)
+    ingested_at = Column(DateTime,nullable=False)
+
+    __table_args__ = (
+        Index('ix_statement_ingestions_user_hash', 'user_id', 'content_hash', unique=True),
+        Index('ix_statement_ingestions_account', 'user_id', 'bank_name', 'account_number'),
+    )
+
+class IngestionCheckpoints(Base):
+    """Progress of a statement being ingested in streaming mode, committed together with each
+    batch of transactions so an interrupted ingestion resumes after the last committed page."""
+
+    __tablename__ = 'ingestion_checkpoints'
+    id = Column(Integer,primary_key=True,autoincrement=True)
+    user_id = Column(Integer,ForeignKey('users.id'),nullable=False)
+    content_hash = Column(String,nullable=False)
+    next_page = Column(Integer,nullable=False)
+    row_count = Column(Integer,nullable=False)
+    inserted_count = Column(Integer,nullable=False)
+    start_date = Column(DateTime)
+    end_date = Column(DateTime)
+    # Fingerprint occurrence counts of the last committed day, see compute_fingerprints.
+    occurrences = Column(Text,nullable=False)
+    updated_at = Column(DateTime,nullable=False)
+
+    __table_args__ = (
+        Index('ix_ingestion_checkpoints_user_hash', 'user_id', 'content_hash', unique=True),
+    )
+
+
+class IngestionJobs(Base):
+    """A statement upload waiting for or being processed by the background workers, see utils.jobs.
+    The PDF is kept here so the job survives browser refreshes; its password is never stored."""
+
+    __tablename__ = 'ingestion_jobs'
+    id = Column(Integer,primary_key=True,autoincrement=True)
+    user_id = Column(Integer,ForeignKey('users.id'),nullable=False)
+    file_name = Column(String,nullable=False)
+    file_bytes = Column(LargeBinary,nullable=False)
+    status = Column(String,nullable=False,default='queued') # queued, running, done, failed or cancelled
+    stage = Column(String,nullable=False,default='queued')
+    progress = Column(Float,nullable=False,default=0.0)
+    message = Column(String)
+    result = Column(Text) # JSON summary of the ingestion once done
+    error = Column(Text)
+    attempts = Column(Integer,nullable=False,default=0)
+    cancel_requested = Column(Boolean,nullable=False,default=False)
+    created_at = Column(DateTime,nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index('ix_ingestion_jobs_user_created', 'user_id', 'created_at'),
+        Index('ix_ingestion_jobs_status', 'status', 'id'),
+    )
+
 
 def create_database_and_table():
     print('creating Database and table if they dont exist')
     Base.metadata.create_all(bind=engine)
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            conn.exec_driver_sql(f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE}')
+    _upgrade_schema()
     print('Database setup completed')
 
-def save_transactions_to_db(df: pd.DataFrame, user_id : int, account_number : str, bank_name : str):
+def _upgrade_schema():
+    """Brings databases created by older versions up to the current model: adds missing
+    columns, backfills transaction fingerprints and merchants and creates missing indexes."""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        with engine.begin() as conn:
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    print(f"Adding missing column {table.name}.{column.name}")
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+    _backfill_fingerprints()
+    _backfill_merchants()
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    _backfill_daily_spending()
+
+def _backfill_fingerprints():
+    with engine.begin() as conn:
+        legacy_df = pd.read_sql(
+            text('SELECT id, account_id, date, details, amount, type FROM transactions WHERE fingerprint IS NULL ORDER BY id'),
+            conn, parse_dates=['date']
+        )
+        if legacy_df.empty:
+            return
+        print(f"Backfilling fingerprints for {len(legacy_df)} transactions")
+        fingerprints = pd.concat([compute_fingerprints(group) for _, group in legacy_df.groupby('account_id', dropna=False)])
+        conn.execute(
+            text('UPDATE transactions SET fingerprint = :fingerprint WHERE id = :id'),
+            [{'id': int(row_id), 'fingerprint': fingerprint} for row_id, fingerprint in zip(legacy_df['id'], fingerprints.loc[legacy_df.index])]
+        )
+
+def _backfill_merchants(chunk_rows: int = 50_000):
+    with engine.begin() as conn:
+        legacy_df = pd.read_sql(text('SELECT id, details FROM transactions WHERE merchant IS NULL ORDER BY id'), conn)
+        if legacy_df.empty:
+            return
+        print(f"Extracting merchants for {len(legacy_df)} transactions")
+        for start in range(0, len(legacy_df), chunk_rows):
+            chunk = legacy_df.iloc[start:start + chunk_rows]
+            conn.execute(
+                text('UPDATE transactions SET merchant = :merchant WHERE id = :id'),
+                [{'id': int(row_id), 'merchant': merchant} for row_id, merchant in zip(chunk['id'], extract_merchants(chunk['details']))]
+            )
+
+def _backfill_daily_spending():
+    with engine.begin() as conn:
+        has_rollups = conn.execute(text('SELECT 1 FROM daily_spending LIMIT 1')).first()
+        has_debits = conn.execute(text("SELECT 1 FROM transactions WHERE type = 'Debit' LIMIT 1")).first()
+    if has_debits and not has_rollups:
+        print('Building daily spending totals')
+        rebuild_daily_spending()
+
+def compute_fingerprints(df: pd.DataFrame, occurrence_offsets: dict | None = None) -> pd.Series:
+    """Stable per-row key for deduplication. Identical rows within the same statement get
+    an occurrence number, so genuine repeats are kept while re-uploads are still detected.
+
+    When a statement is fingerprinted in chunks, occurrence_offsets carries the number of
+    times each key was already seen in earlier chunks and is updated in place.
+    """
+    key = (
+        pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d %H:%M:%S') + '|'
+        + df['details'].astype(str) + '|'
+        + df['amount'].astype(float).round(2).map('{:.2f}'.format) + '|'
+        + df['type'].astype(str)
+    )
+    occurrence = key.groupby(key).cumcount()
+    if occurrence_offsets is not None:
+        occurrence = occurrence + key.map(occurrence_offsets).fillna(0).astype(int)
+        occurrence_offsets.update((occurrence + 1).groupby(key).max().to_dict())
+    return (key + '|' + occurrence.astype(str)).map(lambda value: hashlib.sha1(value.encode('utf-8')).hexdigest())
+
+def save_transactions_to_db(df: pd.DataFrame, user_id : int, account_number : str, bank_name : str,
+                           ledger: dict | None = None) -> dict:
+    """Saves a statement's transactions through the database writer queue, see utils.db_writer.
+    ledger, the statement's statement_ingestions fields, is recorded in the same transaction, so
+    a statement is only marked ingested once its transactions are stored. Raises if the save fails."""
+    return get_database_writer().run(_save_transactions, df, user_id, account_number, bank_name, ledger)
+
+def _save_transactions(df: pd.DataFrame, user_id : int, account_number : str, bank_name : str,
+                       ledger: dict | None = None) -> dict:
 
-    if df.empty:
+    if df.empty and ledger is None:
         print('Dataframe is empty, no transactions to save')
-        return
+        return {'inserted': 0, 'skipped': 0}
     db = SessionLocal()
+    result = {'inserted': 0, 'skipped': 0}
 
     try:
-        account = db.query(Accounts).filter_by(
-            user_id = user_id,
-            account_number = account_number,
-            bank_name = bank_name
-        ).first()
-
-        if not account:
-            print(f"Creating a new account {account_number} for user {user_id}")
-            account = Accounts(user_id=user_id, account_number=account_number, bank_name=bank_name)
-            db.add(account)
-            db.commit()
-            db.refresh(account)
-
-        transaction_add = []
-        for _, row in df.iterrows():
-            exists = db.query(Transactions).filter_by(
-                account_id = account.id,
-                date = row['date'].to_pydatetime(),
-                details = row['details'],
-                amount = row['amount'],
-                type = row['type'],
-            ).first()
-
-            if not exists:
-                transaction_add.append(Transactions(**row,account_id = account.id))
-
-        if transaction_add:
-            db.add_all(transaction_add)
+        records = []
+        if not df.empty:
+            account = _get_or_create_account(db, user_id, account_number, bank_name)
+            with span('dedupe', rows=len(df)):
+                records = _transaction_records(df, account.id)
+                result['inserted'] = _insert_transactions(db, account.id, records)
+        result['skipped'] = len(records) - result['inserted']
+        with span('commit', rows=result['inserted']):
+            if result['inserted']:
+                _refresh_daily_spending(db, user_id, min(record['date'] for record in records),
+                                        max(record['date'] for record in records))
+                _bump_data_version(db, [user_id])
+            if ledger is not None:
+                _insert_statement_ingestion(db, {**ledger, 'inserted_count': result['inserted']})
             db.commit()
-            print(f'successfully saved {len(transaction_add)} new transaction for account {account_number}.')
+
+        if result['inserted']:
+            print(f"successfully saved {result['inserted']} new transaction for account {account_number}.")
         else:
             print('No transactions to save')
+        if result['skipped']:
+            print(f"Skipped {result['skipped']} transactions that were already saved.")
     except Exception as e:
         print(f"An error occurred while saving the transactions: {e}")
         db.rollback()
+        raise
+    finally:
+        db.close()
+    return result
+
+def save_transaction_stream(chunks, user_id: int, account_number: str, bank_name: str, content_hash: str,
+                            checkpoint: dict | None = None, batch_rows: int = 2000) -> dict:
+    """Saves transactions arriving as (last page index, transactions_df) chunks from a streaming
+    parse. Chunks are buffered up to batch_rows rows and each batch is committed together with
+    the statement's ingestion checkpoint, so memory is bounded by one batch and a failure loses
+    at most the uncommitted batch. Pass the checkpoint from load_ingestion_checkpoint to resume.
+
+    Statements are chronological, so only the last committed day's fingerprint occurrence
+    counts have to be carried between batches.
+    """
+    state = dict(checkpoint) if checkpoint else {
+        'next_page': 0, 'row_count': 0, 'inserted_count': 0, 'start_date': None, 'end_date': None, 'occurrences': {},
+    }
+    writer = get_database_writer()
+    try:
+        account_id = writer.run(_get_or_create_account_id, user_id, account_number, bank_name)
+        buffered, buffered_rows = [], 0
+        for last_page, transactions_df in chunks:
+            buffered.append(transactions_df)
+            buffered_rows += len(transactions_df)
+            state['next_page'] = last_page + 1
+            if buffered_rows >= batch_rows:
+                # Parsing continues on this thread, only the commit waits in the writer queue.
+                writer.run(_commit_stream_batch, account_id, user_id, content_hash, buffered, state)
+                buffered, buffered_rows = [], 0
+        writer.run(_commit_stream_batch, account_id, user_id, content_hash, buffered, state)
+    except Exception as e:
+        print(f"Streaming save stopped after page {state['next_page']}: {e}")
+        raise
+    print(f"successfully saved {state['inserted_count']} new of {state['row_count']} streamed transactions "
+          f"for account {account_number}.")
+    return state
+
+def _commit_stream_batch(account_id: int, user_id: int, content_hash: str, frames: list, state: dict):
+    db = SessionLocal()
+    try:
+        inserted_before = state['inserted_count']
+        _write_stream_batch(db, account_id, user_id, content_hash, frames, state)
+        with span('commit', rows=state['inserted_count'] - inserted_before):
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _write_stream_batch(db, account_id: int, user_id: int, content_hash: str, frames: list, state: dict):
+    batch_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not batch_df.empty:
+        with span('dedupe', rows=len(batch_df)):
+            records = _transaction_records(batch_df, account_id, state['occurrences'])
+            inserted = _insert_transactions(db, account_id, records)
+        state['inserted_count'] += inserted
+        state['row_count'] += len(records)
+        first_date, last_date = batch_df['date'].min().to_pydatetime(), batch_df['date'].max().to_pydatetime()
+        if inserted:
+            _refresh_daily_spending(db, user_id, first_date, last_date)
+            _bump_data_version(db, [user_id])
+        state['start_date'] = min(filter(None, [state['start_date'], first_date]))
+        state['end_date'] = max(filter(None, [state['end_date'], last_date]))
+        last_day = pd.Timestamp(batch_df['date'].iloc[-1]).strftime('%Y-%m-%d %H:%M:%S') + '|'
+        state['occurrences'] = {key: count for key, count in state['occurrences'].items() if key.startswith(last_day)}
+
+    checkpoint = {key: value for key, value in state.items() if key != 'occurrences'}
+    insert_stmt = sqlite_insert(IngestionCheckpoints).values(
+        user_id=user_id, content_hash=content_hash, occurrences=json.dumps(state['occurrences']),
+        updated_at=datetime.now(), **checkpoint)
+    db.execute(insert_stmt.on_conflict_do_update(
+        index_elements=['user_id', 'content_hash'],
+        set_={name: insert_stmt.excluded[name] for name in [*checkpoint, 'occurrences', 'updated_at']}))
+
+def _get_or_create_account_id(user_id: int, account_number: str, bank_name: str) -> int:
+    db = SessionLocal()
+    try:
+        return _get_or_create_account(db, user_id, account_number, bank_name).id
+    finally:
+        db.close()
+
+def _get_or_create_account(db, user_id: int, account_number: str, bank_name: str):
+    account = db.query(Accounts).filter_by(
+        user_id = user_id,
+        account_number = account_number,
+        bank_name = bank_name
+    ).first()
+
+    if not account:
+        print(f"Creating a new account {account_number} for user {user_id}")
+        account = Accounts(user_id=user_id, account_number=account_number, bank_name=bank_name)
+        db.add(account)
+        db.commit()
+        db.refresh(account)
+    return account
+
+def _transaction_records(df: pd.DataFrame, account_id: int, occurrence_offsets: dict | None = None) -> list[dict]:
+    records_df = df[['date', 'details', 'amount', 'type']].copy()
+    records_df['date'] = pd.to_datetime(records_df['date'])
+    records_df['fingerprint'] = compute_fingerprints(records_df, occurrence_offsets)
+    records_df['merchant'] = extract_merchants(records_df['details'])
+    records_df['account_id'] = account_id
+    records_df['category'] = df['category'] if 'category' in df.columns else 'Uncategorized'
+    records_df['is_pass_through'] = False
+    records = records_df.to_dict(orient='records')
+    for record in records:
+        record['date'] = record['date'].to_pydatetime()
+    return records
+
+def _insert_transactions(db, account_id: int, records: list[dict]) -> int:
+    """Inserts records, skipping fingerprints the account already has. Returns the number inserted."""
+    count_query = db.query(func.count(Transactions.id)).filter(Transactions.account_id == account_id)
+    count_before = count_query.scalar()
+    insert_stmt = sqlite_insert(Transactions).on_conflict_do_nothing(index_elements=['account_id', 'fingerprint'])
+    db.execute(insert_stmt, records)
+    return count_query.scalar() - count_before
+
+def _refresh_daily_spending(db, user_id: int, first_date: datetime, last_date: datetime):
+    """Recomputes the user's daily_spending rows for the days from first_date to last_date, inclusive."""
+    bounds = {
+        'user_id': user_id,
+        'first_day': first_date.strftime('%Y-%m-%d'),
+        'last_day': last_date.strftime('%Y-%m-%d'),
+        # Dates are stored as 'YYYY-MM-DD HH:MM:SS...' text, so day strings compare as day boundaries.
+        'end': (last_date + timedelta(days=1)).strftime('%Y-%m-%d'),
+    }
+    db.execute(text('DELETE FROM daily_spending WHERE user_id = :user_id AND day BETWEEN :first_day AND :last_day'), bounds)
+    db.execute(text('''
+        INSERT INTO daily_spending (user_id, day, total_spending, transaction_count)
+        SELECT accounts.user_id, date(transactions.date), SUM(transactions.amount), COUNT(*)
+        FROM transactions
+        JOIN accounts ON transactions.account_id = accounts.id
+        WHERE accounts.user_id = :user_id AND transactions.type = 'Debit' AND transactions.is_pass_through = 0
+          AND transactions.date >= :first_day AND transactions.date < :end
+        GROUP BY accounts.user_id, date(transactions.date)
+    '''), bounds)
+
+def rebuild_daily_spending(user_id: int | None = None):
+    """Recomputes daily_spending from the transactions table, for one user or everyone."""
+    user_filter = 'WHERE user_id = :user_id' if user_id is not None else ''
+    with engine.begin() as conn:
+        conn.execute(text(f'DELETE FROM daily_spending {user_filter}'), {'user_id': user_id})
+        conn.execute(text(f'''
+            INSERT INTO daily_spending (user_id, day, total_spending, transaction_count)
+            SELECT accounts.user_id, date(transactions.date), SUM(transactions.amount), COUNT(*)
+            FROM transactions
+            JOIN accounts ON transactions.account_id = accounts.id
+            WHERE transactions.type = 'Debit' AND transactions.is_pass_through = 0
+              {'AND accounts.user_id = :user_id' if user_id is not None else ''}
+            GROUP BY accounts.user_id, date(transactions.date)
+        '''), {'user_id': user_id})
+
+def get_daily_spending(user_id: int, start=None, end=None) -> pd.DataFrame:
+    """The user's stored daily_spending rows between start and end (inclusive, either may be None), ordered by day."""
+    query = 'SELECT day, total_spending FROM daily_spending WHERE user_id = :user_id'
+    params = {'user_id': user_id}
+    if start is not None:
+        query += ' AND day >= :start'
+        params['start'] = pd.Timestamp(start).strftime('%Y-%m-%d')
+    if end is not None:
+        query += ' AND day <= :end'
+        params['end'] = pd.Timestamp(end).strftime('%Y-%m-%d')
+    with engine.connect() as conn:
+        return pd.read_sql(text(query + ' ORDER BY day'), conn, params=params, parse_dates=['day'])
+
+def get_spending_watermarks(user_ids=None) -> dict:
+    """First and last day, number of days and total spent in each user's daily_spending rows,
+    keyed by user id. Any write that changes a user's spending history changes at least one of them."""
+    query = ('SELECT user_id, MIN(day) AS first_day, MAX(day) AS last_day, COUNT(*) AS days, '
+             'SUM(total_spending) AS total FROM daily_spending')
+    params = {}
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        query += f" WHERE user_id IN ({', '.join(f':user_{i}' for i in range(len(user_ids)))})"
+        params = {f'user_{i}': user_id for i, user_id in enumerate(user_ids)}
+    with engine.connect() as conn:
+        rows = conn.execute(text(query + ' GROUP BY user_id'), params).all()
+    return {
+        row.user_id: {
+            'first_day': date.fromisoformat(row.first_day), 'last_day': date.fromisoformat(row.last_day),
+            'days': row.days, 'total': round(row.total, 2),
+        }
+        for row in rows
+    }
+
+def get_model_trainings(user_ids=None) -> dict:
+    """The recorded last training of each user's model, keyed by user id."""
+    db = SessionLocal()
+    try:
+        query = db.query(ModelTrainings)
+        if user_ids is not None:
+            query = query.filter(ModelTrainings.user_id.in_(list(user_ids)))
+        return {
+            row.user_id: {
+                'trained_at': row.trained_at, 'training_seconds': row.training_seconds, 'model_path': row.model_path,
+                'watermark': {'first_day': row.data_first_day, 'last_day': row.data_last_day,
+                              'days': row.data_days, 'total': row.data_total},
+            }
+            for row in query.all()
+        }
+    finally:
+        db.close()
+
+def record_model_training(user_id: int, training_seconds: float, model_path: str, watermark: dict):
+    db = SessionLocal()
+    try:
+        fields = {
+            'trained_at': datetime.now(), 'training_seconds': training_seconds, 'model_path': str(model_path),
+            'data_first_day': watermark['first_day'], 'data_last_day': watermark['last_day'],
+            'data_days': watermark['days'], 'data_total': watermark['total'],
+        }
+        insert_stmt = sqlite_insert(ModelTrainings).values(user_id=user_id, **fields)
+        db.execute(insert_stmt.on_conflict_do_update(index_elements=['user_id'], set_=fields))
+        db.commit()
+    except Exception as e:
+        print(f"Error recording model training: {e}")
+        db.rollback()
     finally:
         db.close()
 
@@ -103,12 +631,249 @@ def update_pass_through_status(transaction_ids: list[int], status: bool):
     db = SessionLocal()
     try:
         db.query(Transactions).filter(Transactions.id.in_(transaction_ids)).update(
-            {Transactions.is_pass_through,status},synchronize_session=False
+            {Transactions.is_pass_through: status},synchronize_session=False
         )
+        affected_days = db.query(Accounts.user_id, func.date(Transactions.date)).join(
+            Accounts, Transactions.account_id == Accounts.id).filter(
+            Transactions.id.in_(transaction_ids), Transactions.type == 'Debit').distinct().all()
+        for user_id, day in affected_days:
+            day = datetime.strptime(day, '%Y-%m-%d')
+            _refresh_daily_spending(db, user_id, day, day)
+        _bump_data_version(db, _transaction_owners(db, transaction_ids))
         db.commit()
         print(f"Successfully updated pass-through status for IDs: {transaction_ids}")
     except Exception as e:
         print(f"Error updating pass-through status: {e}")
         db.rollback()
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def update_transaction_category(df: pd.DataFrame):
+    """Saves edited categories, df holds the id and the new category of each changed transaction."""
+    db = SessionLocal()
+    try:
+        db.bulk_update_mappings(Transactions,df.to_dict(orient='records'))
+        _bump_data_version(db, _transaction_owners(db, df['id'].tolist()))
+        db.commit()
+    except Exception as e:
+        print(f"error updating categories: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def get_data_version(user_id: int) -> int:
+    db = SessionLocal()
+    try:
+        version = db.query(UserDataVersions.version).filter(UserDataVersions.user_id == user_id).scalar()
+        return version or 0
+    finally:
+        db.close()
+
+def _bump_data_version(db, user_ids):
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    insert_stmt = sqlite_insert(UserDataVersions).values([{'user_id': user_id, 'version': 1} for user_id in user_ids])
+    db.execute(insert_stmt.on_conflict_do_update(
+        index_elements=['user_id'], set_={'version': UserDataVersions.version + 1}))
+
+def _transaction_owners(db, transaction_ids: list[int]) -> list[int]:
+    rows = db.query(Accounts.user_id).join(Transactions, Transactions.account_id == Accounts.id).filter(
+        Transactions.id.in_([int(transaction_id) for transaction_id in transaction_ids])).distinct().all()
+    return [row.user_id for row in rows]
+
+_CENTROID_CHANGES_QUERY = text('''
+    SELECT id, details, old_category, new_category FROM (
+        SELECT transactions.id, transactions.details, transactions.centroid_category AS old_category,
+               CASE WHEN transactions.is_pass_through = 0 AND transactions.category != 'Uncategorized'
+                    THEN transactions.category END AS new_category
+        FROM transactions
+        JOIN accounts ON transactions.account_id = accounts.id
+        WHERE accounts.user_id = :user_id
+    )
+    WHERE COALESCE(old_category, '') != COALESCE(new_category, '')
+''')
+
+def get_centroid_changes(user_id: int) -> pd.DataFrame:
+    """Transactions whose contribution to the category centroids is out of date: newly categorized,
+    re-categorized, reset to Uncategorized or toggled as pass-through since the last sync."""
+    with engine.connect() as conn:
+        return pd.read_sql(_CENTROID_CHANGES_QUERY, conn, params={'user_id': user_id})
+
+def apply_centroid_changes(user_id: int, model_name: str, changes: pd.DataFrame, embeddings: np.ndarray) -> int:
+    """Adds the embeddings of rows from get_centroid_changes to the centroids of their new category,
+    subtracts them from their old one and records the category each row is now counted under.
+
+    Runs on the database writer in one transaction. The changes are read again there and rows no
+    longer pending with the same old and new category are left out, so a row edited since, or
+    applied by a concurrent sync, is not counted twice. Returns the number of rows applied."""
+    return get_database_writer().run(_apply_centroid_changes, user_id, model_name, changes, embeddings)
+
+def _centroid_change_keys(changes: pd.DataFrame) -> pd.Series:
+    return (changes['id'].astype(str) + '|' + changes['old_category'].fillna('').astype(str) + '|'
+            + changes['new_category'].fillna('').astype(str))
+
+def _apply_centroid_changes(user_id: int, model_name: str, changes: pd.DataFrame, embeddings: np.ndarray) -> int:
+    db = SessionLocal()
+    try:
+        pending = pd.read_sql(_CENTROID_CHANGES_QUERY, db.connection(), params={'user_id': user_id})
+        still_pending = _centroid_change_keys(changes).isin(set(_centroid_change_keys(pending))).to_numpy()
+        changes, embeddings = changes[still_pending].reset_index(drop=True), embeddings[still_pending]
+        if changes.empty:
+            db.rollback()
+            return 0
+
+        deltas = {}
+        for column, sign in (('old_category', -1), ('new_category', 1)):
+            for category, positions in changes.groupby(column).indices.items():
+                sum_delta, count_delta = deltas.get(category, (np.zeros(embeddings.shape[1]), 0))
+                deltas[category] = (sum_delta + sign * embeddings[positions].sum(axis=0), count_delta + sign * len(positions))
+
+        existing = {
+            row.category: row for row in db.query(CategoryCentroids).filter_by(user_id=user_id, model_name=model_name)
+        }
+        for category, (sum_delta, count_delta) in deltas.items():
+            row = existing.get(category)
+            if row is None:
+                row = CategoryCentroids(user_id=user_id, model_name=model_name, category=category,
+                                        embedding_sum=np.zeros_like(sum_delta, dtype=np.float64).tobytes(), count=0)
+                db.add(row)
+            embedding_sum = np.frombuffer(row.embedding_sum, dtype=np.float64) + sum_delta
+            row.count = row.count + count_delta
+            row.embedding_sum = (embedding_sum if row.count > 0 else np.zeros_like(embedding_sum)).tobytes()
+
+        # Record the category each row was counted under, a later edit is then picked up by the next sync.
+        db.execute(
+            text('UPDATE transactions SET centroid_category = :category WHERE id = :id'),
+            [{'id': int(transaction_id), 'category': category}
+             for transaction_id, category in zip(changes['id'], changes['new_category'].where(changes['new_category'].notna(), None))]
+        )
+        db.commit()
+        return len(changes)
+    except Exception as e:
+        print(f"Error updating category centroids: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def load_category_centroids(user_id: int, model_name: str) -> dict:
+    """Returns {category: (embedding_sum, count)} for the user's stored centroids."""
+    db = SessionLocal()
+    try:
+        rows = db.query(CategoryCentroids).filter_by(user_id=user_id, model_name=model_name).all()
+        return {row.category: (np.frombuffer(row.embedding_sum, dtype=np.float64), row.count) for row in rows}
+    finally:
+        db.close()
+
+def reset_category_centroids(user_id: int):
+    """Drops the stored centroids so the next sync rebuilds them, e.g. after switching embedding model."""
+    db = SessionLocal()
+    try:
+        db.query(CategoryCentroids).filter_by(user_id=user_id).delete(synchronize_session=False)
+        db.execute(
+            text('''UPDATE transactions SET centroid_category = NULL
+                    WHERE account_id IN (SELECT id FROM accounts WHERE user_id = :user_id)'''),
+            {'user_id': user_id}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def find_statement_ingestion(user_id: int, content_hash: str) -> dict | None:
+    db = SessionLocal()
+    try:
+        row = db.query(StatementIngestions).filter_by(user_id=user_id, content_hash=content_hash).first()
+        if row is None:
+            return None
+        return {column.name: getattr(row, column.name) for column in StatementIngestions.__table__.columns}
+    finally:
+        db.close()
+
+def get_ingested_date_ranges(user_id: int, bank_name: str, account_number: str) -> list[tuple]:
+    """Date ranges already ingested for an account, merged where they overlap."""
+    db = SessionLocal()
+    try:
+        rows = db.query(StatementIngestions.start_date, StatementIngestions.end_date).filter(
+            StatementIngestions.user_id == user_id,
+            StatementIngestions.bank_name == bank_name,
+            StatementIngestions.account_number == account_number,
+            StatementIngestions.start_date.isnot(None),
+        ).order_by(StatementIngestions.start_date).all()
+    finally:
+        db.close()
+    merged = []
+    for start_date, end_date in rows:
+        if merged and start_date <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end_date))
+        else:
+            merged.append((start_date, end_date))
+    return merged
+
+def recently_active_user_ids(limit: int) -> list[int]:
+    """Users ordered by their latest statement upload, most recent first."""
+    db = SessionLocal()
+    try:
+        rows = db.query(StatementIngestions.user_id).group_by(StatementIngestions.user_id).order_by(
+            func.max(StatementIngestions.ingested_at).desc()).limit(limit).all()
+        return [row.user_id for row in rows]
+    finally:
+        db.close()
+
+def record_statement_ingestion(**fields):
+    get_database_writer().run(_record_statement_ingestion, fields)
+
+def _record_statement_ingestion(fields: dict):
+    db = SessionLocal()
+    try:
+        _insert_statement_ingestion(db, fields)
+        db.commit()
+    except Exception as e:
+        print(f"Error recording statement ingestion: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def _insert_statement_ingestion(db, fields: dict):
+    insert_stmt = sqlite_insert(StatementIngestions).values(ingested_at=datetime.now(), **fields)
+    db.execute(insert_stmt.on_conflict_do_nothing(index_elements=['user_id', 'content_hash']))
+
+def load_ingestion_checkpoint(user_id: int, content_hash: str) -> dict | None:
+    db = SessionLocal()
+    try:
+        row = db.query(IngestionCheckpoints).filter_by(user_id=user_id, content_hash=content_hash).first()
+        if row is None:
+            return None
+        return {
+            'next_page': row.next_page, 'row_count': row.row_count, 'inserted_count': row.inserted_count,
+            'start_date': row.start_date, 'end_date': row.end_date, 'occurrences': json.loads(row.occurrences),
+        }
+    finally:
+        db.close()
+
+def clear_ingestion_checkpoint(user_id: int, content_hash: str):
+    db = SessionLocal()
+    try:
+        db.query(IngestionCheckpoints).filter_by(user_id=user_id, content_hash=content_hash).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def create_trace_spans_table():
+    """Creates trace_spans (and its index) if missing, for processes that trace before create_database_and_table."""
+    TraceSpans.__table__.create(engine, checkfirst=True)
+
+def record_trace_spans(spans: list[dict]):
+    if not spans:
+        return
+    with engine.begin() as conn:
+        conn.execute(TraceSpans.__table__.insert(), spans)
+
+def get_trace_spans(since: datetime) -> pd.DataFrame:
+    query = text('SELECT name, started_at, duration_ms, rows, pages, bytes, ok FROM trace_spans WHERE started_at >= :since')
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn, params={'since': since.strftime('%Y-%m-%d %H:%M:%S')}, parse_dates=['started_at'])
+
+def delete_trace_spans(before: datetime) -> int:
+    with engine.begin() as conn:
+        return conn.execute(TraceSpans.__table__.delete().where(TraceSpans.started_at < before)).rowcount
@@ -0,0 +1,79 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Run bulk database writes one at a time on a dedicated thread. Set to 0 to write from the calling thread.
+DB_SERIAL_WRITES = os.environ.get('DB_SERIAL_WRITES', '1') != '0'
+
+_writer = None
+_writer_lock = threading.Lock()
+_writer_thread = threading.local()
+
+
+def get_database_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SerialWriter()
+        return _writer
+
+
+def in_writer_thread() -> bool:
+    """True on the thread that runs queued writes, its transactions take the write lock up front."""
+    return getattr(_writer_thread, 'active', False)
+
+
+class SerialWriter:
+    """A queue of write jobs executed in order by one daemon thread.
+
+    SQLite allows one writer at a time. Funnelling the bulk ingests of every session in the
+    process through one thread means they wait in this queue instead of retrying on
+    'database is locked', while readers keep going against the WAL snapshot. Jobs are plain
+    callables; run() blocks until the job is done and returns its result or raises its error.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.stats = {'jobs': 0, 'failed': 0, 'wait_seconds': 0.0, 'run_seconds': 0.0}
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, time.perf_counter(), func, args, kwargs))
+        return future
+
+    def run(self, func, *args, **kwargs):
+        # Jobs that write again (or serial writes being disabled) run inline, a nested submit would deadlock.
+        if not DB_SERIAL_WRITES or in_writer_thread():
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='database-writer', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        _writer_thread.active = True
+        while True:
+            future, queued_at, func, args, kwargs = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            started_at = time.perf_counter()
+            self.stats['wait_seconds'] += started_at - queued_at
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                self.stats['failed'] += 1
+                future.set_exception(e)
+            finally:
+                self.stats['jobs'] += 1
+                self.stats['run_seconds'] += time.perf_counter() - started_at
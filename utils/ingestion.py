@@ -0,0 +1,252 @@
+import os
+import time
+
+import pandas as pd
+
+from .bank_parser import BankStatementParser
+from .database import (save_transactions_to_db, find_statement_ingestion, get_ingested_date_ranges,
+                       record_statement_ingestion, save_transaction_stream, load_ingestion_checkpoint,
+                       clear_ingestion_checkpoint)
+
+# Statements with at least this many pages are parsed and saved in streaming mode.
+STREAMING_MIN_PAGES = int(os.environ.get('STREAMING_MIN_PAGES', 100))
+STREAM_PAGES_PER_CHUNK = int(os.environ.get('STREAM_PAGES_PER_CHUNK', 32))
+STREAM_BATCH_ROWS = int(os.environ.get('STREAM_BATCH_ROWS', 2000))
+
+# Keys of a parse_statement result that are stored in the statement_ingestions ledger.
+_LEDGER_FIELDS = ('user_id', 'content_hash', 'bank_name', 'account_number', 'start_date', 'end_date',
+                  'page_count', 'pages_parsed', 'row_count', 'parse_seconds')
+
+
+class _UnprobeablePage(Exception):
+    pass
+
+
+def ingest_statement(file_stream, password, user_id: int, streaming: bool | None = None, progress=None) -> dict:
+    """Parses a statement and saves its transactions, using the statement_ingestions ledger to
+    avoid repeat work. A statement whose decrypted content was ingested before returns straight
+    away; for one that overlaps earlier statements of the same account, pages lying entirely
+    inside an already ingested date range are not parsed.
+
+    Long statements (STREAMING_MIN_PAGES or more, unless streaming says otherwise) are parsed a
+    chunk of pages at a time and committed in batches, see _stream_session.
+
+    progress, if given, is called as progress(stage, fraction, message) when a stage starts
+    ('opening', 'identifying', 'parsing', 'saving') and after every streamed chunk. An exception
+    it raises aborts the ingestion; batches a streaming ingestion already committed are kept.
+    """
+    _report(progress, 'opening', 0.05, 'Decrypting the statement')
+    parser = BankStatementParser(file_stream, password)
+    with parser.open_session() as session:
+        if streaming is None:
+            streaming = session.page_count >= STREAMING_MIN_PAGES
+        if streaming:
+            return _stream_session(parser, session, user_id, progress)
+        parsed = _parse_session(parser, session, user_id, progress)
+    if parsed['status'] == 'already_ingested':
+        return parsed
+    _report(progress, 'saving', 0.85, f"Saving {parsed['row_count']} transactions")
+    return store_statement(parsed)
+
+
+def _report(progress, stage: str, fraction: float, message: str = ''):
+    if progress is not None:
+        progress(stage, fraction, message)
+
+
+def parse_statement(file_stream, password, user_id: int) -> dict:
+    """The read-only half of ingest_statement, safe to run in worker processes. Returns the
+    ledger entry for a known statement, or the ledger summary plus 'transactions_df'."""
+    parser = BankStatementParser(file_stream, password)
+    with parser.open_session() as session:
+        return _parse_session(parser, session, user_id)
+
+
+def _parse_session(parser, session, user_id: int, progress=None) -> dict:
+    known = _known_statement(session, user_id)
+    if known:
+        return known
+
+    start = time.perf_counter()
+    _report(progress, 'identifying', 0.15, 'Identifying the bank and statement format')
+    bank_name, bank_parser, account_number, skipped_pages, skipped_span = _select_pages(parser, session, user_id)
+    _report(progress, 'parsing', 0.3, f"Parsing {len(session.statement_pages())} of {session.page_count} pages")
+    if session.page_selection is not None and not session.page_selection:
+        transactions_df = pd.DataFrame(columns=['date', 'details', 'amount', 'type'])
+    else:
+        try:
+            transactions_df = bank_parser.parse(session)['transactions_df']
+        except ValueError:
+            # The remaining pages may legitimately hold no transaction table (e.g. only a summary).
+            if not skipped_pages:
+                raise
+            transactions_df = pd.DataFrame(columns=['date', 'details', 'amount', 'type'])
+    parse_seconds = time.perf_counter() - start
+
+    known_dates = list(transactions_df['date']) + list(skipped_span)
+    print(f"PDF extraction stats: {session.stats}")
+    return {
+        'status': 'parsed',
+        'user_id': user_id,
+        'content_hash': session.content_hash,
+        'bank_name': bank_name,
+        'account_number': account_number,
+        'start_date': min(known_dates).to_pydatetime() if known_dates else None,
+        'end_date': max(known_dates).to_pydatetime() if known_dates else None,
+        'page_count': session.page_count,
+        'pages_parsed': session.page_count - len(skipped_pages),
+        'row_count': len(transactions_df),
+        'parse_seconds': parse_seconds,
+        'transactions_df': transactions_df,
+    }
+
+
+def _stream_session(parser, session, user_id: int, progress=None) -> dict:
+    """Parses and saves a statement chunk by chunk, so neither the page tables nor the
+    transactions of the whole statement are held in memory. Each committed batch updates the
+    statement's checkpoint; after an interruption the next attempt resumes after the last
+    committed page."""
+    known = _known_statement(session, user_id)
+    if known:
+        return known
+
+    start = time.perf_counter()
+    _report(progress, 'identifying', 0.15, 'Identifying the bank and statement format')
+    bank_name, bank_parser, account_number, skipped_pages, skipped_span = _select_pages(parser, session, user_id)
+    checkpoint = load_ingestion_checkpoint(user_id, session.content_hash)
+    if checkpoint:
+        print(f"Resuming ingestion from page {checkpoint['next_page'] + 1}.")
+        session.page_selection = {i for i in session.statement_pages() if i >= checkpoint['next_page']}
+
+    chunks = bank_parser.iter_transactions(session, STREAM_PAGES_PER_CHUNK)
+    if progress is not None:
+        chunks = _reporting_chunks(chunks, progress, session.page_count)
+    totals = save_transaction_stream(chunks, user_id, account_number, bank_name, session.content_hash,
+                                     checkpoint, STREAM_BATCH_ROWS)
+    known_dates = [date for date in (totals['start_date'], totals['end_date']) if date is not None]
+    known_dates += [date.to_pydatetime() for date in skipped_span]
+    print(f"PDF extraction stats: {session.stats}")
+
+    summary = {
+        'user_id': user_id,
+        'content_hash': session.content_hash,
+        'bank_name': bank_name,
+        'account_number': account_number,
+        'start_date': min(known_dates) if known_dates else None,
+        'end_date': max(known_dates) if known_dates else None,
+        'page_count': session.page_count,
+        'pages_parsed': session.page_count - len(skipped_pages),
+        'row_count': totals['row_count'],
+        'inserted_count': totals['inserted_count'],
+        'parse_seconds': time.perf_counter() - start,
+    }
+    record_statement_ingestion(**summary)
+    clear_ingestion_checkpoint(user_id, session.content_hash)
+    return {**summary, 'status': 'ingested', 'inserted': totals['inserted_count'],
+            'skipped': totals['row_count'] - totals['inserted_count']}
+
+
+def _reporting_chunks(chunks, progress, page_count: int):
+    """Passes chunks through, reporting progress each time the saver asks for the next one."""
+    _report(progress, 'parsing', 0.2, f"Parsing {page_count} pages")
+    for last_page, transactions_df in chunks:
+        yield last_page, transactions_df
+        _report(progress, 'parsing', 0.2 + 0.75 * (last_page + 1) / page_count,
+                f"Processed up to page {last_page + 1} of {page_count}")
+
+
+def _known_statement(session, user_id: int) -> dict | None:
+    known = find_statement_ingestion(user_id, session.content_hash)
+    if known:
+        print(f"Statement already ingested on {known['ingested_at']:%d %b %Y}, skipping parse.")
+        return {**known, 'status': 'already_ingested', 'inserted': 0, 'skipped': known['row_count']}
+    return None
+
+
+def _select_pages(parser, session, user_id: int) -> tuple:
+    """Identifies the statement and restricts the session to pages not already stored."""
+    bank_name, bank_parser = parser.get_parser(session)
+    account_number = bank_parser.extract_account_number(session)
+    ingested_ranges = get_ingested_date_ranges(user_id, bank_name, account_number)
+    skipped_pages, skipped_span = _find_covered_pages(session, bank_parser, ingested_ranges)
+    if skipped_pages:
+        print(f"Pages {min(skipped_pages) + 1}-{max(skipped_pages) + 1} are already stored, skipping them.")
+        session.page_selection = set(range(session.page_count)) - skipped_pages
+    return bank_name, bank_parser, account_number, skipped_pages, skipped_span
+
+
+def store_statement(parsed: dict) -> dict:
+    """Saves the transactions returned by parse_statement and records the statement in the ledger,
+    in one transaction. Raises if the save fails, leaving the statement unrecorded."""
+    summary = {key: parsed[key] for key in _LEDGER_FIELDS}
+    save_result = save_transactions_to_db(parsed['transactions_df'], parsed['user_id'],
+                                          parsed['account_number'], parsed['bank_name'], ledger=summary)
+    summary['inserted_count'] = save_result['inserted']
+    return {**summary, 'status': 'ingested', 'inserted': save_result['inserted'], 'skipped': save_result['skipped']}
+
+
+def _find_covered_pages(session, bank_parser, ingested_ranges: list[tuple]) -> tuple[set, tuple]:
+    """Returns the pages whose transactions all fall strictly inside one ingested date range,
+    plus the (first, last) date of that run of pages.
+
+    Transactions in a statement are chronological, so such pages form one contiguous run
+    which is found by binary search, probing O(log n) page tables. Pages on a boundary day
+    are always parsed, the fingerprint deduplication drops the rows already stored.
+    """
+    if not ingested_ranges or session.page_count < 3:
+        return set(), ()
+
+    probes = {}
+
+    def probe(page_index):
+        if page_index not in probes:
+            table = session.page_tables([page_index])[0]
+            date_range = bank_parser.page_date_range(session, table)
+            if date_range is None:
+                raise _UnprobeablePage(page_index)
+            probes[page_index] = (min(date_range), max(date_range))
+        return probes[page_index]
+
+    try:
+        # Transaction pages are bracketed by at most one cover/summary page on each side.
+        first_page = 0 if _has_dates(probe, 0) else 1
+        last_page = session.page_count - 1 if _has_dates(probe, session.page_count - 1) else session.page_count - 2
+        pages = list(range(first_page, last_page + 1))
+        if probe(pages[0])[0] > probe(pages[-1])[0]:
+            pages.reverse()
+        statement_start, statement_end = probe(pages[0])[0], probe(pages[-1])[1]
+
+        overlap = lambda r: min(r[1], statement_end) - max(r[0], statement_start)
+        range_start, range_end = max(ingested_ranges, key=overlap)
+        if overlap((range_start, range_end)) <= pd.Timedelta(0):
+            return set(), ()
+
+        lo = _first_true(len(pages), lambda k: probe(pages[k])[0] > range_start)
+        hi = _first_true(len(pages), lambda k: probe(pages[k])[1] >= range_end) - 1
+    except _UnprobeablePage:
+        return set(), ()
+
+    if lo > hi:
+        return set(), ()
+    covered = pages[lo:hi + 1]
+    return set(covered), (probe(covered[0])[0], probe(covered[-1])[1])
+
+
+def _has_dates(probe, page_index) -> bool:
+    try:
+        probe(page_index)
+        return True
+    except _UnprobeablePage:
+        return False
+
+
+def _first_true(count: int, predicate) -> int:
+    """Smallest k in [0, count) with predicate(k) true for a monotone predicate, count if none."""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if predicate(mid):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
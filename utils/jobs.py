@@ -0,0 +1,363 @@
+"""Background processing of uploaded statements.
+
+Uploads are stored as rows of the ingestion_jobs table and return at once. A dispatcher
+thread in the app process hands queued jobs to a pool of worker processes, each of which
+runs ingest_statement and writes its stage and progress back to the job row, where the
+Upload page polls it. Cancelling a running job is cooperative: the worker checks the flag
+whenever it reports progress. Passwords are held only in this process's memory, so jobs
+interrupted by a server restart have to be retried with the password. A job's PDF is dropped
+once its transactions are saved, and finished jobs are deleted after JOB_RETENTION_DAYS.
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from .database import SessionLocal, IngestionJobs
+
+JOB_WORKERS = int(os.environ.get('INGEST_JOB_WORKERS', min(os.cpu_count() or 1, 4)))
+# How often the dispatcher looks for queued jobs when it is not woken up by a new upload.
+JOB_POLL_SECONDS = float(os.environ.get('INGEST_JOB_POLL_SECONDS', 5))
+# Attempts a job gets when its worker process dies, e.g. killed for running out of memory.
+JOB_MAX_ATTEMPTS = int(os.environ.get('INGEST_JOB_MAX_ATTEMPTS', 3))
+# Finished jobs are deleted this long after they finish. Only failed and cancelled jobs keep their
+# PDF until then, for a retry; a done job's PDF is dropped as soon as it is saved.
+JOB_RETENTION_DAYS = float(os.environ.get('INGEST_JOB_RETENTION_DAYS', 7))
+JOB_PRUNE_INTERVAL_SECONDS = 3600
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_job_runner = None
+_job_runner_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def get_job_runner():
+    global _job_runner
+    with _job_runner_lock:
+        if _job_runner is None:
+            _job_runner = JobRunner()
+            _job_runner.start()
+        return _job_runner
+
+
+def enqueue_job(user_id: int, file_name: str, file_bytes: bytes, password: str | None) -> int:
+    db = SessionLocal()
+    try:
+        job = IngestionJobs(user_id=user_id, file_name=file_name, file_bytes=file_bytes, status='queued',
+                            stage='queued', progress=0.0, message='Waiting for a worker', attempts=0,
+                            cancel_requested=False, created_at=datetime.now())
+        db.add(job)
+        db.commit()
+        job_id = job.id
+    finally:
+        db.close()
+    get_job_runner().submit(job_id, password)
+    return job_id
+
+
+def list_jobs(user_id: int, limit: int = 20) -> list[dict]:
+    """The user's most recent jobs, newest first, without the PDF bytes."""
+    columns = [column for column in IngestionJobs.__table__.columns if column.name != 'file_bytes']
+    db = SessionLocal()
+    try:
+        rows = db.query(*columns).filter(IngestionJobs.user_id == user_id).order_by(
+            IngestionJobs.id.desc()).limit(limit).all()
+    finally:
+        db.close()
+    jobs = [dict(row._mapping) for row in rows]
+    for job in jobs:
+        job['result'] = json.loads(job['result']) if job['result'] else None
+    return jobs
+
+
+def cancel_job(job_id: int, user_id: int) -> bool:
+    """Cancels a queued job at once and asks a running one to stop. Returns False if the job is not active."""
+    db = SessionLocal()
+    try:
+        job = db.query(IngestionJobs).filter_by(id=job_id, user_id=user_id).first()
+        if job is None or job.status not in ACTIVE_STATUSES:
+            return False
+        if job.status == 'queued':
+            job.status, job.stage, job.message, job.finished_at = 'cancelled', 'cancelled', 'Cancelled', datetime.now()
+        else:
+            job.cancel_requested = True
+            job.message = 'Cancelling...'
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def retry_job(job_id: int, user_id: int, password: str | None = None) -> bool:
+    """Queues a failed or cancelled job again, with a new password if one is given."""
+    db = SessionLocal()
+    try:
+        job = db.query(IngestionJobs).filter_by(id=job_id, user_id=user_id).first()
+        if job is None or job.status not in ('failed', 'cancelled'):
+            return False
+        job.status, job.stage, job.progress, job.message = 'queued', 'queued', 0.0, 'Waiting for a worker'
+        job.error, job.result, job.cancel_requested = None, None, False
+        job.started_at, job.finished_at = None, None
+        db.commit()
+    finally:
+        db.close()
+    get_job_runner().submit(job_id, password)
+    return True
+
+
+def has_job_password(job_id: int) -> bool:
+    """Whether a retry of the job can reuse the password it was uploaded with."""
+    runner = _job_runner
+    return runner is not None and runner.has_password(job_id)
+
+
+class JobRunner:
+    """Feeds queued jobs to JOB_WORKERS worker processes, oldest first."""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._passwords = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pruned_at = None
+        self._executor = self._new_executor()
+        self._thread = threading.Thread(target=self._loop, name='ingestion-jobs', daemon=True)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Spawned, not forked: the app process has many threads whose locks a fork could copy mid-use.
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker)
+
+    def _replace_broken_executor(self, broken: ProcessPoolExecutor):
+        """A worker that dies breaks the whole pool, every later submit fails. Starts a new one."""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            print('An ingestion worker process died, restarting the worker pool.')
+            self._executor = self._new_executor()
+        broken.shutdown(wait=False)
+
+    def start(self):
+        _fail_interrupted_jobs()
+        self._thread.start()
+
+    def submit(self, job_id: int, password: str | None):
+        with self._lock:
+            if password is not None:
+                self._passwords[job_id] = password
+        self._wakeup.set()
+
+    def has_password(self, job_id: int) -> bool:
+        with self._lock:
+            return job_id in self._passwords
+
+    def _loop(self):
+        while True:
+            self._wakeup.wait(JOB_POLL_SECONDS)
+            self._wakeup.clear()
+            try:
+                if self._pruned_at is None or time.monotonic() - self._pruned_at > JOB_PRUNE_INTERVAL_SECONDS:
+                    self._pruned_at = time.monotonic()
+                    for job_id in _prune_finished_jobs():
+                        with self._lock:
+                            self._passwords.pop(job_id, None)
+                while True:
+                    with self._lock:
+                        running = set(self._running)
+                    if len(running) >= self.workers:
+                        break
+                    job_id = _claim_next_job(exclude=running)
+                    if job_id is None:
+                        break
+                    with self._lock:
+                        self._running.add(job_id)
+                        password = self._passwords.get(job_id)
+                        executor = self._executor
+                    try:
+                        future = executor.submit(_run_job, job_id, password)
+                    except BrokenProcessPool:
+                        self._replace_broken_executor(executor)
+                        _requeue_job(job_id)
+                        with self._lock:
+                            self._running.discard(job_id)
+                        continue
+                    except Exception as e:
+                        with self._lock:
+                            self._running.discard(job_id)
+                        _finish_job(job_id, 'failed', error=f"Could not start a worker: {e}")
+                        raise
+                    future.add_done_callback(
+                        lambda done, job_id=job_id, executor=executor: self._job_finished(job_id, executor, done))
+            except Exception as e:
+                print(f"Ingestion job dispatcher error: {e}")
+
+    def _job_finished(self, job_id: int, executor: ProcessPoolExecutor, future):
+        error = future.exception()
+        requeued = False
+        if isinstance(error, BrokenProcessPool):
+            self._replace_broken_executor(executor)
+            # The pool cannot tell which job killed its worker, so every job it was running is
+            # retried, up to JOB_MAX_ATTEMPTS attempts.
+            requeued = _requeue_job(job_id, max_attempts=JOB_MAX_ATTEMPTS)
+        with self._lock:
+            self._running.discard(job_id)
+            status = future.result() if error is None else 'failed'
+            # A failed or cancelled job keeps its password so it can be retried without asking again.
+            if status == 'done':
+                self._passwords.pop(job_id, None)
+        if error is not None and not requeued:
+            _finish_job(job_id, 'failed', error=f"The worker process stopped: {error}")
+        self._wakeup.set()
+
+
+def _fail_interrupted_jobs():
+    """Jobs left running by a previous server process lost their worker and their password."""
+    db = SessionLocal()
+    try:
+        db.query(IngestionJobs).filter(IngestionJobs.status == 'running').update(
+            {IngestionJobs.status: 'failed', IngestionJobs.stage: 'failed', IngestionJobs.finished_at: datetime.now(),
+             IngestionJobs.error: 'Interrupted by a server restart, retry it with the password.'},
+            synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _prune_finished_jobs(retention_days: float = JOB_RETENTION_DAYS) -> list[int]:
+    """Deletes jobs that finished more than retention_days ago. Returns their ids."""
+    db = SessionLocal()
+    try:
+        expired = db.query(IngestionJobs.id).filter(
+            IngestionJobs.status.notin_(ACTIVE_STATUSES),
+            IngestionJobs.finished_at < datetime.now() - timedelta(days=retention_days))
+        job_ids = [row.id for row in expired]
+        if job_ids:
+            db.query(IngestionJobs).filter(IngestionJobs.id.in_(job_ids)).delete(synchronize_session=False)
+            db.commit()
+            print(f"Deleted {len(job_ids)} ingestion jobs finished more than {retention_days:g} days ago.")
+        return job_ids
+    finally:
+        db.close()
+
+
+def _requeue_job(job_id: int, max_attempts: int | None = None) -> bool:
+    """Puts a job claimed by a worker that never finished it back in the queue, unless it has
+    had max_attempts already. Returns whether it was requeued."""
+    db = SessionLocal()
+    try:
+        query = db.query(IngestionJobs).filter(IngestionJobs.id == job_id, IngestionJobs.status == 'running')
+        if max_attempts is not None:
+            query = query.filter(IngestionJobs.attempts < max_attempts)
+        requeued = query.update(
+            {IngestionJobs.status: 'queued', IngestionJobs.stage: 'queued', IngestionJobs.progress: 0.0,
+             IngestionJobs.message: 'Waiting for a worker'},
+            synchronize_session=False)
+        db.commit()
+        return bool(requeued)
+    finally:
+        db.close()
+
+
+def _claim_next_job(exclude) -> int | None:
+    db = SessionLocal()
+    try:
+        job = db.query(IngestionJobs.id).filter(IngestionJobs.status == 'queued', IngestionJobs.id.notin_(exclude)).order_by(
+            IngestionJobs.id).first()
+        if job is None:
+            return None
+        # Only claimed if it is still queued, it may have been cancelled meanwhile.
+        claimed = db.query(IngestionJobs).filter(IngestionJobs.id == job.id, IngestionJobs.status == 'queued').update(
+            {IngestionJobs.status: 'running', IngestionJobs.started_at: datetime.now(),
+             IngestionJobs.attempts: IngestionJobs.attempts + 1, IngestionJobs.message: 'Starting'},
+            synchronize_session=False)
+        db.commit()
+        return job.id if claimed else None
+    finally:
+        db.close()
+
+
+def _init_worker():
+    # The PDF stack is imported here, in the workers, so the Upload page does not load it.
+    from . import table_extraction
+    from .ocr import get_ocr_engine
+
+    # Jobs already run in parallel, so each statement is extracted serially.
+    table_extraction.TABLE_EXTRACTION_WORKERS = 1
+    get_ocr_engine().workers = 1
+
+
+def _run_job(job_id: int, password: str | None) -> str:
+    """Runs one job in a worker process and records its outcome. Returns the final status."""
+    import pikepdf
+    from .ingestion import ingest_statement
+
+    db = SessionLocal()
+    try:
+        user_id, file_bytes = db.query(IngestionJobs.user_id, IngestionJobs.file_bytes).filter(
+            IngestionJobs.id == job_id).one()
+    finally:
+        db.close()
+
+    def progress(stage: str, fraction: float, message: str = ''):
+        if _update_progress(job_id, stage, fraction, message):
+            raise JobCancelled()
+
+    try:
+        result = ingest_statement(BytesIO(file_bytes), password, user_id, progress=progress)
+    except JobCancelled:
+        _finish_job(job_id, 'cancelled', message='Cancelled')
+        return 'cancelled'
+    except pikepdf.PasswordError:
+        _finish_job(job_id, 'failed', error='The PDF password is missing or incorrect.')
+        return 'failed'
+    except (ValueError, NotImplementedError) as e:
+        _finish_job(job_id, 'failed', error=str(e))
+        return 'failed'
+    except Exception as e:
+        print(traceback.format_exc())
+        _finish_job(job_id, 'failed', error=f"Unexpected error: {type(e).__name__}: {e}")
+        return 'failed'
+
+    summary = {key: value for key, value in result.items() if key != 'transactions_df'}
+    _finish_job(job_id, 'done', message='Done', result=json.dumps(summary, default=str))
+    return 'done'
+
+
+def _update_progress(job_id: int, stage: str, fraction: float, message: str) -> bool:
+    """Records progress and returns whether the job was asked to cancel."""
+    db = SessionLocal()
+    try:
+        db.query(IngestionJobs).filter(IngestionJobs.id == job_id).update(
+            {IngestionJobs.stage: stage, IngestionJobs.progress: fraction, IngestionJobs.message: message},
+            synchronize_session=False)
+        db.commit()
+        return bool(db.query(IngestionJobs.cancel_requested).filter(IngestionJobs.id == job_id).scalar())
+    finally:
+        db.close()
+
+
+def _finish_job(job_id: int, status: str, message: str | None = None, error: str | None = None, result: str | None = None):
+    db = SessionLocal()
+    try:
+        db.query(IngestionJobs).filter(IngestionJobs.id == job_id).update(
+            {IngestionJobs.status: status, IngestionJobs.stage: status, IngestionJobs.finished_at: datetime.now(),
+             IngestionJobs.progress: 1.0 if status == 'done' else IngestionJobs.progress,
+             IngestionJobs.message: message if message is not None else IngestionJobs.message,
+             IngestionJobs.error: error, IngestionJobs.result: result,
+             # Only a job that can still be retried needs its PDF. The column is NOT NULL in existing databases.
+             IngestionJobs.file_bytes: b'' if status == 'done' else IngestionJobs.file_bytes},
+            synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
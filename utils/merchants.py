@@ -0,0 +1,97 @@
+"""Merchant names from transaction narrations, extracted once when transactions are saved.
+
+NARRATION_PATTERNS are tried in order with pandas' vectorized str.extract, each on the
+narrations no earlier pattern matched, and only once per distinct narration. They cover the
+UPI, NEFT, IMPS, ATM, POS and ACH layouts of SBI, Union Bank, HDFC and ICICI statements.
+Narrations none of them match keep their first 40 characters, as the Dashboard used to show.
+The extracted name is then cleaned (punctuation, legal suffixes such as PVT LTD, trailing city)
+and mapped through MERCHANT_ALIASES, so the spellings one merchant is printed under group
+together: BUNDL TECHNOLOGIES and SWIGGY LIMITED both become SWIGGY.
+"""
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+ATM_MERCHANT = 'ATM CASH'
+
+# (channel, pattern). A pattern's 'merchant' group is the name, a pattern without one names the
+# channel's fixed merchant. Matched against the upper-cased narration with re.search semantics.
+NARRATION_PATTERNS = [
+    ('ATM', re.compile(r'^(?:ATM ?WDL|ATW-|NWD-|EAW-|ATM/CASH|ATM CASH|CASH WDL)')),
+    # SBI: UPI/DR/<ref>/<name>/<bank>/<vpa>/<note>, also after 'TO TRANSFER-'.
+    ('UPI', re.compile(r'UPI/(?:DR|CR)/\d+/(?P<merchant>[^/]+)')),
+    # Union Bank: UPIAR/<ref>/DR/<name>/<bank>/<vpa>, UPIAB for credits.
+    ('UPI', re.compile(r'UPIA[BR]/\d+/(?:DR|CR)/(?P<merchant>[^/]+)')),
+    # HDFC: UPI-<name>-<vpa>-<ifsc>-<ref>-<note>.
+    ('UPI', re.compile(r'UPI-(?P<merchant>[^-]+)-[^-]*@')),
+    # ICICI: UPI/<ref>/<note>/<vpa>/<bank>, the vpa's handle is the only name printed.
+    ('UPI', re.compile(r'UPI/\d+/[^/]*/(?P<merchant>[^/@]+)@')),
+    # SBI: NEFT*<ifsc>*<ref>*<name>*, HDFC: NEFT CR-<ifsc>-<name>-..., others NEFT/<ref>/<name>/...
+    ('NEFT', re.compile(r'NEFT\*[A-Z]{4}0\w{6}\*\w+\*(?P<merchant>[^*]+)')),
+    ('NEFT', re.compile(r'NEFT (?:CR|DR)-[A-Z]{4}0\w{6}-(?P<merchant>[^-]+)')),
+    ('NEFT', re.compile(r'NEFT[/-]\w+[/-](?P<merchant>[^/-]+)')),
+    # SBI: IMPS/P2A/<ref>/<name>/..., ICICI: MMT/IMPS/<ref>/<remark>/<name>/<bank>, HDFC: IMPS-<ref>-<name>-...
+    ('IMPS', re.compile(r'IMPS/P2[AM]/\d+/(?P<merchant>[^/]+)')),
+    ('IMPS', re.compile(r'MMT/IMPS/\d+/[^/]*/(?P<merchant>[^/]+)')),
+    ('IMPS', re.compile(r'IMPS-\d+-(?P<merchant>[^-]+)')),
+    # POS <masked card> <merchant> [<city>].
+    ('POS', re.compile(r'POS\s+\S*\d\S*\s+(?P<merchant>.+)')),
+    ('ACH', re.compile(r'N?ACH\s*[DC]-\s*(?P<merchant>.+?)-\w*\d')),
+]
+
+# Cleaned spellings to the merchant they belong to. A key also matches names it begins with as
+# whole words, so AMAZON PAY covers AMAZON PAY I, the POS truncation.
+MERCHANT_ALIASES = {
+    'SWIGGY': 'SWIGGY', 'BUNDL TECHNOLOGIES': 'SWIGGY', 'SWIGGY INSTAMART': 'SWIGGY',
+    'ZOMATO': 'ZOMATO', 'ZOMATO MEDIA': 'ZOMATO',
+    'DOMINOS': 'DOMINOS', 'JUBILANT FOODWORKS': 'DOMINOS',
+    'TATA STARBUCKS': 'STARBUCKS', 'HARDCASTLE RESTAURANTS': 'MCDONALDS', 'SUNSHINE TEAHOUSE': 'CHAAYOS',
+    'AMAZON': 'AMAZON', 'AMAZON PAY': 'AMAZON', 'AMAZON SELLER SERVICES': 'AMAZON', 'AMZN': 'AMAZON',
+    'FLIPKART': 'FLIPKART', 'FLIPKART INTERNET': 'FLIPKART', 'MYNTRA DESIGNS': 'MYNTRA',
+    'SUPERMARKET GROCERY SUPPLIES': 'BIGBASKET', 'AVENUE SUPERMARTS': 'DMART', 'RELIANCE SMART': 'RELIANCE RETAIL',
+    'UBER': 'UBER', 'UBER INDIA SYSTEMS': 'UBER', 'ANI TECHNOLOGIES': 'OLA', 'OLACABS': 'OLA',
+    'IRCTC': 'IRCTC', 'ROPPEN TRANSPORTATION': 'RAPIDO', 'INTERGLOBE AVIATION': 'INDIGO', 'MMT': 'MAKEMYTRIP',
+    'JIO PREPAID': 'JIO', 'RELIANCE JIO INFOCOMM': 'JIO', 'AIRTEL': 'AIRTEL', 'BHARTI AIRTEL': 'AIRTEL',
+    'TATA POWER': 'TATA POWER', 'ATRIA CONVERGENCE': 'ACT FIBERNET',
+    'NETFLIX': 'NETFLIX', 'NETFLIX ENTERTAINMENT': 'NETFLIX', 'BIGTREE ENTERTAINMENT': 'BOOKMYSHOW',
+    'SPOTIFY': 'SPOTIFY', 'NOVI DIGITAL': 'HOTSTAR', 'PVR INOX': 'PVR CINEMAS',
+    'APOLLO HEALTHCO': 'APOLLO PHARMACY', 'AXELIA SOLUTIONS': 'PHARMEASY', 'TATA 1MG': '1MG',
+    'CUREFIT HEALTHCARE': 'CULT FIT', 'OPTIVAL HEALTH': 'MEDPLUS',
+}
+
+_NON_NAME_RE = re.compile(r'[^A-Z0-9& ]+')
+_SUFFIX_RE = re.compile(r'(?:\s+(?:PVT|PRIVATE|LTD|LIMITED|LLP|INDIA|IN|CO|\d+))+$')
+_CITY_RE = re.compile(r'\s+(?:BANGALORE|BENGALURU|MUMBAI|DELHI|NEW DELHI|GURGAON|GURUGRAM|NOIDA|PUNE|CHENNAI|'
+                      r'HYDERABAD|KOLKATA|AHMEDABAD|JAIPUR|LUCKNOW|KOCHI)$')
+_ALIAS_RE = re.compile(r'^(?:' + '|'.join(sorted(map(re.escape, MERCHANT_ALIASES), key=len, reverse=True)) + r')(?= |$)')
+
+
+@lru_cache(maxsize=100_000)
+def canonical_merchant(name: str) -> str:
+    """The cleaned, alias-resolved form of an extracted merchant name."""
+    cleaned = ' '.join(_NON_NAME_RE.sub(' ', name.upper()).split())
+    cleaned = _SUFFIX_RE.sub('', _CITY_RE.sub('', cleaned)) or cleaned
+    alias = _ALIAS_RE.match(cleaned)
+    return MERCHANT_ALIASES[alias.group(0)] if alias else cleaned
+
+
+def extract_merchants(details: pd.Series) -> pd.Series:
+    """Merchant per narration, aligned with details. A missing narration has no merchant (None)."""
+    present = details.notna()
+    details, index = details[present].astype(str), details.index
+    narrations = pd.Series(details.unique())
+    upper = narrations.str.upper().str.strip()
+    names = pd.Series(None, index=narrations.index, dtype=object)
+    for channel, pattern in NARRATION_PATTERNS:
+        pending = names.isna()
+        if not pending.any():
+            break
+        if 'merchant' in pattern.groupindex:
+            names[pending] = upper[pending].str.extract(pattern, expand=False).str.strip()
+        else:
+            names[pending & upper.str.contains(pattern)] = ATM_MERCHANT
+    names = names.where(names.notna() & (names != ''), upper.str[:40])
+    merchants = [canonical_merchant(name) for name in names.tolist()]
+    merchants = details.map(pd.Series(merchants, index=narrations.to_numpy(), dtype=object))
+    return merchants.reindex(index).astype(object).where(present, None)
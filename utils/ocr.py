@@ -0,0 +1,193 @@
+import json
+import os
+import platform
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import pdfplumber
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .database import SessionLocal, OcrResults
+from .tracing import span
+
+OCR_DPI = int(os.environ.get('OCR_DPI', 200))
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', min(os.cpu_count() or 1, 4)))
+# Seconds tesseract may spend on one page before it is killed and the page is skipped.
+OCR_PAGE_TIMEOUT = float(os.environ.get('OCR_PAGE_TIMEOUT', 60))
+OCR_PARALLEL_MIN_PAGES = int(os.environ.get('OCR_PARALLEL_MIN_PAGES', 4))
+
+FULL_PAGE = (0.0, 0.0, 1.0, 1.0)
+_WINDOWS_TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+_worker_pdf = None
+_ocr_engine = None
+_tesseract_configured = False
+
+
+def configure_tesseract(tesseract_cmd: str | None = None):
+    """Uses tesseract_cmd, else $TESSERACT_CMD, else the default Windows install if present, else PATH."""
+    global _tesseract_configured
+    import pytesseract
+
+    tesseract_cmd = tesseract_cmd or os.environ.get('TESSERACT_CMD')
+    if not tesseract_cmd and platform.system() == 'Windows' and os.path.exists(_WINDOWS_TESSERACT_CMD):
+        tesseract_cmd = _WINDOWS_TESSERACT_CMD
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    _tesseract_configured = True
+
+
+def _pytesseract():
+    # Imported and configured on the first OCR of each process, most statements never need it.
+    import pytesseract
+
+    if not _tesseract_configured:
+        configure_tesseract()
+    return pytesseract
+
+
+def get_ocr_engine():
+    global _ocr_engine
+    if _ocr_engine is None:
+        _ocr_engine = OcrEngine()
+    return _ocr_engine
+
+
+class OcrEngine:
+    """Rasterizes PDF pages and runs tesseract on them, serially for a few pages and in a
+    process pool otherwise. Results are cached in the ocr_results table keyed by the PDF's
+    content hash, page, region and DPI, so a statement is never OCRed twice."""
+
+    def __init__(self, dpi: int = OCR_DPI, workers: int = OCR_WORKERS, page_timeout: float = OCR_PAGE_TIMEOUT,
+                 use_cache: bool = True):
+        self.dpi = dpi
+        self.workers = workers
+        self.page_timeout = page_timeout
+        self.use_cache = use_cache
+
+    def ocr_region(self, session, page_index: int, region: tuple = FULL_PAGE) -> str:
+        return self.ocr_pages(session, [page_index], region)[page_index]
+
+    def ocr_pages(self, session, page_indices, region: tuple = FULL_PAGE) -> dict:
+        """Returns {page_index: text} for the given region of each page."""
+        return self._run(session, 'text', list(page_indices), region)
+
+    def ocr_tables(self, session, page_indices) -> dict:
+        """Returns {page_index: rows} for image-only pages, rows being lists of cell strings
+        rebuilt from tesseract word positions, or None when no words were found."""
+        return self._run(session, 'table', list(page_indices), FULL_PAGE)
+
+    def _run(self, session, kind: str, page_indices: list[int], region: tuple) -> dict:
+        region_key = ','.join(f'{value:g}' for value in region)
+        results = self._load_cached(session.content_hash, kind, page_indices, region_key) if self.use_cache else {}
+        missing = [i for i in page_indices if i not in results]
+        if missing:
+            tasks = [(kind, i, region, self.dpi, self.page_timeout) for i in missing]
+            with span('ocr', pages=len(missing)):
+                if self.workers <= 1 or len(missing) < OCR_PARALLEL_MIN_PAGES:
+                    outputs = [_ocr_task(session.pdf, *task) for task in tasks]
+                else:
+                    workers = min(self.workers, len(missing))
+                    print(f"Running OCR on {len(missing)} pages with {workers} worker processes...")
+                    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                             initargs=(session.pdf_bytes,)) as executor:
+                        outputs = list(executor.map(_pool_ocr_task, tasks))
+
+            completed = {i: result for i, (finished, result) in zip(missing, outputs) if finished}
+            if self.use_cache:
+                self._store(session.content_hash, kind, completed, region_key)
+            results.update(completed)
+            for i in set(missing) - set(completed):
+                results[i] = None if kind == 'table' else ''
+        return {i: results[i] for i in page_indices}
+
+    def _load_cached(self, content_hash: str, kind: str, page_indices: list[int], region_key: str) -> dict:
+        db = SessionLocal()
+        try:
+            rows = db.query(OcrResults).filter(
+                OcrResults.content_hash == content_hash,
+                OcrResults.kind == kind,
+                OcrResults.region == region_key,
+                OcrResults.dpi == self.dpi,
+                OcrResults.page.in_(page_indices),
+            ).all()
+            return {row.page: json.loads(row.result) if kind == 'table' else row.result for row in rows}
+        finally:
+            db.close()
+
+    def _store(self, content_hash: str, kind: str, results: dict, region_key: str):
+        if not results:
+            return
+        records = [
+            {'content_hash': content_hash, 'kind': kind, 'page': page, 'region': region_key, 'dpi': self.dpi,
+             'result': json.dumps(result) if kind == 'table' else result}
+            for page, result in results.items()
+        ]
+        db = SessionLocal()
+        try:
+            db.execute(sqlite_insert(OcrResults).on_conflict_do_nothing(), records)
+            db.commit()
+        except Exception as e:
+            print(f"Could not cache OCR results: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+
+def _init_worker(pdf_bytes: bytes):
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(BytesIO(pdf_bytes))
+
+
+def _pool_ocr_task(task: tuple):
+    return _ocr_task(_worker_pdf, *task)
+
+
+def _ocr_task(pdf, kind: str, page_index: int, region: tuple, dpi: int, timeout: float) -> tuple:
+    """Returns (finished, result); finished is False when tesseract hit the page timeout."""
+    pytesseract = _pytesseract()
+    image = _rasterize(pdf.pages[page_index], region, dpi)
+    try:
+        if kind == 'table':
+            words = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT, timeout=timeout)
+            return True, _words_to_rows(words, dpi)
+        return True, pytesseract.image_to_string(image, timeout=timeout)
+    except RuntimeError as e:
+        # pytesseract raises RuntimeError when it kills tesseract after `timeout` seconds.
+        print(f"OCR of page {page_index + 1} stopped: {e}")
+        return False, None
+
+
+def _rasterize(page, region: tuple, dpi: int):
+    image = page.to_image(resolution=dpi).original
+    width, height = image.size
+    x0, y0, x1, y1 = region
+    if region != FULL_PAGE:
+        image = image.crop((width * x0, height * y0, width * x1, height * y1))
+    return image.convert('L')
+
+
+def _words_to_rows(words: dict, dpi: int) -> list | None:
+    """Groups tesseract words into text lines, then splits each line into cells wherever the
+    horizontal gap between neighbouring words is wider than about a quarter inch."""
+    lines = {}
+    for i, text in enumerate(words['text']):
+        if not text.strip():
+            continue
+        key = (words['block_num'][i], words['par_num'][i], words['line_num'][i])
+        lines.setdefault(key, []).append((words['left'][i], words['width'][i], words['top'][i], text))
+    if not lines:
+        return None
+
+    cell_gap = dpi * 0.25
+    rows = []
+    for line_words in sorted(lines.values(), key=lambda line: min(word[2] for word in line)):
+        line_words.sort()
+        cells = [[line_words[0][3]]]
+        for (prev_left, prev_width, _, _), (left, _, _, text) in zip(line_words, line_words[1:]):
+            if left - (prev_left + prev_width) > cell_gap:
+                cells.append([text])
+            else:
+                cells[-1].append(text)
+        rows.append([' '.join(cell) for cell in cells])
+    return rows
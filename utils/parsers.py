@@ -1,105 +1,152 @@
+import numpy as np
 import pandas as pd
 import re
-import pytesseract
-from PIL import Image
 from datetime import datetime
-import fitz
+
+from .ocr import get_ocr_engine
+from .tracing import span
+
+STANDARD_COLUMNS = ['date', 'details', 'amount', 'type']
+TRANSACTION_TYPE = pd.CategoricalDtype(['Credit', 'Debit'])
 
 
 class UnionBankParser:
     """An expert parser for Union Bank of India statements."""
 
+    DATE_PATTERN = r'\d{2}-\d{2}-\d{4}'
+    DATE_FORMAT = '%d-%m-%Y'
+
     def _extract_account_number(self, page_text: str) -> str | None:
         match = re.search(r"Account Number\s*:\s*(\S+)", page_text)
         if match:
             return match.group(1)
         return None
 
-    def parse(self, pdf):
-        first_page_text = pdf.pages[0].extract_text()
-        account_number = self._extract_account_number(first_page_text)
+    def extract_account_number(self, session) -> str:
+        account_number = self._extract_account_number(session.page_text(0))
         if not account_number:
             raise ValueError('Unable to extract account number from the PDF')
+        return account_number
+
+    def page_date_range(self, session, table) -> tuple | None:
+        """(first, last) transaction date on one page's table, used to skip pages that are already stored."""
+        dates = [row[1] for row in table or [] if len(row) > 1 and row[1]]
+        return _date_range(dates, self.DATE_PATTERN, self.DATE_FORMAT)
+
+    def parse(self, session):
+        account_number = self.extract_account_number(session)
 
         all_transactions = []
-        for page in pdf.pages:
-            table = page.extract_table()
-            if table:
-                header_index = -1
-                for i, row in enumerate(table):
-                    row_string = "".join(filter(None, row))
-                    if "Date" in row_string and "Particulars" in row_string and "Balance" in row_string:
-                        header_index = i
-                        break
-                if header_index != -1:
-                    all_transactions.extend(table[header_index + 1:])
+        for table in session.page_tables(session.statement_pages()):
+            all_transactions.extend(self._table_rows(table))
 
         if not all_transactions:
             raise ValueError("No transaction rows could be found in the PDF.")
-
-        df = pd.DataFrame(all_transactions,
-                          columns=['SI', 'Date', 'Particulars', 'Chq Num', 'Withdrawal', 'Deposit', 'Balance'])
+        return {'account_number': account_number, 'transactions_df': self._normalize(all_transactions)}
+
+    def iter_transactions(self, session, pages_per_chunk: int = 32):
+        """Streaming parse: yields (last page index, transactions_df) for every chunk of pages."""
+        yield from _iter_table_chunks(session, self._table_rows, self._normalize, pages_per_chunk)
+
+    def _table_rows(self, table) -> list:
+        if table:
+            for i, row in enumerate(table):
+                row_string = "".join(filter(None, row))
+                if "Date" in row_string and "Particulars" in row_string and "Balance" in row_string:
+                    return table[i + 1:]
+        return []
+
+    def _normalize(self, rows: list) -> pd.DataFrame:
+        df = pd.DataFrame(rows, columns=['SI', 'Date', 'Particulars', 'Chq Num', 'Withdrawal', 'Deposit', 'Balance'])
         df.dropna(subset=['Date'], inplace=True)
-        df = df[df['Date'].str.contains(r'\d{2}-\d{2}-\d{4}', na=False)].copy()
-        df['Particulars'] = df['Particulars'].str.replace('\n', ' ', regex=False)
-        df.rename(columns={'Date': 'date', 'Particulars': 'details', 'Withdrawal': 'debit', 'Deposit': 'credit'},
-                  inplace=True)
-        df['debit'] = pd.to_numeric(df['debit'].str.replace(',', '', regex=False), errors='coerce')
-        df['credit'] = pd.to_numeric(df['credit'].str.replace(',', '', regex=False), errors='coerce')
-        df.fillna({'debit': 0, 'credit': 0}, inplace=True)
-        df['amount'] = df.apply(lambda row: row['credit'] if row['credit'] > 0 else row['debit'], axis=1)
-        df['type'] = df.apply(lambda row: 'Credit' if row['credit'] > 0 else 'Debit', axis=1)
-        df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y')
-        standardized_df = df[['date', 'details', 'amount', 'type']].copy()
-        return {'account_number': account_number, 'transactions_df': standardized_df}
+        df = df[df['Date'].str.contains(self.DATE_PATTERN, na=False)]
+        return normalize_transactions(
+            date=df['Date'], details=df['Particulars'].str.replace('\n', ' ', regex=False),
+            debit=df['Withdrawal'], credit=df['Deposit'], date_format=self.DATE_FORMAT)
 
 
 class SbiParser:
     """An expert parser for handling multiple State Bank of India (SBI) statement formats."""
 
-    def _identify_format(self, pdf) -> str:
-        page_text = pdf.pages[0].extract_text(x_tolerance=1, y_tolerance=3) or ""
+    STANDARD_DATE_PATTERN = r'\d{1,2} \w{3} \d{4}'
+    STANDARD_DATE_FORMAT = '%d %b %Y'
+    YONO_DATE_FORMAT = '%d-%m-%y'
+
+    def _identify_format(self, session) -> str:
+        if 'sbi_format' not in session.derived:
+            session.derived['sbi_format'] = self._detect_format(session)
+        return session.derived['sbi_format']
+
+    def _detect_format(self, session) -> str:
+        page_text = session.page_text(0, x_tolerance=1, y_tolerance=3)
         if "sbi.co.in" in page_text:
             return "yono"
         if "Ref No./Cheque No" in page_text:
             return "standard"
         try:
-            page_image = pdf.pages[0].to_image(resolution=200).original
-            width, height = page_image.size
-            header_image = page_image.crop((0, 0, width, height * 0.4))
-            ocr_text = pytesseract.image_to_string(header_image)
+            ocr_text = get_ocr_engine().ocr_region(session, 0, (0.0, 0.0, 1.0, 0.4))
             if "Relationship Summary" in ocr_text:
                 return "yono"
         except Exception as e:
             print(f"OCR for SBI format identification failed: {e}")
         return "standard"
 
-    def _parse_standard_format(self, pdf):
-        page_text = pdf.pages[0].extract_text()
+    def _standard_account_number(self, session) -> str:
+        page_text = session.page_text(0)
         match = re.search(r"Account Number\s*.*?(\d{11})", page_text)
         account_number = match.group(1) if match else None
         if not account_number:
             raise ValueError("Could not extract account number from standard SBI statement.")
+        return account_number
+
+    def _yono_account_number(self, session) -> str:
+        account_number = None
+        for page_index in range(1, min(3, session.page_count)):
+            page_text = session.page_text(page_index)
+            if page_text:
+                match = re.search(r"XXXXXXX(\d{4})", page_text)
+                if match:
+                    account_number = "XXXXXXX" + match.group(1)
+                    break
+        if not account_number:
+            raise ValueError("Could not extract account number from Yono statement.")
+        return account_number
+
+    def extract_account_number(self, session) -> str:
+        if self._identify_format(session) == 'yono':
+            return self._yono_account_number(session)
+        return self._standard_account_number(session)
+
+    def page_date_range(self, session, table) -> tuple | None:
+        # Yono statements are parsed as a whole (opening balance row, trailing summary row), never page by page.
+        if self._identify_format(session) == 'yono':
+            return None
+        dates = [str(row[0]).replace('\n', ' ').strip() for row in table or [] if row and row[0]]
+        return _date_range(dates, self.STANDARD_DATE_PATTERN, self.STANDARD_DATE_FORMAT)
+
+    def _parse_standard_format(self, session):
+        account_number = self._standard_account_number(session)
 
         all_transactions = []
-        for page in pdf.pages:
-            table = page.extract_table()
-            if table:
-                header_found = False
-                for row in table:
-                    if header_found:
-                        all_transactions.append(row)
-                        continue
-                    # A more robust check for the header row
-                    row_str = "".join(map(str, filter(None, row)))
-                    if "Date" in row_str and "Details" in row_str and "Balance" in row_str:
-                        header_found = True
+        for table in session.page_tables(session.statement_pages()):
+            all_transactions.extend(self._standard_table_rows(table))
 
         if not all_transactions:
             raise ValueError("Failed to extract any transaction rows from the standard SBI statement.")
-
+        return {"account_number": account_number, "transactions_df": self._normalize_standard(all_transactions)}
+
+    def _standard_table_rows(self, table) -> list:
+        if table:
+            for i, row in enumerate(table):
+                # A more robust check for the header row
+                row_str = "".join(map(str, filter(None, row)))
+                if "Date" in row_str and "Details" in row_str and "Balance" in row_str:
+                    return table[i + 1:]
+        return []
+
+    def _normalize_standard(self, rows: list) -> pd.DataFrame:
         # Create DataFrame without specifying columns first
-        df = pd.DataFrame(all_transactions)
+        df = pd.DataFrame(rows)
 
         # Dynamically assign column names based on the actual number of columns found
         if df.shape[1] == 6:
@@ -108,37 +155,16 @@ class SbiParser:
             raise ValueError(f"Unexpected number of columns ({df.shape[1]}) in SBI standard statement table.")
 
         df.dropna(subset=['Date'], inplace=True)
-        df['Date'] = df['Date'].str.replace('\n', ' ', regex=False).str.strip()
-        df['date'] = pd.to_datetime(df['Date'], format='%d %b %Y', errors='coerce')
-        df.dropna(subset=['date'], inplace=True)
-
-        df.rename(columns={'Details': 'details', 'Debit': 'debit', 'Credit': 'credit'}, inplace=True)
-        df['debit'] = pd.to_numeric(df['debit'].str.replace(',', '', regex=False), errors='coerce')
-        df['credit'] = pd.to_numeric(df['credit'].str.replace(',', '', regex=False), errors='coerce')
-        df.fillna({'debit': 0, 'credit': 0}, inplace=True)
-
-        df['amount'] = df.apply(lambda r: r['credit'] if r['credit'] > 0 else r['debit'], axis=1)
-        df['type'] = df.apply(lambda r: 'Credit' if r['credit'] > 0 else 'Debit', axis=1)
+        return normalize_transactions(
+            date=df['Date'].str.replace('\n', ' ', regex=False).str.strip(), details=df['Details'],
+            debit=df['Debit'], credit=df['Credit'], date_format=self.STANDARD_DATE_FORMAT, drop_invalid_dates=True)
 
-        return {"account_number": account_number, "transactions_df": df[['date', 'details', 'amount', 'type']]}
-
-    def _parse_yono_format(self, pdf):
-        account_number = None
-        for page in pdf.pages[1:3]:
-            page_text = page.extract_text()
-            if page_text:
-                match = re.search(r"XXXXXXX(\d{4})", page_text)
-                if match:
-                    account_number = "XXXXXXX" + match.group(1)
-                    break
-        if not account_number:
-            raise ValueError("Could not extract account number from Yono statement.")
+    def _parse_yono_format(self, session):
+        account_number = self._yono_account_number(session)
 
         all_transactions = []
-        for page in pdf.pages:
-            if page.page_number < 3: continue
-            # --- FIX: Call the method with () ---
-            table = page.extract_table()
+        # page_number is 1-based, the Yono transaction table starts on page 3.
+        for table in session.page_tables(range(2, session.page_count)):
             if table:
                 for row in table:
                     if row and row[0] and (
@@ -155,24 +181,70 @@ class SbiParser:
                           columns=["Date","Transaction Reference","None_col", "Ref.No./Chq.No.", "Credit", "Debit", "Balance"])
         df = df.iloc[:-1]
         df.dropna(subset=['Date'], inplace=True)
-        # --- FIX: Correct date format for Yono (yy not Y) ---
-        df['date'] = pd.to_datetime(df['Date'], format='%d-%m-%y')
-        # --- FIX: Add inplace=True to the rename operation ---
-        df.rename(columns={'Credit': 'credit', 'Debit': 'debit','Transaction Reference':"details"}, inplace=True)
-
-        df['credit'] = pd.to_numeric(df['credit'].astype(str).str.replace(',', '', regex=False), errors='coerce')
-        df['debit'] = pd.to_numeric(df['debit'].astype(str).str.replace(',', '', regex=False), errors='coerce')
-        df.fillna({'credit': 0, 'debit': 0}, inplace=True)
-
-        df['amount'] = df.apply(lambda x: x['credit'] if x['credit'] > 0 else x['debit'], axis=1)
-        df['type'] = df.apply(lambda x: 'Credit' if x['credit'] > 0 else 'Debit', axis=1)
-        return {'account_number': account_number, "transactions_df": df[['date', 'details', 'amount', 'type']]}
-
-    def parse(self, pdf):
-        statement_format = self._identify_format(pdf)
+        # Yono prints two-digit years.
+        transactions_df = normalize_transactions(
+            date=df['Date'], details=df['Transaction Reference'], debit=df['Debit'], credit=df['Credit'],
+            date_format=self.YONO_DATE_FORMAT)
+        return {'account_number': account_number, "transactions_df": transactions_df}
+
+    def parse(self, session):
+        statement_format = self._identify_format(session)
         if statement_format == 'yono':
-            return self._parse_yono_format(pdf)
+            return self._parse_yono_format(session)
         else:
-            return self._parse_standard_format(pdf)
-
-
+            return self._parse_standard_format(session)
+
+    def iter_transactions(self, session, pages_per_chunk: int = 32):
+        """Streaming parse: yields (last page index, transactions_df) for every chunk of pages.
+        Yono statements need the whole table (opening balance and summary rows), so they come as one chunk."""
+        if self._identify_format(session) == 'yono':
+            if session.statement_pages():
+                yield session.page_count - 1, self._parse_yono_format(session)['transactions_df']
+            return
+        yield from _iter_table_chunks(session, self._standard_table_rows, self._normalize_standard, pages_per_chunk)
+
+
+def normalize_transactions(date, details, debit, credit, date_format: str,
+                           drop_invalid_dates: bool = False) -> pd.DataFrame:
+    """Builds the standard date/details/amount/type frame from a statement's raw columns.
+
+    Parsers only locate the transaction rows and pass the raw cells here. Amounts have their
+    thousands separators stripped and missing values become 0; a row with a positive credit is
+    a Credit of that amount, anything else a Debit. Dates are parsed with the given explicit
+    format, and rows whose date does not parse are dropped with drop_invalid_dates, otherwise
+    they raise. All steps are columnar, so the cost stays flat per row on long statements.
+    """
+    with span('normalize', rows=len(date)):
+        dates = pd.to_datetime(date, format=date_format, errors='coerce' if drop_invalid_dates else 'raise')
+        debit = _to_amount(debit)
+        credit = _to_amount(credit)
+        is_credit = credit > 0
+
+        df = pd.DataFrame({
+            'date': dates.to_numpy(),
+            'details': details.to_numpy(),
+            'amount': np.where(is_credit, credit, debit),
+            'type': pd.Categorical.from_codes(np.where(is_credit, 0, 1), dtype=TRANSACTION_TYPE),
+        }, index=date.index)
+        if drop_invalid_dates:
+            df = df[df['date'].notna()]
+    return df
+
+
+def _iter_table_chunks(session, table_rows, normalize, pages_per_chunk: int):
+    """Runs a parser's per-table row finder and normalizer over the statement's pages a chunk at a time."""
+    for page_indices, tables in session.iter_page_tables(session.statement_pages(), pages_per_chunk):
+        rows = [row for table in tables for row in table_rows(table)]
+        transactions_df = normalize(rows) if rows else pd.DataFrame(columns=STANDARD_COLUMNS)
+        yield page_indices[-1], transactions_df
+
+
+def _to_amount(values: pd.Series) -> np.ndarray:
+    return pd.to_numeric(values.astype(str).str.replace(',', '', regex=False), errors='coerce').fillna(0).to_numpy()
+
+
+def _date_range(values: list[str], pattern: str, date_format: str) -> tuple | None:
+    dates = pd.to_datetime(pd.Series(values, dtype=object).str.extract(f'({pattern})')[0], format=date_format, errors='coerce').dropna()
+    if dates.empty:
+        return None
+    return dates.iloc[0], dates.iloc[-1]
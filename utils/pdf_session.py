@@ -0,0 +1,143 @@
+import hashlib
+from io import BytesIO
+
+import pdfplumber
+import pikepdf
+
+from .table_extraction import extract_page_tables, extract_tables_from_bytes
+from .tracing import span
+
+
+class PdfSession:
+    """One opened bank statement shared by every stage of the pipeline.
+
+    The PDF is decrypted once, in memory (unencrypted files are used as uploaded, without a
+    re-save), and each page's text and table are extracted at most once and cached, so bank
+    identification, format detection and the parsers never repeat the same pdfplumber work.
+    Nothing is written to disk. Image-only statements get their tables from OCR.
+    """
+
+    def __init__(self, file_stream, password=None):
+        self.file_stream = file_stream
+        self.password = password
+        self.pdf = None
+        self.pdf_bytes = None
+        self._content_hash = None
+        self.stats = {'text_extractions': 0, 'table_extractions': 0, 'cache_hits': 0}
+        # Values derived from the statement by parsers, e.g. the detected SBI format.
+        self.derived = {}
+        # Pages the parsers should read, None for all. Set by ingestion to skip pages already stored.
+        self.page_selection = None
+        self._text_cache = {}
+        self._table_cache = {}
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self.file_stream.seek(0)
+        raw_bytes = self.file_stream.read()
+        with span('decrypt', bytes=len(raw_bytes)) as stage:
+            with pikepdf.open(BytesIO(raw_bytes), password=self.password or '') as document:
+                stage.set(pages=len(document.pages))
+                if document.is_encrypted:
+                    decrypted = BytesIO()
+                    # A deterministic /ID keeps content_hash stable across uploads of the same file.
+                    document.save(decrypted, deterministic_id=True)
+                    raw_bytes = decrypted.getvalue()
+            self.pdf_bytes = raw_bytes
+            self.pdf = pdfplumber.open(BytesIO(self.pdf_bytes))
+        return self
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.close()
+            self.pdf = None
+
+    @property
+    def content_hash(self) -> str:
+        """sha256 of the decrypted PDF, identical for re-uploads of the same statement."""
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.pdf_bytes).hexdigest()
+        return self._content_hash
+
+    @property
+    def is_image_only(self) -> bool:
+        # Same arguments as bank identification, so this is answered from the text cache.
+        return not self.pages_text(range(2), x_tolerance=1, y_tolerance=3).strip()
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pdf.pages)
+
+    def statement_pages(self) -> list[int]:
+        return list(range(self.page_count)) if self.page_selection is None else sorted(self.page_selection)
+
+    def page(self, index: int):
+        return self.pdf.pages[index]
+
+    def page_text(self, index: int, **extract_kwargs) -> str:
+        """page.extract_text(**extract_kwargs), cached per page and keyword arguments. Returns '' for empty pages."""
+        key = (index, tuple(sorted(extract_kwargs.items())))
+        if key in self._text_cache:
+            self.stats['cache_hits'] += 1
+            return self._text_cache[key]
+        self.stats['text_extractions'] += 1
+        text = self.pdf.pages[index].extract_text(**extract_kwargs) or ''
+        self._text_cache[key] = text
+        return text
+
+    def pages_text(self, indices, **extract_kwargs) -> str:
+        return ''.join(self.page_text(i, **extract_kwargs) for i in indices if i < self.page_count)
+
+    def page_tables(self, indices=None) -> list:
+        """page.extract_table() for each index (all pages by default), cached per page. Missing
+        pages are extracted together so long statements can use the process pool."""
+        indices = list(range(self.page_count) if indices is None else indices)
+        missing = [i for i in indices if i not in self._table_cache]
+        self.stats['cache_hits'] += len(indices) - len(missing)
+        if missing:
+            self.stats['table_extractions'] += len(missing)
+            if self.is_image_only:
+                from .ocr import get_ocr_engine
+                tables = get_ocr_engine().ocr_tables(self, missing)
+                self._table_cache.update(tables)
+            else:
+                with span('table_extraction', pages=len(missing)) as stage:
+                    tables = extract_page_tables(self.pdf, missing, release_pages=True)
+                    stage.set(rows=_table_rows(tables))
+                # Text and tables are cached as plain values, so the parsed page layouts can be released.
+                for i, table in zip(missing, tables):
+                    self._table_cache[i] = table
+        return [self._table_cache[i] for i in indices]
+
+    def iter_page_tables(self, indices=None, pages_per_chunk: int = 32):
+        """Yields (page_indices, tables) in chunks of pages_per_chunk pages. Unlike page_tables
+        nothing is cached and each chunk is read from its own short-lived copy of the document,
+        so memory stays bounded by one chunk however long the statement is."""
+        indices = list(range(self.page_count) if indices is None else indices)
+        for start in range(0, len(indices), pages_per_chunk):
+            chunk = indices[start:start + pages_per_chunk]
+            cached = [i for i in chunk if i in self._table_cache]
+            missing = [i for i in chunk if i not in self._table_cache]
+            self.stats['cache_hits'] += len(cached)
+            self.stats['table_extractions'] += len(missing)
+            tables = {i: self._table_cache[i] for i in cached}
+            if missing:
+                if self.is_image_only:
+                    from .ocr import get_ocr_engine
+                    tables.update(get_ocr_engine().ocr_tables(self, missing))
+                else:
+                    with span('table_extraction', pages=len(missing)) as stage:
+                        extracted = extract_tables_from_bytes(self.pdf_bytes, missing)
+                        stage.set(rows=_table_rows(extracted))
+                    tables.update(zip(missing, extracted))
+            yield chunk, [tables[i] for i in chunk]
+
+
+def _table_rows(tables: list) -> int:
+    return sum(len(table) for table in tables if table)
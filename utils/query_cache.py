@@ -0,0 +1,104 @@
+import copy
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .database import get_data_version
+
+# Upper bound on cached query results across all users, least recently used ones are dropped first.
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', 512))
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryCache()
+        return _query_cache
+
+
+def user_cached(func):
+    """Wraps func(user_id, *args, **kwargs) so its result is reused until the user's data changes.
+    The arguments must be hashable. wrapper.discard(user_id, *args, **kwargs) drops one result early."""
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    def cache_key(args, kwargs):
+        return (name, args, tuple(sorted(kwargs.items())))
+
+    @functools.wraps(func)
+    def wrapper(user_id: int, *args, **kwargs):
+        return get_query_cache().get_or_compute(user_id, cache_key(args, kwargs), lambda: func(user_id, *args, **kwargs))
+
+    wrapper.discard = lambda user_id, *args, **kwargs: get_query_cache().discard(user_id, cache_key(args, kwargs))
+    return wrapper
+
+
+class QueryCache:
+    """Process-wide memo of per-user query results, shared by every session of the app.
+
+    Each result is stored with the user's data version (user_data_versions) read before it
+    was computed. A lookup compares it with the current version, one primary-key read, so an
+    entry is reused exactly until the next write to that user's transactions, from this
+    process or any other. Callers get a copy, pages are free to modify what they receive.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, user_id: int, key, compute):
+        version = get_data_version(user_id)
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                self._entries.move_to_end((user_id, key))
+                return _copy(entry[1])
+            self.misses += 1
+            if entry is not None:
+                self.stale += 1
+
+        # Computed outside the lock, a slow query for one user does not hold up the others.
+        value = compute()
+        with self._lock:
+            self._entries[(user_id, key)] = (version, value)
+            self._entries.move_to_end((user_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return _copy(value)
+
+    def discard(self, user_id: int, key):
+        with self._lock:
+            self._entries.pop((user_id, key), None)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == user_id]:
+                del self._entries[cache_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _copy(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    return copy.deepcopy(value)
@@ -0,0 +1,92 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import pdfplumber
+import pikepdf
+
+# Number of worker processes used for table extraction, 1 disables the process pool.
+TABLE_EXTRACTION_WORKERS = int(os.environ.get('PDF_TABLE_WORKERS', min(os.cpu_count() or 1, 8)))
+# Statements shorter than this are extracted serially, starting the pool costs more than it saves.
+PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 16))
+
+_worker_pdf = None
+
+
+def extract_page_tables(pdf, page_indices=None, workers: int | None = None, release_pages: bool = False) -> list:
+    """Returns page.extract_table() for each page index (all pages by default), in page order.
+
+    Long statements are split into contiguous page ranges and spread across a process pool;
+    each worker opens its own copy of the decrypted PDF bytes. Output is identical to the
+    serial loop. With release_pages, each page's parsed layout is freed once its table is read.
+    """
+    if page_indices is None:
+        page_indices = range(len(pdf.pages))
+    page_indices = list(page_indices)
+    workers = TABLE_EXTRACTION_WORKERS if workers is None else workers
+
+    if workers <= 1 or len(page_indices) < PARALLEL_MIN_PAGES:
+        tables = []
+        for i in page_indices:
+            tables.append(pdf.pages[i].extract_table())
+            if release_pages:
+                pdf.pages[i].close()
+        return tables
+
+    return _extract_parallel(_read_pdf_bytes(pdf), page_indices, workers)
+
+
+def extract_tables_from_bytes(pdf_bytes: bytes, page_indices, workers: int | None = None) -> list:
+    """extract_page_tables for a PDF given as bytes, used to stream long statements a chunk of
+    pages at a time. The requested pages are copied into a small document of their own before
+    pdfplumber opens it, so the work and memory per call depend on the chunk, not on the
+    length of the statement, and nothing is kept once the call returns."""
+    page_indices = list(page_indices)
+    workers = TABLE_EXTRACTION_WORKERS if workers is None else workers
+    if workers > 1 and len(page_indices) >= PARALLEL_MIN_PAGES:
+        return _extract_parallel(pdf_bytes, page_indices, workers)
+
+    with pdfplumber.open(BytesIO(_copy_pages(pdf_bytes, page_indices))) as pdf:
+        return extract_page_tables(pdf, workers=1, release_pages=True)
+
+
+def _copy_pages(pdf_bytes: bytes, page_indices: list[int]) -> bytes:
+    with pikepdf.open(BytesIO(pdf_bytes)) as source, pikepdf.new() as chunk:
+        chunk.pages.extend(source.pages[i] for i in page_indices)
+        output = BytesIO()
+        chunk.save(output)
+    return output.getvalue()
+
+
+def _extract_parallel(pdf_bytes: bytes, page_indices: list[int], workers: int) -> list:
+    workers = min(workers, len(page_indices))
+    chunk_size = -(-len(page_indices) // (workers * 2))
+    chunks = [page_indices[start:start + chunk_size] for start in range(0, len(page_indices), chunk_size)]
+    print(f"Extracting tables from {len(page_indices)} pages with {workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pdf_bytes,)) as executor:
+        results = executor.map(_extract_chunk, chunks)
+        return [table for chunk_tables in results for table in chunk_tables]
+
+
+def _read_pdf_bytes(pdf) -> bytes:
+    stream = pdf.stream
+    position = stream.tell()
+    stream.seek(0)
+    data = stream.read()
+    stream.seek(position)
+    return data
+
+
+def _init_worker(pdf_bytes: bytes):
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(BytesIO(pdf_bytes))
+
+
+def _extract_chunk(page_indices: list[int]) -> list:
+    tables = []
+    for i in page_indices:
+        page = _worker_pdf.pages[i]
+        tables.append(page.extract_table())
+        # Free the parsed layout of pages this worker is done with.
+        page.close()
+    return tables
@@ -0,0 +1,217 @@
+"""Timed spans for the stages of ingestion, categorization and forecasting.
+
+    with span('table_extraction', pages=len(missing)) as stage:
+        tables = ...
+        stage.set(rows=sum(len(table) for table in tables if table))
+
+A finished span is appended to an in-memory buffer, and a background thread writes the
+buffer to the trace_spans table every TRACE_FLUSH_SECONDS, so the hot path never waits on
+the database. With TRACING_ENABLED=0, span() returns one shared no-op object. If
+TRACE_PROMETHEUS_FILE is set, each flush also rewrites that file with this process's
+per-stage totals in the Prometheus text format, for a node exporter textfile collector.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from multiprocessing.util import Finalize
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', '1') != '0'
+TRACE_FLUSH_SECONDS = float(os.environ.get('TRACE_FLUSH_SECONDS', 5))
+# Spans kept in memory between flushes, further ones are counted as dropped.
+TRACE_BUFFER_MAX = int(os.environ.get('TRACE_BUFFER_MAX', 10_000))
+TRACE_RETENTION_DAYS = float(os.environ.get('TRACE_RETENTION_DAYS', 14))
+# '{pid}' in the path is replaced by the process id, so worker processes write files of their own.
+TRACE_PROMETHEUS_FILE = os.environ.get('TRACE_PROMETHEUS_FILE') or None
+
+COUNTS = ('rows', 'pages', 'bytes')
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+def span(name: str, **counts):
+    """Times the enclosed block as one run of the stage name. counts are any of rows, pages and bytes,
+    and can also be set on the span once known."""
+    if not TRACING_ENABLED:
+        return _NULL_SPAN
+    return Span(name, counts)
+
+
+class Span:
+    __slots__ = ('name', 'counts', 'started_at', '_start')
+
+    def __init__(self, name: str, counts: dict):
+        self.name = name
+        self.counts = counts
+
+    def set(self, **counts):
+        self.counts.update(counts)
+
+    def __enter__(self):
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        get_tracer().record(self, time.perf_counter() - self._start, ok=exc_type is None)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **counts):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Buffers finished spans and flushes them to the database from a daemon thread."""
+
+    def __init__(self):
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._buffer = []
+        # stage -> [count, seconds, errors, rows, pages, bytes] since this process started.
+        self._totals = {}
+        self._last_prune = 0.0
+        # None until the first flush has made sure trace_spans exists, False if it could not.
+        self._table_ready = None
+
+    def record(self, finished: Span, seconds: float, ok: bool = True):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+            # Once trace_spans could not be created, spans only count towards the totals.
+            recording = self._table_ready is not False
+            if recording and len(self._buffer) < TRACE_BUFFER_MAX:
+                self._buffer.append({
+                    'name': finished.name, 'started_at': finished.started_at, 'duration_ms': seconds * 1000,
+                    'ok': ok, 'pid': self._pid, **{key: finished.counts.get(key) for key in COUNTS},
+                })
+            elif recording:
+                self.dropped += 1
+            totals = self._totals.setdefault(finished.name, [0, 0.0, 0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += not ok
+            for i, key in enumerate(COUNTS, start=3):
+                totals[i] += finished.counts.get(key) or 0
+
+    def flush(self):
+        """Writes the buffered spans out now. Called by the background thread and at exit."""
+        from . import database
+
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        if spans and self._table_ready is None:
+            try:
+                database.create_trace_spans_table()
+                self._table_ready = True
+            except Exception as e:
+                # Totals and the Prometheus file still work, only the table is given up on.
+                print(f"Trace spans are not recorded, trace_spans could not be created: {e}")
+                self._table_ready = False
+        if self._table_ready:
+            try:
+                database.record_trace_spans(spans)
+                if time.monotonic() - self._last_prune > 3600:
+                    self._last_prune = time.monotonic()
+                    database.delete_trace_spans(datetime.now() - timedelta(days=TRACE_RETENTION_DAYS))
+            except Exception as e:
+                print(f"Could not record {len(spans)} trace spans: {e}")
+        if TRACE_PROMETHEUS_FILE:
+            self._write_prometheus_file(Path(TRACE_PROMETHEUS_FILE.format(pid=os.getpid())))
+
+    def totals(self) -> dict:
+        with self._lock:
+            return {name: dict(zip(('count', 'seconds', 'errors', *COUNTS), values))
+                    for name, values in self._totals.items()}
+
+    def prometheus_text(self) -> str:
+        lines = []
+        metrics = [
+            ('finance_stage_duration_seconds', 'summary', 'Time spent in each pipeline stage.', None),
+            ('finance_stage_errors_total', 'counter', 'Stage runs that raised an error.', 'errors'),
+            ('finance_stage_rows_total', 'counter', 'Rows processed by each stage.', 'rows'),
+            ('finance_stage_pages_total', 'counter', 'PDF pages processed by each stage.', 'pages'),
+            ('finance_stage_bytes_total', 'counter', 'Bytes processed by each stage.', 'bytes'),
+        ]
+        totals = self.totals()
+        for metric, metric_type, help_text, key in metrics:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}"]
+            for stage, values in sorted(totals.items()):
+                if key is None:
+                    lines.append(f'{metric}_count{{stage="{stage}"}} {values["count"]}')
+                    lines.append(f'{metric}_sum{{stage="{stage}"}} {values["seconds"]:.6f}')
+                else:
+                    lines.append(f'{metric}{{stage="{stage}"}} {values[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def _start(self):
+        # Also reached in a forked child, which must not write out its parent's buffered spans again.
+        self._pid = os.getpid()
+        self._buffer = []
+        self._totals = {}
+        threading.Thread(target=self._loop, name='tracing', daemon=True).start()
+        # Unlike atexit, also run when a multiprocessing worker exits.
+        Finalize(self, self.flush, exitpriority=10)
+
+    def _loop(self):
+        while True:
+            time.sleep(TRACE_FLUSH_SECONDS)
+            self.flush()
+
+    def _write_prometheus_file(self, path: Path):
+        try:
+            tmp_path = path.with_name(path.name + '.tmp')
+            tmp_path.write_text(self.prometheus_text())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write {path}: {e}")
+
+
+def stage_stats(since: datetime) -> pd.DataFrame:
+    """Runs, p50, p95 and mean duration, errors and processed counts per stage since the given time,
+    including this process's spans that are not flushed yet."""
+    from .database import get_trace_spans
+
+    if TRACING_ENABLED:
+        get_tracer().flush()
+    spans = get_trace_spans(since)
+    if spans.empty:
+        return pd.DataFrame(columns=['stage', 'runs', 'p50_ms', 'p95_ms', 'mean_ms', 'errors', *COUNTS, 'rows_per_s'])
+    grouped = spans.groupby('name')
+    stats = pd.DataFrame({
+        'runs': grouped.size(),
+        'p50_ms': grouped['duration_ms'].quantile(0.5),
+        'p95_ms': grouped['duration_ms'].quantile(0.95),
+        'mean_ms': grouped['duration_ms'].mean(),
+        'errors': grouped['ok'].apply(lambda ok: int((~ok.astype(bool)).sum())),
+        **{key: grouped[key].sum(min_count=1) for key in COUNTS},
+    })
+    seconds = grouped['duration_ms'].sum() / 1000
+    stats['rows_per_s'] = np.where(seconds > 0, stats['rows'] / seconds, np.nan)
+    return stats.rename_axis('stage').reset_index().sort_values('p95_ms', ascending=False, ignore_index=True)
@@ -1,6 +1,10 @@
+import numpy as np
 import pandas as pd
 from datetime import timedelta
 
+# Upper bound on (credit, debit) candidate pairs materialized at once, keeps memory flat for wide windows.
+MAX_CANDIDATES_PER_CHUNK = 1_000_000
+
 def get_passthrough_transactions(
         df : pd.DataFrame,
         time_window_hours: int = 24,
@@ -8,34 +12,60 @@ def get_passthrough_transactions(
         min_amount: float = 1000.0
      ) -> list[dict]:
     df = df.sort_values('date').reset_index()
-    credits = df[(df['type']=='Credit')&(df['is_pass_through']== False)&(df['amount']>=min_amount)]
-    debits = df[(df['type']=='Debit')&(df['is_pass_through']== False)&(df['amount']>=min_amount)]
-
-    potential_pairs = []
-    used_debits_indices = set()
-    for credit_idx , credit_row in credits.iterrows():
-        time_window_end = credit_row['date'] + timedelta(hours=time_window_hours)
+    credits = df[(df['type']=='Credit')&(df['is_pass_through']== False)&(df['amount']>=min_amount)&(df['date'].notna())]
+    debits = df[(df['type']=='Debit')&(df['is_pass_through']== False)&(df['amount']>=min_amount)&(df['date'].notna())]
+    if credits.empty or debits.empty:
+        return []
 
-        lower_bound = credit_row['amount'] * (1-amount_tolerance)
-        upper_bound = credit_row['amount'] * (1+amount_tolerance)
+    credit_dates = credits['date'].to_numpy(dtype='datetime64[ns]')
+    credit_amounts = credits['amount'].to_numpy(dtype=float)
+    debit_dates = debits['date'].to_numpy(dtype='datetime64[ns]')
+    debit_amounts = debits['amount'].to_numpy(dtype=float)
 
-        possible_matches = debits[
-            (debits['date']>credit_row['date'])&
-            (debits['date']<=time_window_end)&
-            (debits['amount']>=lower_bound)&
-            (debits['amount']<=upper_bound)&
-            (~debits.index.isin(used_debits_indices))
-        ]
+    # Debits are already in date order, so every credit's time window is a contiguous slice of them.
+    window_start = np.searchsorted(debit_dates, credit_dates, side='right')
+    window_end = np.searchsorted(debit_dates, credit_dates + np.timedelta64(timedelta(hours=time_window_hours)), side='right')
+    window_size = np.maximum(window_end - window_start, 0)
+    lower_bound = credit_amounts * (1-amount_tolerance)
+    upper_bound = credit_amounts * (1+amount_tolerance)
 
-        if not possible_matches.empty:
-            best_match = possible_matches.iloc[0]
-            potential_pairs.append({
-                'credits': credit_row.to_dict(),
-                'debits': best_match.to_dict()
-            })
-            used_debits_indices.add(best_match.name)
+    matched_credits = []
+    matched_debits = []
+    used_debits = np.zeros(len(debits), dtype=bool)
+    for chunk_start, chunk_end in _chunk_by_candidates(window_size):
+        sizes = window_size[chunk_start:chunk_end]
+        candidate_credit = np.repeat(np.arange(chunk_start, chunk_end), sizes)
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        candidate_debit = window_start[candidate_credit] + offsets
 
-    return potential_pairs
+        amounts = debit_amounts[candidate_debit]
+        in_band = (amounts >= lower_bound[candidate_credit]) & (amounts <= upper_bound[candidate_credit])
+        candidate_credit = candidate_credit[in_band]
+        candidate_debit = candidate_debit[in_band]
 
+        # Candidates are ordered by credit, then by debit date, so the first unused debit per credit wins,
+        # exactly like the original credit-by-credit greedy scan.
+        current_credit = -1
+        for credit_pos, debit_pos in zip(candidate_credit.tolist(), candidate_debit.tolist()):
+            if credit_pos == current_credit or used_debits[debit_pos]:
+                continue
+            used_debits[debit_pos] = True
+            current_credit = credit_pos
+            matched_credits.append(credit_pos)
+            matched_debits.append(debit_pos)
 
+    credit_records = credits.iloc[matched_credits].to_dict(orient='records')
+    debit_records = debits.iloc[matched_debits].to_dict(orient='records')
+    return [{'credits': credit, 'debits': debit} for credit, debit in zip(credit_records, debit_records)]
 
+def _chunk_by_candidates(window_size: np.ndarray):
+    """Yields (start, end) ranges of credits whose combined window sizes stay under MAX_CANDIDATES_PER_CHUNK."""
+    start = 0
+    total = len(window_size)
+    cumulative = np.cumsum(window_size)
+    while start < total:
+        offset = cumulative[start - 1] if start else 0
+        end = int(np.searchsorted(cumulative, offset + MAX_CANDIDATES_PER_CHUNK, side='right'))
+        end = max(end, start + 1)
+        yield start, end
+        start = end
@@ -0,0 +1,118 @@
+import os
+from datetime import timedelta
+
+import pandas as pd
+from sqlalchemy import select, func, or_, and_
+
+from .database import SessionLocal, Transactions, Accounts
+
+# Rows per page on the transaction tables.
+TRANSACTIONS_PAGE_SIZE = int(os.environ.get('TRANSACTIONS_PAGE_SIZE', 100))
+
+# Columns pages may project, the internal dedup and centroid bookkeeping columns are left out.
+TRANSACTION_COLUMNS = ('id', 'account_id', 'date', 'details', 'merchant', 'amount', 'type', 'category', 'is_pass_through')
+
+
+def _filtered(stmt, user_id: int, start=None, end=None, type: str | None = None, category: str | None = None,
+              account_id: int | None = None, merchant: str | None = None, include_pass_through: bool = True):
+    """Restricts stmt to the user's transactions matching the filters. start and end are
+    inclusive days, any filter left as None is not applied."""
+    stmt = stmt.join(Accounts, Transactions.account_id == Accounts.id).where(Accounts.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(Transactions.date >= pd.Timestamp(start).normalize().to_pydatetime())
+    if end is not None:
+        stmt = stmt.where(Transactions.date < (pd.Timestamp(end).normalize() + timedelta(days=1)).to_pydatetime())
+    if type is not None:
+        stmt = stmt.where(Transactions.type == type)
+    if category is not None:
+        stmt = stmt.where(Transactions.category == category)
+    if account_id is not None:
+        stmt = stmt.where(Transactions.account_id == account_id)
+    if merchant is not None:
+        stmt = stmt.where(Transactions.merchant == merchant)
+    if not include_pass_through:
+        stmt = stmt.where(Transactions.is_pass_through.is_(False))
+    return stmt
+
+
+def fetch_transactions(user_id: int, columns=TRANSACTION_COLUMNS, after: tuple | None = None,
+                       limit: int | None = None, **filters) -> tuple[pd.DataFrame, tuple | None]:
+    """The user's transactions in (date, id) order, only the requested columns.
+
+    Pages are read with keyset pagination: pass the returned cursor as after to get the rows
+    following the previous page. The cursor is None once there are no more rows.
+    Accepts the filters of _filtered (start, end, type, category, account_id, merchant, include_pass_through).
+    """
+    unknown = set(columns) - set(TRANSACTION_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown transaction columns: {sorted(unknown)}")
+    # date and id are always read, they are the pagination key.
+    selected = list(dict.fromkeys(['id', 'date', *columns]))
+    stmt = _filtered(select(*[Transactions.__table__.c[name] for name in selected]), user_id, **filters)
+    if after is not None:
+        after_date, after_id = pd.Timestamp(after[0]).to_pydatetime(), after[1]
+        stmt = stmt.where(or_(Transactions.date > after_date,
+                              and_(Transactions.date == after_date, Transactions.id > after_id)))
+    stmt = stmt.order_by(Transactions.date, Transactions.id)
+    if limit is not None:
+        # One extra row tells whether another page follows.
+        stmt = stmt.limit(limit + 1)
+
+    db = SessionLocal()
+    try:
+        df = pd.read_sql(stmt, db.connection(), parse_dates=['date'])
+    finally:
+        db.close()
+
+    next_cursor = None
+    if limit is not None and len(df) > limit:
+        df = df.iloc[:limit]
+        next_cursor = (df['date'].iloc[-1], int(df['id'].iloc[-1]))
+    return df[[name for name in selected if name in columns]], next_cursor
+
+
+def transaction_totals(user_id: int, **filters) -> dict:
+    """Sum and count of amounts per transaction type, computed in SQL: {'Credit': {'total', 'count'}, 'Debit': {...}}."""
+    stmt = select(Transactions.type, func.sum(Transactions.amount), func.count(Transactions.id)).select_from(Transactions)
+    stmt = _filtered(stmt, user_id, **filters).group_by(Transactions.type)
+    totals = {'Credit': {'total': 0.0, 'count': 0}, 'Debit': {'total': 0.0, 'count': 0}}
+    db = SessionLocal()
+    try:
+        for type_name, total, count in db.execute(stmt):
+            totals[type_name] = {'total': float(total or 0), 'count': count}
+    finally:
+        db.close()
+    return totals
+
+
+def merchant_totals(user_id: int, limit: int | None = None, **filters) -> pd.DataFrame:
+    """Sum and count of amounts per merchant, largest total first, computed in SQL on the stored merchant column."""
+    total = func.sum(Transactions.amount).label('total')
+    stmt = select(Transactions.merchant, total, func.count(Transactions.id).label('count')).select_from(Transactions)
+    stmt = _filtered(stmt, user_id, **filters).group_by(Transactions.merchant).order_by(total.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    db = SessionLocal()
+    try:
+        return pd.read_sql(stmt, db.connection())
+    finally:
+        db.close()
+
+
+def transaction_filter_options(user_id: int) -> dict:
+    """Values for the filter widgets: the user's accounts, used categories and date range."""
+    db = SessionLocal()
+    try:
+        accounts = db.query(Accounts.id, Accounts.bank_name, Accounts.account_number).filter(
+            Accounts.user_id == user_id).order_by(Accounts.id).all()
+        categories = _filtered(select(Transactions.category).distinct(), user_id).order_by(Transactions.category)
+        bounds = _filtered(select(func.min(Transactions.date), func.max(Transactions.date)).select_from(Transactions), user_id)
+        first_date, last_date = db.execute(bounds).one()
+        return {
+            'accounts': {row.id: f"{row.bank_name} {row.account_number}" for row in accounts},
+            'categories': [row[0] for row in db.execute(categories) if row[0] is not None],
+            'first_date': pd.Timestamp(first_date) if first_date is not None else None,
+            'last_date': pd.Timestamp(last_date) if last_date is not None else None,
+        }
+    finally:
+        db.close()